@@ -3,17 +3,33 @@
 import io
 import logging
 import shutil
+import tempfile
 from threading import Lock
 
+from ..common import config
+from ..filesync import hash_service
 from ..promise import Promise, reduce_coroutine
 from .. import encryption
 from ..network.errors import HTTPNotFoundError
 from . import User
+from . import ranged_download
+from . import segmented_upload
 
 
 _logger = logging.getLogger(__name__)
 
 
+def _get_etag(result):
+    """Get the ETag of a storage response.
+
+    The ETag of the large objects uploaded by segments is quoted.
+    """
+    etag = result.get('headers', {}).get('etag')
+    if etag:
+        etag = etag.strip('"')
+    return etag
+
+
 class Container(object):
     """
     Represent a Bajoo container, which can be the MyBajoo folder,
@@ -362,11 +378,58 @@ class Container(object):
         result = yield self._session.send_storage_request(
             'HEAD', '/storages/%s/%s' % (self.id, path,))
 
-        md5_hash = result.get('headers', {}).get('etag')
+        md5_hash = _get_etag(result)
         metadata = {'hash': md5_hash}
 
         yield metadata
 
+    @reduce_coroutine()
+    def _download_file(self, url, dst_path=None):
+        """Download a file, by ranges fetched in parallel if it's large.
+
+        See `ranged_download`.
+
+        Args:
+            url (str): URL of the file, relatively to the storage.
+            dst_path (str, optional): path of the local file receiving the
+                content. If not set, a temporary file is used.
+        Returns:
+            Promise<dict>: result of the download request. If `dst_path` is
+                set, 'content' is None, and the 'md5' key contains the md5 of
+                the written content.
+        """
+        size_limit = ranged_download.get_size_limit()
+        result = yield self._session.download_storage_file(
+            'GET', url, size_limit=size_limit, dst_path=dst_path)
+        if result.get('content') is not None or 'md5' in result:
+            yield result
+            return
+
+        # The file is too large to be downloaded in one request.
+        headers = result.get('headers', {})
+        md5 = None
+        if not headers.get('x-static-large-object'):
+            md5 = _get_etag(result)
+        if dst_path:
+            dst_file = io.open(dst_path, 'r+b')
+        else:
+            dst_file = tempfile.TemporaryFile(suffix='.tmp')
+        try:
+            content_md5 = yield ranged_download.download(
+                self._session, url, dst_file,
+                int(headers.get('content-length')), headers.get('etag'), md5)
+        except Exception:
+            dst_file.close()
+            raise
+        if dst_path:
+            dst_file.close()
+            dst_file = None
+
+        result = dict(result)
+        result['content'] = dst_file
+        result['md5'] = content_md5
+        yield result
+
     @reduce_coroutine()
     def download(self, path):
         """
@@ -384,8 +447,8 @@ class Container(object):
         if self.is_encrypted:
             encryption_key = yield self._get_encryption_key()
 
-        result = yield self._session.download_storage_file('GET', url)
-        md5_hash = result.get('headers', {}).get('etag')
+        result = yield self._download_file(url)
+        md5_hash = _get_etag(result)
         metadata = {'hash': md5_hash}
         downloaded_file = result.get('content')
 
@@ -396,6 +459,37 @@ class Container(object):
         else:
             yield metadata, downloaded_file
 
+    @reduce_coroutine()
+    def download_to(self, path, dst_path):
+        """Download a file in this container, directly into a local file.
+
+        Unlike `download()`, the content is not written in a temporary file
+        first: the decrypted content is written only once, and its md5 hash
+        is computed while it's written.
+
+        Args:
+            path (str): the path to the file to be downloaded.
+            dst_path (str): path of the local file receiving the content. It
+                must exist, and it's overwritten.
+
+        Returns:
+            Promise<dict>: metadata. In addition of the 'hash' key, the
+            'content_hash' key contains the md5 hash of the written content.
+        """
+        url = '/storages/%s/%s' % (self.id, path)
+
+        if self.is_encrypted:
+            encryption_key = yield self._get_encryption_key()
+            result = yield self._download_file(url)
+            decrypted_stream = yield encryption.decrypt_stream(
+                result.get('content'), encryption_key)
+            content_hash = yield hash_service.submit(
+                hash_service.copy_and_compute_md5, decrypted_stream, dst_path)
+        else:
+            result = yield self._download_file(url, dst_path=dst_path)
+            content_hash = result['md5']
+        yield {'hash': _get_etag(result), 'content_hash': content_hash}
+
     @reduce_coroutine()
     def upload(self, path, file):
         """Upload a file in this container.
@@ -413,14 +507,43 @@ class Container(object):
         """
         url = '/storages/%s/%s' % (self.id, path)
 
+        # Large files are uploaded by segments (see `segmented_upload`). An
+        # encryption stream can't be split: they're encrypted in a temporary
+        # file instead.
+        segmented = segmented_upload.is_segmented_upload_needed(
+            segmented_upload.get_size(file))
+
         if self.is_encrypted:
             encryption_key = yield self._get_encryption_key()
-            file = yield encryption.encrypt(file, recipients=[encryption_key])
+            if config.get('stream_encrypted_upload') and not segmented:
+                file = yield encryption.encrypt_stream(
+                    file, recipients=[encryption_key])
+            else:
+                file = yield encryption.encrypt(file,
+                                                recipients=[encryption_key])
+                # The encrypted file may be smaller (compressed by GPG).
+                segmented = segmented_upload.is_segmented_upload_needed(
+                    segmented_upload.get_size(file))
+
+        if segmented:
+            result = yield segmented_upload.upload(
+                self._session, self.id, path, file,
+                segmented_upload.get_size(file))
+            yield {'hash': _get_etag(result)}
+            return
 
-        result = yield self._session.upload_storage_file('PUT', url, file)
+        try:
+            result = yield self._session.upload_storage_file('PUT', url, file)
+        except Exception:
+            # The file is closed by the network layer, but not if the request
+            # has been rejected before its start. An encryption stream not
+            # closed would block GPG forever.
+            if hasattr(file, 'close'):
+                file.close()
+            raise
         # TODO: check the upload result (using md5 sum)
 
-        md5_hash = result.get('headers', {}).get('etag')
+        md5_hash = _get_etag(result)
         yield {'hash': md5_hash}
 
     @reduce_coroutine()
@@ -428,6 +551,9 @@ class Container(object):
         """
         Delete a file object in this container.
 
+        If the file has been uploaded by segments, the segments are deleted
+        too.
+
         Args:
             path (str): the relative file path inside the container.
 
@@ -435,7 +561,9 @@ class Container(object):
             Promise<None>
         """
         url = '/storages/%s/%s' % (self.id, path)
-        yield self._session.send_storage_request('DELETE', url)
+        yield self._session.send_storage_request(
+            'DELETE', url, params={'multipart-manifest': 'delete'},
+            headers={'Accept': 'application/json'})
         yield None
 
 
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""Download of large files by ranges, fetched in parallel.
+
+It's the counterpart of `segmented_upload`. The destination file is
+preallocated, then split into fixed-size ranges, each downloaded by a
+separate request (using the "Range" HTTP header) and written at its place in
+the file. Once all ranges are written, the md5 of the file is computed by the
+hash threads (see `hash_service`), and checked against the ETag.
+
+Each range is retried on its own. The "If-Match" header ensures all ranges
+come from the same version of the file.
+
+The number of ranges of a file downloaded at the same time is limited. The
+range requests have a lower priority than the other transfers: they use the
+network workers left available, and don't delay the small files.
+"""
+
+import logging
+import os
+import threading
+
+from ..common import config
+from ..data import BadMd5SumException
+from ..filesync import hash_service
+from ..network.errors import CorruptedDownloadError, HTTPError, NetworkError
+from ..promise import Promise, reduce_coroutine
+
+_logger = logging.getLogger(__name__)
+
+# Maximum number of attempts to download a range.
+MAX_RANGE_ATTEMPTS = 3
+
+# Priority of the range requests. Normal downloads have a priority of 100.
+RANGE_PRIORITY = 110
+
+
+def get_size_limit():
+    """Get the size from which the files should be downloaded by ranges.
+
+    Returns:
+        Optional[int]: minimal size, in bytes. None if the ranged downloads
+            are disabled.
+    """
+    return config.get('ranged_download_threshold') or None
+
+
+class _Range(object):
+    """Write-only view of a part of the destination file.
+
+    All ranges share the same file object, used under lock; each of them is
+    written by a different network thread.
+    """
+
+    def __init__(self, dst, lock, offset, size):
+        self._dst = dst
+        self._lock = lock
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def write(self, data):
+        if self._position + len(data) > self._size:
+            raise IOError('Data out of the range')
+        with self._lock:
+            self._dst.seek(self._offset + self._position)
+            self._dst.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if offset != 0 or whence != os.SEEK_SET:
+            raise IOError('A range can only be rewritten from its start')
+        self._position = 0
+        return 0
+
+
+class _RangedDownload(object):
+    """Download a file by ranges, with a limited number of parallel requests.
+    """
+
+    def __init__(self, session, url, dst, size, etag):
+        self._session = session
+        self._url = url
+        self._dst = dst
+        self._size = size
+        self._etag = etag
+
+        self._range_size = config.get('download_range_size')
+        if self._range_size < 1:
+            _logger.warning('Invalid "download_range_size" option: %s. The '
+                            'file is downloaded as a single range.',
+                            self._range_size)
+            self._range_size = max(1, size)
+        self._parallelism = max(1, config.get('ranged_download_parallelism'))
+        self._nb_ranges = -(-size // self._range_size)  # ceil
+
+        self._dst_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self._nb_running = 0
+        self._nb_done = 0
+        self._failed = False
+        self._error = None
+        self._resolve = None
+        self._reject = None
+
+    def start(self):
+        """Start the download.
+
+        Returns:
+            Promise<None>: resolved when all ranges are written.
+        """
+        def executor(resolve, reject):
+            self._resolve = resolve
+            self._reject = reject
+            self._start_ranges()
+
+        _logger.debug('Download %s by %s ranges', self._url, self._nb_ranges)
+        return Promise(executor)
+
+    def _start_ranges(self):
+        while True:
+            with self._lock:
+                if (self._failed or self._nb_running >= self._parallelism or
+                        self._next_index >= self._nb_ranges):
+                    return
+                index = self._next_index
+                self._next_index += 1
+                self._nb_running += 1
+
+            self._download_range(index).then(self._on_range_downloaded,
+                                             self._on_range_error)
+
+    @reduce_coroutine()
+    def _download_range(self, index):
+        offset = index * self._range_size
+        size = min(self._range_size, self._size - offset)
+
+        attempt = 1
+        while True:
+            headers = {
+                'Range': 'bytes=%s-%s' % (offset, offset + size - 1),
+                'If-Match': self._etag
+            }
+            try:
+                yield self._session.download_storage_file(
+                    'GET', self._url, headers=headers,
+                    dst=_Range(self._dst, self._dst_lock, offset, size),
+                    priority=RANGE_PRIORITY)
+            except NetworkError as error:
+                # A 412 error means the file has changed: all ranges must be
+                # downloaded again.
+                retry = not isinstance(error, HTTPError) or error.code >= 500
+                if not retry or attempt >= MAX_RANGE_ATTEMPTS:
+                    raise
+                _logger.info('Download of range %s of %s failed: %s. Retry.',
+                             index, self._url, error)
+                attempt += 1
+                continue
+            yield index
+            return
+
+    def _on_range_downloaded(self, _index):
+        with self._lock:
+            self._nb_running -= 1
+            self._nb_done += 1
+            failed = self._failed
+            done = self._nb_done == self._nb_ranges
+            stopped = self._nb_running == 0
+        if failed:
+            if stopped:
+                self._reject(self._error)
+        elif done:
+            self._resolve(None)
+        else:
+            self._start_ranges()
+
+    def _on_range_error(self, error):
+        # The error is reported once no range is running anymore: the caller
+        # can then safely close or delete the destination file.
+        with self._lock:
+            self._nb_running -= 1
+            if not self._failed:
+                self._failed = True
+                self._error = error
+            stopped = self._nb_running == 0
+        if stopped:
+            self._reject(self._error)
+
+
+def _compute_md5(file_obj):
+    file_obj.seek(0)
+    md5 = hash_service.compute_md5(file_obj)
+    file_obj.seek(0)
+    return md5
+
+
+def _preallocate(dst, size):
+    dst.truncate(size)
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(dst.fileno(), 0, size)
+        except (AttributeError, IOError, OSError):
+            pass  # Not supported by the file system. Truncate is enough.
+
+
+@reduce_coroutine()
+def download(session, url, dst, size, etag, md5=None):
+    """Download a large file, by ranges fetched in parallel.
+
+    The size of the ranges and the number of parallel requests are set by
+    the config options "download_range_size" and
+    "ranged_download_parallelism".
+
+    Args:
+        session (Session): session used to send the requests.
+        url (str): URL of the file, relatively to the storage.
+        dst (File-like): file receiving the content. It must be opened in
+            binary read-write mode. At the end, its position is set at the
+            beginning.
+        size (int): size of the file.
+        etag (str): ETag of the file, as sent by the server.
+        md5 (str, optional): expected md5 of the content. Not checked if
+            None.
+    Returns:
+        Promise<str>: md5 of the downloaded content.
+    """
+    _preallocate(dst, size)
+    yield _RangedDownload(session, url, dst, size, etag).start()
+
+    # Not computed in the network thread: reading back a large file is long.
+    content_md5 = yield hash_service.submit(_compute_md5, dst)
+    if md5 is not None and content_md5 != md5:
+        raise CorruptedDownloadError(
+            BadMd5SumException(received=content_md5, expected=md5))
+    yield content_md5
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""Upload of large files by segments, sent in parallel.
+
+A large file is split into fixed-size segments, uploaded as separate objects
+by concurrent requests. Once all segments are uploaded, a manifest is put at
+the path of the file (a Swift "Static Large Object"): the storage serves it
+as the concatenation of the segments.
+
+Each segment is retried on its own: a network error near the end of a large
+file doesn't require to send the whole file again.
+
+Segments are stored in the container, under the `SEGMENTS_PREFIX` folder.
+Their names start with ".bajoo", so they're ignored by the sync.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+
+from ..common import config
+from ..common.i18n import N_
+from ..network.errors import HTTPError, NetworkError
+from ..promise import Promise, reduce_coroutine
+
+_logger = logging.getLogger(__name__)
+
+SEGMENTS_PREFIX = '.bajoo-segments/'
+
+# Maximum number of attempts to upload a segment.
+MAX_SEGMENT_ATTEMPTS = 3
+
+
+def get_size(source):
+    """Get the size of a file to upload, if it's known.
+
+    Args:
+        source (str / File-like): path of the file, or file content.
+    Returns:
+        Optional[int]: size of the file. None if the file is not seekable.
+    """
+    try:
+        if isinstance(source, basestring):
+            return os.path.getsize(source)
+    except NameError:
+        if isinstance(source, str):
+            return os.path.getsize(source)
+
+    try:
+        if hasattr(source, 'seekable') and not source.seekable():
+            return None
+        position = source.tell()
+        size = source.seek(0, os.SEEK_END)
+        if size is None:  # Python 2 file
+            size = source.tell()
+        source.seek(position)
+        return size - position
+    except (AttributeError, IOError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def is_segmented_upload_needed(size):
+    """Tell if a file of this size should be uploaded by segments.
+
+    Args:
+        size (Optional[int]): size of the file, as returned by `get_size()`.
+    Returns:
+        bool: True if the file is big enough.
+    """
+    threshold = config.get('segmented_upload_threshold')
+    return size is not None and bool(threshold) and size >= threshold
+
+
+class _Segment(object):
+    """Read-only view of a part of the source file.
+
+    All segments of a file share the same source file object, used under
+    lock; each of them is read by a different network thread.
+
+    Attributes:
+        md5 (hashlib.HASH): md5 of the data read.
+    """
+
+    def __init__(self, source, lock, offset, size):
+        self._source = source
+        self._lock = lock
+        self._offset = offset
+        self._size = size
+        self._position = 0
+        self.md5 = hashlib.md5()
+
+    def __len__(self):
+        return self._size
+
+    def read(self, size=-1):
+        remaining = self._size - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size == 0:
+            return b''
+        with self._lock:
+            self._source.seek(self._offset + self._position)
+            data = self._source.read(size)
+        self._position += len(data)
+        self.md5.update(data)
+        return data
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        if offset != 0 and offset != self._position:
+            raise io.UnsupportedOperation('Segments are read sequentially')
+        if offset == 0:
+            self.md5 = hashlib.md5()
+        self._position = offset
+        return self._position
+
+    def close(self):
+        pass  # The source file is shared by all segments.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _SegmentedUpload(object):
+    """Upload a file by segments, with a limited number of parallel requests.
+    """
+
+    def __init__(self, session, container_id, path, source, size):
+        self._session = session
+        self._container_id = container_id
+        self._path = path
+        self._source = source
+        self._base_offset = source.tell()
+        self._size = size
+
+        self._segment_size = config.get('upload_segment_size')
+        self._parallelism = max(1, config.get('segmented_upload_parallelism'))
+        self._nb_segments = -(-size // self._segment_size)  # ceil
+        self._prefix = '%s%s' % (SEGMENTS_PREFIX, uuid.uuid4().hex)
+
+        self._source_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._entries = [None] * self._nb_segments
+        self._next_index = 0
+        self._nb_running = 0
+        self._failed = False
+        self._resolve = None
+        self._reject = None
+
+    def _get_url(self, object_path):
+        return '/storages/%s/%s' % (self._container_id, object_path)
+
+    def _get_segment_path(self, index):
+        return '%s/.bajoo-%08d' % (self._prefix, index)
+
+    def start(self):
+        """Start the upload.
+
+        Returns:
+            Promise<dict>: result of the manifest upload.
+        """
+        def executor(resolve, reject):
+            self._resolve = resolve
+            self._reject = reject
+            self._start_segments()
+
+        _logger.debug('Upload %s by %s segments', self._path,
+                      self._nb_segments)
+        return Promise(executor)
+
+    def _start_segments(self):
+        while True:
+            with self._lock:
+                if (self._failed or self._nb_running >= self._parallelism or
+                        self._next_index >= self._nb_segments):
+                    return
+                index = self._next_index
+                self._next_index += 1
+                self._nb_running += 1
+
+            self._upload_segment(index).then(self._on_segment_uploaded,
+                                             self._on_segment_error)
+
+    @reduce_coroutine()
+    def _upload_segment(self, index):
+        offset = index * self._segment_size
+        size = min(self._segment_size, self._size - offset)
+        offset += self._base_offset
+        segment_path = self._get_segment_path(index)
+
+        attempt = 1
+        while True:
+            segment = _Segment(self._source, self._source_lock, offset, size)
+            try:
+                result = yield self._session.upload_storage_file(
+                    'PUT', self._get_url(segment_path), segment)
+            except NetworkError as error:
+                retry = not isinstance(error, HTTPError) or error.code >= 500
+                if not retry or attempt >= MAX_SEGMENT_ATTEMPTS:
+                    raise
+                _logger.info('Upload of segment %s of %s failed: %s. Retry.',
+                             index, self._path, error)
+                attempt += 1
+                continue
+
+            md5 = segment.md5.hexdigest()
+            etag = result.get('headers', {}).get('etag')
+            if etag and etag.strip('"') != md5:
+                if attempt >= MAX_SEGMENT_ATTEMPTS:
+                    raise NetworkError(message=N_(
+                        'The uploaded data has been corrupted.'))
+                _logger.info('Segment %s of %s corrupted. Retry.', index,
+                             self._path)
+                attempt += 1
+                continue
+
+            yield index, {
+                'path': '/%s/%s' % (self._container_id, segment_path),
+                'etag': md5,
+                'size_bytes': size
+            }
+            return
+
+    def _on_segment_uploaded(self, result):
+        index, entry = result
+        with self._lock:
+            self._entries[index] = entry
+            self._nb_running -= 1
+            if self._failed:
+                failed = True
+            else:
+                failed = False
+                done = (self._nb_running == 0 and
+                        self._next_index >= self._nb_segments)
+        if failed:
+            self._remove_segments([entry])
+        elif done:
+            self._upload_manifest()
+        else:
+            self._start_segments()
+
+    def _on_segment_error(self, error):
+        with self._lock:
+            self._nb_running -= 1
+            if self._failed:
+                return
+            self._failed = True
+            entries = [entry for entry in self._entries if entry is not None]
+        self._remove_segments(entries)
+        self._reject(error)
+
+    def _upload_manifest(self):
+        manifest = json.dumps(self._entries).encode('utf-8')
+        promise = self._session.upload_storage_file(
+            'PUT', self._get_url(self._path), io.BytesIO(manifest),
+            params={'multipart-manifest': 'put'})
+
+        def on_error(error):
+            self._remove_segments(self._entries)
+            self._reject(error)
+
+        promise.then(self._resolve, on_error)
+
+    def _remove_segments(self, entries):
+        """Delete uploaded segments, in background. Errors are ignored."""
+        prefix_len = len(self._container_id) + 2
+        for entry in entries:
+            url = self._get_url(entry['path'][prefix_len:])
+            self._session.send_storage_request('DELETE', url).then(
+                None, lambda error: _logger.debug(
+                    'Unable to remove a segment: %s', error))
+
+
+@reduce_coroutine()
+def upload(session, container_id, path, source, size):
+    """Upload a large file, by segments sent in parallel.
+
+    The size of the segments and the number of parallel requests are set by
+    the config options "upload_segment_size" and
+    "segmented_upload_parallelism".
+
+    Args:
+        session (Session): session used to send the requests.
+        container_id (str): ID of the container.
+        path (str): path of the file in the container.
+        source (str / File-like): path of the local file (if type is str),
+            or seekable file content. A file-like object is closed at the end
+            of the upload.
+        size (int): size of the file, as returned by `get_size()`.
+    Returns:
+        Promise<dict>: result of the manifest upload; its ETag is the ETag of
+            the large object.
+    """
+    try:
+        if isinstance(source, basestring):
+            source = io.open(source, 'rb')
+    except NameError:
+        if isinstance(source, str):
+            source = io.open(source, 'rb')
+
+    with source:
+        result = yield _SegmentedUpload(session, container_id, path, source,
+                                        size).start()
+    yield result
@@ -83,7 +83,8 @@ def files_list_updater(container, container_path, on_new_files,
         on_deleted_files (callable):
         on_initial_files (callable, optional):
         last_known_list (dict(str, str), optional): known file. the key is the
-            file's name and the value is the md5 sum.
+            file's name and the value is the md5 sum. It's not copied: it can
+            be a live view of the index, modified by another thread.
     Returns:
         PeriodicTask: a task who update the list (by calling the callbacks) at
             a regular interval. It must be started using `start()`, and
@@ -116,18 +117,19 @@ def files_list_updater(container, container_path, on_new_files,
                 continue
 
             new_known_list[f['name']] = f['hash']
-            if f['name'] in last_known_list:
-                if f['hash'] != last_known_list[f['name']]:
+            known_hash = last_known_list.get(f['name'])
+            if known_hash is not None:
+                if f['hash'] != known_hash:
                     changed_files.append(f)
                 elif first_call and on_initial_files:
                     initial_files.append(f)
             else:
                 new_files.append(f)
 
-        for key in last_known_list:
+        # The initial list can be modified meanwhile (see `last_known_list`).
+        for key, known_hash in list(last_known_list.items()):
             if key not in new_known_list:
-                deleted_files.append({'name': key,
-                                      'hash': last_known_list[key]})
+                deleted_files.append({'name': key, 'hash': known_hash})
 
         if new_files:
             on_new_files(new_files)
@@ -141,7 +143,7 @@ def files_list_updater(container, container_path, on_new_files,
         pt.context['known_list'] = new_known_list
 
     return PeriodicTask('File list updater %s' % container.id, check_period,
-                        update_list, last_known_list or [])
+                        update_list, last_known_list or {})
 
 
 def main():
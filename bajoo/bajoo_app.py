@@ -20,7 +20,7 @@ from .connection_registration_process import connect_or_register
 from .container_model import ContainerModel
 from .container_sync_pool import ContainerSyncPool
 from .dynamic_container_list import DynamicContainerList
-from .filesync import task_consumer
+from .filesync import hash_service, task_consumer
 from .gui import AboutWindow, TaskBarIcon
 from .gui.windows import BugReportWindow
 from .gui.common.language_box import LanguageBox
@@ -739,6 +739,7 @@ class BajooApp(wx.App):
         # wait the end of all encryption tasks before returning.
         encryption.stop()
         task_consumer.stop()
+        hash_service.stop()
 
         self._dummy_frame.Destroy()
 
@@ -46,6 +46,30 @@ _default_config = {
     'notifications': {'type': bool, 'default': True},
     'download_max_speed': {'type': float, 'default': None},
     'upload_max_speed': {'type': float, 'default': None},
+    # Storage of the container indexes: can be "file" (one index file in each
+    # container folder) or "sqlite" (one database per user profile).
+    'index_storage': {'type': str, 'default': 'file'},
+    # If False, a file whose size, mtime and inode are unchanged since the last
+    # sync is considered unchanged, and is not hashed again.
+    'verify_all_hashes': {'type': bool, 'default': False},
+    # If True, a fast hash (xxHash or BLAKE2) of the local files is kept in
+    # the index, and used instead of md5 to check if they have changed.
+    'fast_local_hash': {'type': bool, 'default': False},
+    # If True, the files of encrypted containers are encrypted while they're
+    # uploaded, without intermediate temporary file.
+    'stream_encrypted_upload': {'type': bool, 'default': True},
+    # Files of this size (in bytes) or more are uploaded by segments, sent in
+    # parallel. Segmented uploads are disabled if it's 0.
+    'segmented_upload_threshold': {'type': int, 'default': 128 * 1024 * 1024},
+    'upload_segment_size': {'type': int, 'default': 32 * 1024 * 1024},
+    # Maximum number of segments of a file uploaded at the same time.
+    'segmented_upload_parallelism': {'type': int, 'default': 4},
+    # Files of this size (in bytes) or more are downloaded by ranges, fetched
+    # in parallel. Ranged downloads are disabled if it's 0.
+    'ranged_download_threshold': {'type': int, 'default': 128 * 1024 * 1024},
+    'download_range_size': {'type': int, 'default': 32 * 1024 * 1024},
+    # Maximum number of ranges of a file downloaded at the same time.
+    'ranged_download_parallelism': {'type': int, 'default': 4},
 
     # These credentials are valid, but are intended for test purpose only.
     # They can be revoked at any moment. If you want to develop your own
@@ -8,12 +8,15 @@ import os
 import threading
 
 from . import filesync
+from .api.my_bajoo import MyBajoo
 from .api.sync import files_list_updater
 from .app_status import AppStatus
+from .common import config
 from .common.i18n import _
 from .common.strings import err2unicode
 from .encryption.errors import PassphraseAbortError
 from .filesync.added_local_files_task import AddedLocalFilesTask
+from .filesync.added_remote_files_task import AddedRemoteFilesTask
 from .filesync.filepath import is_path_allowed
 from .filesync.moved_local_files_task import MovedLocalFilesTask
 from .filesync.sync_scheduler import SyncScheduler
@@ -21,6 +24,7 @@ from .filesync.task_builder import TaskBuilder
 from .file_watcher import FileWatcher
 from .index.file_node import FileNode
 from .index.hint_builder import HintBuilder
+from .index import sync_priority
 from .local_container import ContainerStatus
 from .network.errors import HTTPEntityTooLargeError
 from .promise import reduce_coroutine
@@ -28,6 +32,18 @@ from .promise import reduce_coroutine
 _logger = logging.getLogger(__name__)
 
 
+def _get_file_size(file_path):
+    """Get the size of a local file, used to prioritize its sync.
+
+    Returns:
+        Optional[int]: size in bytes, or None if the file can't be stat'ed.
+    """
+    try:
+        return os.lstat(file_path).st_size
+    except (OSError, IOError):
+        return None
+
+
 class ContainerSyncPool(object):
     """Group all containers and manages sync operations.
 
@@ -57,6 +73,10 @@ class ContainerSyncPool(object):
 
     QUOTA_TIMEOUT = 300.0
 
+    # Weight of the MyBajoo folder in the scheduler: when many containers
+    # have changes, it gets twice as many tasks as each shared folder.
+    MY_BAJOO_WEIGHT = 2
+
     def __init__(self, app_status, on_sync_error):
         """
         Args:
@@ -101,9 +121,10 @@ class ContainerSyncPool(object):
                 finally:
                     self._condition.acquire()
 
-            for container, _updater, _watcher in self._local_containers:
-                container.index_tree.set_tree_not_sync()
-                self._scheduler.add_index_tree(container.index_tree)
+            for container, _updater, _watcher in \
+                    self._local_containers.values():
+                self._reconcile_index_tree(container.index_tree)
+                self._add_to_scheduler(container)
                 self._update_container_status(container)
                 container.error_msg = None
                 _updater.start()
@@ -181,14 +202,39 @@ class ContainerSyncPool(object):
             container_id: ID of the container to start
         """
         lc, updater, watcher = self._local_containers[container_id]
-        lc.index_tree.set_tree_not_sync()
+        self._reconcile_index_tree(lc.index_tree)
         lc.error_msg = None
         self._update_container_status(lc)
-        self._scheduler.add_index_tree(lc.index_tree)
+        self._add_to_scheduler(lc)
         updater.start()
         watcher.start()
         self._condition.notify()
 
+    def _add_to_scheduler(self, local_container):
+        weight = 1
+        if isinstance(local_container.container, MyBajoo):
+            weight = self.MY_BAJOO_WEIGHT
+        self._scheduler.add_index_tree(local_container.index_tree,
+                                       local_container, weight)
+
+    @staticmethod
+    def _reconcile_index_tree(index_tree):
+        """Prepare the index to detect the changes made while not synced.
+
+        Only the folders whose mtime has changed are listed, and only the
+        files whose fingerprint has changed are synced (see
+        `IndexTree.set_tree_to_reconcile()`). If the option
+        "verify_all_hashes" is set, fingerprints can't be trusted: all nodes
+        are synced.
+
+        Args:
+            index_tree (IndexTree): index of a container being started.
+        """
+        if config.get('verify_all_hashes'):
+            index_tree.set_tree_not_sync()
+        else:
+            index_tree.set_tree_to_reconcile()
+
     def remove(self, local_container):
         """Remove a container and stop its sync operations.
 
@@ -295,35 +341,31 @@ class ContainerSyncPool(object):
 
     @_apply_event_then_notify
     def _added_remote_files(self, container, files):
-        for f in files:
-            if is_path_allowed(f['name']):
-                HintBuilder.apply_modified_event_from_path(
-                    container.index_tree,
-                    HintBuilder.SCOPE_REMOTE,
-                    f['name'], f['hash'],
-                    FileNode)
+        HintBuilder.apply_modified_events_from_paths(
+            container.index_tree,
+            HintBuilder.SCOPE_REMOTE,
+            [(f['name'], f['hash'], f.get('bytes')) for f in files
+             if is_path_allowed(f['name'])],
+            FileNode)
         _logger.log(5, 'Added %s remote files in %s', len(files), container)
 
     @_apply_event_then_notify
     def _removed_remote_files(self, container, files):
-        for f in files:
-            if is_path_allowed(f['name']):
-                HintBuilder.apply_deleted_event_from_path(
-                    container.index_tree,
-                    HintBuilder.SCOPE_REMOTE,
-                    f['name'])
+        HintBuilder.apply_deleted_events_from_paths(
+            container.index_tree,
+            HintBuilder.SCOPE_REMOTE,
+            [f['name'] for f in files if is_path_allowed(f['name'])])
         _logger.log(5, 'Removed %s remote files from %s', len(files),
                     container)
 
     @_apply_event_then_notify
     def _modified_remote_files(self, container, files):
-        for f in files:
-            if is_path_allowed(f['name']):
-                HintBuilder.apply_modified_event_from_path(
-                    container.index_tree,
-                    HintBuilder.SCOPE_REMOTE,
-                    f['name'], f['hash'],
-                    FileNode)
+        HintBuilder.apply_modified_events_from_paths(
+            container.index_tree,
+            HintBuilder.SCOPE_REMOTE,
+            [(f['name'], f['hash'], f.get('bytes')) for f in files
+             if is_path_allowed(f['name'])],
+            FileNode)
         _logger.log(5, 'Modified %s remote files in %s', len(files), container)
 
     @_apply_event_then_notify
@@ -332,7 +374,7 @@ class ContainerSyncPool(object):
         HintBuilder.apply_modified_event_from_path(
             container.index_tree,
             HintBuilder.SCOPE_LOCAL, filename,
-            None, FileNode)
+            None, FileNode, _get_file_size(file_path))
         _logger.log(5, 'Added local file "%s" in %s', filename, container)
 
     @_apply_event_then_notify
@@ -349,7 +391,8 @@ class ContainerSyncPool(object):
         HintBuilder.apply_modified_event_from_path(container.index_tree,
                                                    HintBuilder.SCOPE_LOCAL,
                                                    filename,
-                                                   None, FileNode)
+                                                   None, FileNode,
+                                                   _get_file_size(file_path))
         _logger.log(5, 'Modified local file "%s" in %s', filename, container)
 
     @_apply_event_then_notify
@@ -395,15 +438,14 @@ class ContainerSyncPool(object):
                 nb_try, index_tree, node = self._get_next_node()
 
                 while node:
-                    # Find the local container from the IndexTree.
                     # TODO: remove need of LocalContainer from task_factory.
-                    local_container = next(
-                        lc for (lc, _u, _w) in self._local_containers.values()
-                        if lc.index_tree is index_tree)
+                    local_container = self._scheduler.get_owner(index_tree)
 
-                    with index_tree.lock:
-                        self._create_task(local_container.container.id, node,
-                                          index_tree, nb_try)
+                    # A failed node's container may have been removed.
+                    if local_container is not None:
+                        with index_tree.lock:
+                            self._create_task(local_container.container.id,
+                                              node, index_tree, nb_try)
 
                     nb_try, index_tree, node = self._get_next_node()
 
@@ -436,12 +478,17 @@ class ContainerSyncPool(object):
             _logger.debug('Quota exceeded, abort task.')
             return
 
+        # The hints are needed to prioritize the task: they're reset by the
+        # acquisition.
+        priority = sync_priority.is_urgent(node)
+        bulk = isinstance(task, (AddedLocalFilesTask, AddedRemoteFilesTask))
+
         self._increment(task)
         TaskBuilder.acquire_from_task(node, task)
 
         try:
             # Note: due to async index_tree.lock is released during the yield.
-            yield filesync.add_task(task)
+            yield filesync.add_task(task, priority=priority, bulk=bulk)
         except Exception as err:
             self._on_task_failed(node, task, err, index_tree, nb_try)
         finally:
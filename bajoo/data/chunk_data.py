@@ -59,7 +59,8 @@ class ChunkData(object):
     CHUNK_SIZE = 16 * 1024
     MAX_BUFFER_SIZE = 512 * 1024
 
-    def __init__(self, file_obj, hint_size=None, hint_md5=None):
+    def __init__(self, file_obj, hint_size=None, hint_md5=None,
+                 dst_file=None):
         """Create a ChunkData from a file-like object, by copying its content.
 
         Args:
@@ -69,6 +70,8 @@ class ChunkData(object):
                 problems (especially closed socket), and to determine the best
                 way to store the data (in memory or written on disk).
             hint_md5 (str, optional): If set, md5 sum of the full content.
+            dst_file (File-like, optional): If set, the data is copied in this
+                file (from its current position), instead of a new buffer.
         Except:
             BadSizeException: raised if hint_size is set, and the total size
                 read from the source don't match the hint.
@@ -82,7 +85,9 @@ class ChunkData(object):
         self._partial_md5_hash = None  # instance of hashlib.HASH
         self.file = None
 
-        if hint_size:
+        if dst_file is not None:
+            self.file = dst_file
+        elif hint_size:
             if int(hint_size) < self.MAX_BUFFER_SIZE:
                 self.file = io.BytesIO()
             else:
@@ -5,6 +5,7 @@ import os
 from threading import Lock as Lock
 
 from .api.team_share import TeamShare
+from .common import config
 from .common.i18n import _
 from .api.sync import container_list_updater
 from .local_container import LocalContainer
@@ -146,7 +147,10 @@ class DynamicContainerList(object):
                          "twice", model.name)
             return
 
-        local_container = LocalContainer(model, container)
+        index_db_path = None
+        if config.get('index_storage') == 'sqlite':
+            index_db_path = self.user_profile.index_db_path
+        local_container = LocalContainer(model, container, index_db_path)
         self._local_list.append(local_container)
 
         if not model.do_not_sync:
@@ -21,15 +21,15 @@ import errno
 from functools import partial
 import io
 import logging
-import os.path
+import os
 import sys
 
 from ..gnupg import GPG
 
-from ..promise import reduce_coroutine
+from ..promise import Promise, reduce_coroutine
 from .asymmetric_key import AsymmetricKey
 from .errors import EncryptionError, KeyGenError, PassphraseError
-from .errors import PassphraseAbortError
+from .errors import PassphraseAbortError, ServiceStoppingError
 from .task_executor import TaskExecutor
 from .process_transmission import wrap_file
 from . import gpg_operations
@@ -225,8 +225,153 @@ def encrypt(source, recipients):
         yield result_file
 
 
+class _GPGStream(object):
+    """Readable stream of data encrypted (or decrypted) on the fly.
+
+    It's the reading end of a pipe, fed by GPG. The size of the data is
+    unknown until the end, and the stream is not seekable.
+
+    When the end of the stream is reached, the result of the GPG operation is
+    checked: if GPG has failed, the last `read()` raises an error instead of
+    returning an empty string, so a truncated content is never mistaken for
+    a complete one.
+    """
+
+    def __init__(self, pipe_in, gpg_promise):
+        self._pipe_in = pipe_in
+        self._gpg_promise = gpg_promise
+
+    def read(self, size=-1):
+        data = self._pipe_in.read(size)
+        if not data and size != 0:
+            # Raises the error if the GPG operation has failed.
+            self._gpg_promise.result()
+        return data
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        """Close the stream. If GPG is still running, it will fail."""
+        self._pipe_in.close()
+
+    @property
+    def closed(self):
+        return self._pipe_in.closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def encrypt_stream(source, recipients):
+    """Encrypt a file for a list of recipients, on the fly.
+
+    Unlike `encrypt()`, the result is not written in a temporary file: it's a
+    stream, produced by GPG while it's read. It avoids to write, then read
+    again, the whole encrypted file on the disk.
+
+    The stream must be consumed, or closed, by the caller: until then, GPG
+    is blocked and keeps a worker of the encryption process busy.
+
+    Args:
+        source (str|file): The source file to encrypt. See `encrypt()`.
+        recipients (list of AsymmetricKey): the list of keys who will be able
+            to read the resulting encrypted file.
+    Returns:
+        Promise<File-like>: the stream of encrypted data. It's not seekable,
+            and its size is unknown. Reading it raises an `EncryptError` if
+            the encryption fails.
+    """
+
+    # If 'source' is a filename, open it
+    try:
+        if isinstance(source, basestring):
+            source = io.open(source, 'rb')
+    except NameError:
+        if isinstance(source, str):
+            source = io.open(source, 'rb')
+
+    with source:
+        if len(recipients) == 1:
+            context = recipients[0]._context
+        else:
+            context = _gpg
+            for key in recipients:
+                import_key(key)
+
+        read_fd, write_fd = os.pipe()
+        pipe_in = io.open(read_fd, 'rb')
+        with io.open(write_fd, 'wb') as pipe_out:
+            # Both files are transmitted (and duplicated) before the call
+            # returns; the local copies can be closed.
+            promise = _executor.execute_task(gpg_operations.encrypt_to_stream,
+                                             context, wrap_file(source),
+                                             recipients, wrap_file(pipe_out))
+
+    if promise is None:  # The encryption service is stopping.
+        pipe_in.close()
+        return Promise.reject(ServiceStoppingError())
+    return Promise.resolve(_GPGStream(pipe_in, promise))
+
+
+def decrypt_stream(source, key=None):
+    """Decrypt a file on the fly.
+
+    Unlike `decrypt()`, the result is not written in a temporary file: it's a
+    stream, produced by GPG while it's read. The caller can write the
+    decrypted data where it's needed, and hash it at the same time.
+
+    The stream must be consumed, or closed, by the caller: until then, GPG
+    is blocked and keeps a worker of the encryption process busy.
+
+    Note:
+        There is no passphrase support: the key must be usable without
+        passphrase, as are the container keys.
+
+    Args:
+        source (str|file): The source file to decrypt. See `decrypt()`.
+        key (AsymmetricKey, optional): If set, use this key for the
+            decryption, instead of using the global Bajoo keyring.
+    Returns:
+        Promise<File-like>: the stream of decrypted data. It's not seekable,
+            and its size is unknown. Reading it raises a `DecryptError` if
+            the decryption fails.
+    """
+    if key:
+        context = key._context
+    else:
+        context = _gpg
+
+    # If 'source' is a filename, open it
+    try:
+        if isinstance(source, basestring):
+            source = io.open(source, 'rb')
+    except NameError:
+        if isinstance(source, str):
+            source = io.open(source, 'rb')
+
+    with source:
+        read_fd, write_fd = os.pipe()
+        pipe_in = io.open(read_fd, 'rb')
+        with io.open(write_fd, 'wb') as pipe_out:
+            # Both files are transmitted (and duplicated) before the call
+            # returns; the local copies can be closed.
+            promise = _executor.execute_task(gpg_operations.decrypt_to_stream,
+                                             context, wrap_file(source),
+                                             wrap_file(pipe_out))
+
+    if promise is None:  # The encryption service is stopping.
+        pipe_in.close()
+        return Promise.reject(ServiceStoppingError())
+    return Promise.resolve(_GPGStream(pipe_in, promise))
+
+
 @reduce_coroutine()
-def decrypt(source, key=None, passphrase_callback=None, _retry=0):
+def decrypt(source, key=None, passphrase_callback=None, _retry=0,
+            dst_path=None):
     """Asynchronously decrypt a file.
 
     Decrypt a file using the GPG executable.
@@ -257,6 +402,9 @@ def decrypt(source, key=None, passphrase_callback=None, _retry=0):
             this operation before), and returns either a string or None (if the
             user don't want to give his passphrase).
         _retry (int): number of passphrase attempt already done (and failed).
+        dst_path (str, optional): If set, the decrypted data is written in
+            this file, instead of a temporary file. The file is not erased
+            when closed.
     Returns:
         Future<TemporaryFile>: A Future returning a temporary file of the
             resulting decrypted data. The file will be erased from the disk as
@@ -286,20 +434,22 @@ def decrypt(source, key=None, passphrase_callback=None, _retry=0):
                 raise PassphraseAbortError()
 
         try:
-            dst_path = yield _executor.execute_task(gpg_operations.decrypt,
-                                                    context,
-                                                    wrap_file(source),
-                                                    passphrase=passphrase)
+            result_path = yield _executor.execute_task(gpg_operations.decrypt,
+                                                       context,
+                                                       wrap_file(source),
+                                                       passphrase=passphrase,
+                                                       dst_path=dst_path)
         except PassphraseError:
             if passphrase_callback and _retry <= 4:
                 source.seek(0)
                 yield decrypt(source, key,
                               passphrase_callback=passphrase_callback,
-                              _retry=_retry+1)
+                              _retry=_retry+1, dst_path=dst_path)
                 return
             raise
-        result_file = io.open(dst_path, mode='rb')
-        _patch_autodelete_file(result_file, dst_path)
+        result_file = io.open(result_path, mode='rb')
+        if dst_path is None:
+            _patch_autodelete_file(result_file, result_path)
         yield result_file
 
 
@@ -6,10 +6,12 @@ all blocking.
 """
 
 import atexit
+import io
 import logging
 import os
 import os.path
 import shutil
+import subprocess
 import tempfile
 import threading
 import time
@@ -39,10 +41,12 @@ def _migration_remove_tmp_folders():
                      err2unicode(err))
         return
 
-    try:
-        tmp_dirs.remove('log')
-    except ValueError:
-        pass
+    # 'downloads' contains the partial downloads (see network.partial_download)
+    for folder_name in ('log', 'downloads'):
+        try:
+            tmp_dirs.remove(folder_name)
+        except ValueError:
+            pass
 
     def _remove_tmp_dir_thread(tmp_dirs):
         _logger.debug('Start cleaning old tmp dirs.')
@@ -123,13 +127,129 @@ def encrypt(gpg, source, recipients):
     return dst_path
 
 
-def decrypt(gpg, source, passphrase=None):
+def encrypt_to_stream(gpg, source, recipients, dst_file):
+    """Encrypt a file, and write the result in a stream.
+
+    Unlike `encrypt()`, the encrypted data never touches the disk: the GPG
+    executable writes it directly in `dst_file`, usually the writing end of a
+    pipe. The function returns when GPG has finished.
+
+    Args:
+        gpg (gnupg.GPG): GPG context
+        source (File): File-like object that will be encrypted
+        recipients (list): the list of keys who will be able
+            to read the resulting encrypted file.
+        dst_file (File): file object, with a file descriptor, receiving the
+            encrypted data. It's closed as soon as GPG is started.
+    Raises:
+        EncryptError
+    """
+    args = ['--encrypt', '--batch', '--always-trust']
+    for key in recipients:
+        args.extend(['--recipient', key.fingerprint])
+
+    return_code, stderr = _run_to_stream(gpg, args, source, dst_file)
+    if return_code != 0:
+        raise EncryptError('Encryption failed', stderr)
+
+
+def decrypt_to_stream(gpg, source, dst_file):
+    """Decrypt a file, and write the result in a stream.
+
+    Unlike `decrypt()`, the decrypted data is not written in a file by GPG:
+    the caller reads it from `dst_file`, usually the writing end of a pipe.
+    The function returns when GPG has finished.
+
+    Args:
+        gpg (gnupg.GPG): GPG context
+        source (File): File-like object that will be decrypted
+        dst_file (File): file object, with a file descriptor, receiving the
+            decrypted data. It's closed as soon as GPG is started.
+    Raises:
+        PassphraseError: the key requires a passphrase.
+        DecryptError
+    """
+    return_code, stderr = _run_to_stream(gpg, ['--decrypt', '--batch'],
+                                         source, dst_file)
+    if return_code != 0:
+        # pkdecrypt codes are defined in libgpg-error (in err-codes.h)
+        if '[GNUPG:] ERROR pkdecrypt_failed 11' in stderr:
+            raise PassphraseError('Decryption failed: probably a bad '
+                                  'passphrase', stderr)
+        if '[GNUPG:] MISSING_PASSPHRASE' in stderr:
+            raise PassphraseError('Decryption failed: missing passphrase',
+                                  stderr)
+        raise DecryptError('Decryption failed', stderr)
+
+
+def _run_to_stream(gpg, args, source, dst_file):
+    """Execute GPG, with a file as input and a stream as output.
+
+    Args:
+        gpg (gnupg.GPG): GPG context
+        args (List[str]): GPG arguments.
+        source (File): File-like object sent to GPG.
+        dst_file (File): file object, with a file descriptor, receiving the
+            output of GPG. It's closed as soon as GPG is started.
+    Returns:
+        Tuple[int, Text]: the exit code of GPG, and its error output.
+    """
+    try:
+        source.fileno()
+        stdin = source
+    except (AttributeError, IOError, OSError, io.UnsupportedOperation):
+        stdin = subprocess.PIPE  # Pseudo file-like object
+
+    startupinfo = None
+    if os.name == 'nt':
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags = subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = subprocess.SW_HIDE
+
+    # The other pipes must not be inherited: GPG would keep them open, and
+    # their readers would never reach the end of the stream.
+    with dst_file:
+        process = subprocess.Popen(gpg.make_args(args, False), stdin=stdin,
+                                   stdout=dst_file, stderr=subprocess.PIPE,
+                                   close_fds=(os.name != 'nt'),
+                                   startupinfo=startupinfo)
+
+    writer = None
+    if stdin is subprocess.PIPE:
+        writer = threading.Thread(target=_copy_and_close,
+                                  args=(source, process.stdin),
+                                  name='GPG input writer')
+        writer.daemon = True
+        writer.start()
+
+    stderr = process.stderr.read()
+    if writer is not None:
+        writer.join()
+    process.stderr.close()
+    return process.wait(), stderr.decode(gpg.encoding, 'replace')
+
+
+def _copy_and_close(source, dst):
+    try:
+        shutil.copyfileobj(source, dst)
+    except (IOError, OSError):
+        pass  # GPG has stopped; the error is reported by its exit code.
+    finally:
+        try:
+            dst.close()
+        except (IOError, OSError):
+            pass
+
+
+def decrypt(gpg, source, passphrase=None, dst_path=None):
     """
 
     Args:
         gpg (gnupg.GPG): GPG context
         source (File): File-like object that will be decrypted
         passphrase (str, optional): passphrase needed to decrypt the file.
+        dst_path (str, optional): if set, path of the resulting file. By
+            default, a new temporary file is created.
     Returns:
         str: path of the resulting file.
     Raises:
@@ -137,9 +257,10 @@ def decrypt(gpg, source, passphrase=None):
             but not set.
         DecryptError:
     """
-    tmp_dir = _get_tmp_dir()
-    with tempfile.NamedTemporaryFile(delete=False, dir=tmp_dir) as tf:
-        dst_path = tf.name
+    if dst_path is None:
+        tmp_dir = _get_tmp_dir()
+        with tempfile.NamedTemporaryFile(delete=False, dir=tmp_dir) as tf:
+            dst_path = tf.name
 
     result = gpg.decrypt_file(source, output=dst_path, passphrase=passphrase)
 
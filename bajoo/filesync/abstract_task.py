@@ -3,15 +3,17 @@
 
 import abc
 import errno
-import hashlib
 import logging
 import os
-import shutil
 import sys
 import time
 
+from ..common import config
 from ..common.strings import ensure_unicode
 from ..encryption.errors import ServiceStoppingError
+from ..promise import reduce_coroutine
+from .downloaded_file import DownloadedFile
+from . import hash_service
 
 _logger = logging.getLogger(__name__)
 
@@ -31,11 +33,25 @@ class Target(object):
 
         self.rel_path = node.get_full_path()
         self.local_md5, self.remote_md5 = node.get_hashes()
+        self.fingerprint = node.get_fingerprint()
+        self.fast_hash = node.get_fast_hash()
 
-    def set_hash(self, local_hash, remote_hash):
-        """Set hashes values of a FileNode."""
+    def set_hash(self, local_hash, remote_hash, fingerprint=None,
+                 fast_hash=None):
+        """Set hashes values of a FileNode.
+
+        Args:
+            local_hash (Optional[str]): md5 of the local file.
+            remote_hash (Optional[str]): md5 of the remote (encrypted) file.
+            fingerprint (Optional[Tuple[int, int, int]]): fingerprint of the
+                local file, as returned by `_Task._get_fingerprint()`, if it
+                has been computed at the same time than `local_hash`.
+            fast_hash (Optional[str]): fast hash of the local file, as
+                returned by `_Task._compute_local_hashes()`.
+        """
         with self._index_tree.lock:
-            self.node.set_hashes(local_hash, remote_hash)
+            self.node.set_hashes(local_hash, remote_hash, fingerprint,
+                                 fast_hash)
 
     def release(self):
         """Release the node.
@@ -207,7 +223,7 @@ class _Task(object):
         return
 
     @staticmethod
-    def _compute_md5_hash(file_content):
+    def _compute_md5_hash(file_content, memoize=False):
         """Compute the md5 hash of a file
 
         Note that the file cursor is not reset to the beginning of the file,
@@ -215,32 +231,144 @@ class _Task(object):
 
         Args:
             file_content (file-like): file to check.
+            memoize (bool): if True, use the hash cache. Must be set only for
+                local files. See `hash_service.compute_md5()`.
         Returns:
             str: md5 hash
         """
-        d = hashlib.md5()
-        for buf in file_content:
-            d.update(buf)
-        return d.hexdigest()
+        return hash_service.compute_md5(file_content, memoize)
+
+    @staticmethod
+    def _compute_local_hashes(file_content, target):
+        """Compute the hashes of the local file of a target.
+
+        If the fast hashes are enabled (see
+        `hash_service.get_fast_hash_algorithm()`) and the target knows the
+        fast hash of its local file, it's used to check if the file has
+        changed: if not, the md5 is not computed, and the target's local md5
+        is returned.
+
+        Args:
+            file_content (file): local file, opened in binary mode.
+            target (Target): target whose local content is expected.
+        Returns:
+            Tuple[str, Optional[str]]: md5 and fast hash of the file. The fast
+                hash is None if disabled.
+        """
+        algorithm = hash_service.get_fast_hash_algorithm()
+        if algorithm is None:
+            return hash_service.compute_md5(file_content, memoize=True), None
+
+        if target.local_md5 is not None and target.fast_hash and \
+                target.fast_hash.startswith(algorithm + ':'):
+            start = file_content.tell()
+            fast_hash, = hash_service.compute_hashes(
+                file_content, (algorithm,), memoize=True)
+            if fast_hash == target.fast_hash:
+                return target.local_md5, fast_hash
+            file_content.seek(start)
+        return hash_service.compute_hashes(
+            file_content, (hash_service.MD5, algorithm), memoize=True)
+
+    def _hash_local_file(self, file_content, target):
+        """Same as `_compute_local_hashes()`, out of the task's thread.
+
+        Returns:
+            Promise<Tuple[str, Optional[str]]>: md5 and fast hash of the file.
+        """
+        return hash_service.submit(self._compute_local_hashes, file_content,
+                                   target)
+
+    @staticmethod
+    def _get_fingerprint(file_content):
+        """Get the fingerprint of an opened file: its size, mtime and inode.
+
+        The fingerprint changes each time the file is modified, so it can be
+        used to detect changes without reading the file content.
+
+        Args:
+            file_content (file): opened file.
+        Returns:
+            Tuple[int, int, int]: size, mtime (in nanoseconds) and inode.
+        """
+        return _Task._fingerprint_from_stat(os.fstat(file_content.fileno()))
 
-    def _write_downloaded_file(self, file_content, target):
-        """Write the downloaded file on the disk and close it.
+    @staticmethod
+    def _fingerprint_from_stat(stat_result):
+        """Get the fingerprint of a file from its stat.
+
+        Args:
+            stat_result (os.stat_result): result of `os.stat()`.
+        Returns:
+            Tuple[int, int, int]: size, mtime (in nanoseconds) and inode.
+        """
+        mtime_ns = getattr(stat_result, 'st_mtime_ns', None)
+        if mtime_ns is None:  # Python 2
+            mtime_ns = int(stat_result.st_mtime * 1000000000)
+        return stat_result.st_size, mtime_ns, stat_result.st_ino
+
+    @staticmethod
+    def _is_unchanged(target, fingerprint):
+        """Check if the local file is the same than at the last sync.
+
+        Args:
+            target (Target): target of the task.
+            fingerprint (Tuple[int, int, int]): current fingerprint of the
+                local file.
+        Returns:
+            bool: True if the file has the same fingerprint than when its
+                local hash has been computed. Always False if the option
+                "verify_all_hashes" is set.
+        """
+        if config.get('verify_all_hashes'):
+            return False
+        return (target.local_md5 is not None and
+                target.fingerprint is not None and
+                tuple(target.fingerprint) == tuple(fingerprint))
+
+    @reduce_coroutine()
+    def _download(self, target):
+        """Download the remote file of a target.
+
+        The file is downloaded next to the target's local file, and its md5
+        is computed, out of the task's thread, if the download didn't give it.
+
+        Returns:
+            Promise<Tuple[dict, DownloadedFile]>: metadata and downloaded file.
+                The file is not in place yet: see `_write_downloaded_file()`.
+        """
+        abs_path = os.path.join(self.local_path, target.rel_path)
+        downloaded_file = DownloadedFile(
+            DownloadedFile.create_tmp_file(abs_path))
+        try:
+            metadata = yield self.container.download_to(target.rel_path,
+                                                        downloaded_file.path)
+            downloaded_file.md5 = metadata.get('content_hash')
+            if downloaded_file.md5 is None:
+                yield hash_service.submit(downloaded_file.compute_md5)
+        except Exception:
+            downloaded_file.close()
+            raise
+        yield metadata, downloaded_file
+
+    def _write_downloaded_file(self, downloaded_file, target):
+        """Move the downloaded file into place, replacing the local file.
 
+        Args:
+            downloaded_file (DownloadedFile): file returned by `_download()`.
+            target (Target): target whose local file is replaced.
         Returns:
-            str: the local md5 hash
+            Tuple[str, Tuple[int, int, int]]: the local md5 hash, and the
+                fingerprint of the written file (see `_get_fingerprint()`).
         """
         abs_path = os.path.join(self.local_path, target.rel_path)
-        md5_hash = self._compute_md5_hash(file_content)
-        file_content.seek(0)
         try:
             os.makedirs(os.path.dirname(abs_path))
         except (IOError, OSError) as e:
             if e.errno != errno.EEXIST:
                 raise
-        with open(abs_path, 'wb') as dest_file, file_content:
-            shutil.copyfileobj(file_content, dest_file)
-
-        return md5_hash
+        stat_result = downloaded_file.move_to(abs_path)
+        return downloaded_file.md5, self._fingerprint_from_stat(stat_result)
 
     def _generate_conflicting_file_name(self, target):
         """Return a unique file name resulting to be used in a conflict
@@ -34,11 +34,11 @@ class AddedLocalFilesTask(_Task):
 
             if target.remote_md5 is None:
                 try:
-                    metadata, remote_file = yield self.container.download(
-                        target.rel_path)
-                    md5 = self._write_downloaded_file(remote_file, target)
+                    metadata, remote_file = yield self._download(target)
+                    md5, fingerprint = self._write_downloaded_file(
+                        remote_file, target)
 
-                    target.set_hash(md5, metadata['hash'])
+                    target.set_hash(md5, metadata['hash'], fingerprint)
                     return
                 except HTTPNotFoundError:
                     pass
@@ -50,14 +50,25 @@ class AddedLocalFilesTask(_Task):
             return
 
         with file_content:
-            md5 = self._compute_md5_hash(file_content)
+            fingerprint = self._get_fingerprint(file_content)
+            if target.remote_md5 is not None and \
+                    self._is_unchanged(target, fingerprint):
+                self._log(_logger, 'Local file has not changed since the last'
+                                   ' sync.')
+                target.set_hash(target.local_md5, target.remote_md5,
+                                fingerprint)
+                return
+
+            md5, fast_hash = yield self._hash_local_file(file_content,
+                                                         target)
             file_content.seek(0)
 
             if md5 == target.local_md5:  # Nothing to do
                 self._log(_logger, 'Local md5 hash has not changed.')
 
                 if target.remote_md5 is not None:
-                    target.set_hash(md5, target.remote_md5)
+                    target.set_hash(md5, target.remote_md5, fingerprint,
+                                    fast_hash)
                     return
 
             if target.remote_md5 is not None:
@@ -76,30 +87,29 @@ class AddedLocalFilesTask(_Task):
 
                     metadata = yield self.container.upload(target.rel_path,
                                                            file_content)
-                    target.set_hash(md5, metadata['hash'])
+                    target.set_hash(md5, metadata['hash'], fingerprint,
+                                    fast_hash)
                     return
 
             try:
-                metadata, remote_file = yield self.container.download(
-                    target.rel_path)
+                metadata, remote_file = yield self._download(target)
             except HTTPNotFoundError:
                 self._log(_logger, 'No remote file, So upload!')
 
                 metadata = yield self.container.upload(target.rel_path,
                                                        file_content)
-                target.set_hash(md5, metadata['hash'])
+                target.set_hash(md5, metadata['hash'], fingerprint, fast_hash)
                 return
 
         with remote_file:
-            remote_uncyphered_md5 = self._compute_md5_hash(remote_file)
-            remote_file.seek(0)
+            remote_uncyphered_md5 = remote_file.md5
 
             if md5 == remote_uncyphered_md5:
                 self._log(_logger, 'Remote file is the same as the local file.'
                                    ' No upload, no conflict, such a beautiful '
                                    'world.')
 
-                target.set_hash(md5, metadata['hash'])
+                target.set_hash(md5, metadata['hash'], fingerprint, fast_hash)
                 return
 
             self._log(_logger, 'Conflict detected, splitting file.')
@@ -108,9 +118,9 @@ class AddedLocalFilesTask(_Task):
             conflicting_path = os.path.join(self.local_path, conflicting_name)
             os.rename(os.path.join(self.local_path, target.rel_path),
                       conflicting_path)
-            self._write_downloaded_file(remote_file, target)
+            _, fingerprint = self._write_downloaded_file(remote_file, target)
 
         # push the conflict file
         self._create_push_task(conflicting_name)
-        target.set_hash(remote_uncyphered_md5, metadata['hash'])
+        target.set_hash(remote_uncyphered_md5, metadata['hash'], fingerprint)
         return
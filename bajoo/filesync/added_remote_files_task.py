@@ -26,7 +26,7 @@ class AddedRemoteFilesTask(_Task):
         src_path = os.path.join(self.local_path, target.rel_path)
 
         try:
-            result = yield self.container.download(target.rel_path)
+            result = yield self._download(target)
             metadata, remote_file = result
             remote_md5 = metadata['hash']
         except HTTPNotFoundError:
@@ -34,12 +34,15 @@ class AddedRemoteFilesTask(_Task):
             if target.local_md5 is None and os.path.exists(src_path):
                 self._log(_logger, 'A new file exists, upload it!')
                 with open(src_path, 'rb') as file_content:
-                    local_md5 = self._compute_md5_hash(file_content)
+                    fingerprint = self._get_fingerprint(file_content)
+                    local_md5, fast_hash = yield self._hash_local_file(
+                        file_content, target)
                     file_content.seek(0)
 
                     metadata = yield self.container.upload(target.rel_path,
                                                            file_content)
-                    target.set_hash(local_md5, metadata['hash'])
+                    target.set_hash(local_md5, metadata['hash'], fingerprint,
+                                    fast_hash)
                     return
 
             target.set_hash(None, None)
@@ -56,27 +59,33 @@ class AddedRemoteFilesTask(_Task):
                     if e.errno != errno.EEXIST:
                         raise e
 
-                local_md5 = self._write_downloaded_file(remote_file, target)
-                target.set_hash(local_md5, remote_md5)
+                local_md5, fingerprint = self._write_downloaded_file(
+                    remote_file, target)
+                target.set_hash(local_md5, remote_md5, fingerprint)
                 return
 
             # compute local md5
             with open(src_path, 'rb') as file_content:
-                md5 = self._compute_md5_hash(file_content)
+                fingerprint = self._get_fingerprint(file_content)
+                if self._is_unchanged(target, fingerprint):
+                    md5, fast_hash = target.local_md5, target.fast_hash
+                else:
+                    md5, fast_hash = yield self._hash_local_file(file_content,
+                                                                 target)
 
             if md5 == target.local_md5:
                 self._log(_logger, 'Local file didn\'t change, overwite.')
-                local_md5 = self._write_downloaded_file(remote_file, target)
-                target.set_hash(local_md5, remote_md5)
+                local_md5, fingerprint = self._write_downloaded_file(
+                    remote_file, target)
+                target.set_hash(local_md5, remote_md5, fingerprint)
                 return
 
-            # compute downloaded md5
-            remote_uncyphered_md5 = self._compute_md5_hash(remote_file)
+            remote_uncyphered_md5 = remote_file.md5
 
             if md5 == remote_uncyphered_md5:
                 self._log(_logger, 'Local and remote files are equals, do '
                                    'nothing.')
-                target.set_hash(md5, remote_md5)
+                target.set_hash(md5, remote_md5, fingerprint, fast_hash)
                 return
 
             # duplicate
@@ -86,9 +95,9 @@ class AddedRemoteFilesTask(_Task):
             conflicting_path = os.path.join(self.local_path, conflicting_name)
             os.rename(os.path.join(self.local_path, target.rel_path),
                       conflicting_path)
-            self._write_downloaded_file(remote_file, target)
+            _, fingerprint = self._write_downloaded_file(remote_file, target)
 
         # push the conflict file
         self._create_push_task(conflicting_name)
-        target.set_hash(remote_uncyphered_md5, metadata['hash'])
+        target.set_hash(remote_uncyphered_md5, metadata['hash'], fingerprint)
         return
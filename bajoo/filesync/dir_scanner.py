@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""Listing of local folders, out of the filesync workers.
+
+Folders are listed with `scandir()`. On most systems, the listing gives the
+type of each entry, so sub-folders are detected without any additional
+system call; on Windows, it also gives the full stat of each entry. Only the
+regular files are stat'ed, and their stat is returned with the listing: the
+caller can compute the files fingerprints without calling `stat()` again.
+
+The configuration and the filtering rules (hidden files, reserved names)
+are evaluated by folder and by name: no path is resolved for each entry.
+
+The listings are done by a small pool of threads dedicated to this task:
+several folders are scanned at the same time, and a slow disk (or network
+share) doesn't block a filesync worker (see `task_consumer`).
+"""
+
+import errno
+import logging
+import os
+import stat
+import sys
+import threading
+
+from ..common import config
+from ..common.strings import err2unicode
+from ..promise import ThreadPoolExecutor
+from . import downloaded_file
+from .filepath import is_hidden, is_name_allowed
+
+try:
+    from os import scandir
+except ImportError:  # Python < 3.5
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+_logger = logging.getLogger(__name__)
+
+_MAX_WORKER = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Windows attribute of the hidden files (see `stat_result.st_file_attributes`)
+FILE_ATTRIBUTE_HIDDEN = 0x02
+
+
+class DirContent(object):
+    """Entries of a folder which can be synced.
+
+    Attributes:
+        files (List[Text]): names of the regular files.
+        folders (List[Text]): names of the sub-folders.
+        file_stats (Dict[Text, os.stat_result]): stat of each regular file,
+            by name. Symbolic links are not followed.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.folders = []
+        self.file_stats = {}
+
+
+class _ListDirEntry(object):
+    """Minimal `os.DirEntry` replacement, when `scandir()` is missing."""
+
+    def __init__(self, dir_path, name):
+        self.name = name
+        self.path = os.path.join(dir_path, name)
+        self._stat = None
+
+    def stat(self, follow_symlinks=True):
+        if self._stat is None:
+            self._stat = os.lstat(self.path)
+        return self._stat
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self.stat().st_mode)
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self.stat().st_mode)
+
+
+def _scandir(dir_path):
+    if scandir is not None:
+        return scandir(dir_path)
+    return (_ListDirEntry(dir_path, name) for name in os.listdir(dir_path))
+
+
+def _is_hidden_entry(entry):
+    if sys.platform == 'win32':
+        attributes = getattr(entry.stat(follow_symlinks=False),
+                             'st_file_attributes', None)
+        if attributes is not None:
+            return bool(attributes & FILE_ATTRIBUTE_HIDDEN)
+        return is_hidden(entry.path)
+
+    if entry.name.startswith('.'):
+        return True
+    if sys.platform == 'darwin':
+        return is_hidden(entry.path)
+    return False
+
+
+def scan_dir(dir_path):
+    """List a folder, in the current thread.
+
+    Hidden files are ignored if the option "exclude_hidden_files" is set.
+    Bajoo special files and names not allowed (see `is_name_allowed()`) are
+    always ignored, as the entries which are neither regular files nor
+    folders. Temporary files left by interrupted downloads are deleted (see
+    `downloaded_file.remove_stale_file()`).
+
+    Args:
+        dir_path (Text): absolute path of the folder.
+    Returns:
+        DirContent: the entries of the folder.
+    Raises:
+        OSError, IOError: if the folder can't be listed.
+    """
+    exclude_hidden_files = config.get('exclude_hidden_files')
+    content = DirContent()
+
+    for entry in _scandir(dir_path):
+        name = entry.name
+        if name.startswith(downloaded_file.TMP_PREFIX):
+            _remove_stale_download(entry)
+            continue
+        if not is_name_allowed(name):
+            continue
+        try:
+            if exclude_hidden_files and _is_hidden_entry(entry):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                content.folders.append(name)
+            elif entry.is_file(follow_symlinks=False):
+                content.file_stats[name] = entry.stat(follow_symlinks=False)
+                content.files.append(name)
+            else:
+                _logger.info('Non-regular file %s ignored', entry.path)
+        except (OSError, IOError) as e:
+            if e.errno == errno.ENOENT:
+                continue  # file disappeared between listing and stat()
+            _logger.warning('File "%s" unreadable by stat, when listing '
+                            'content of "%s" folder: %s',
+                            name, dir_path, err2unicode(e))
+            continue  # TODO: We shouldn't ignore these files.
+    return content
+
+
+def _remove_stale_download(entry):
+    try:
+        if entry.is_file(follow_symlinks=False):
+            downloaded_file.remove_stale_file(
+                entry.path, entry.stat(follow_symlinks=False))
+    except (OSError, IOError):
+        pass  # file disappeared, or will be checked by the next scan.
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(_MAX_WORKER)
+        return _executor
+
+
+def submit(callback, *args, **kwargs):
+    """Execute a function listing folders in the scanner threads.
+
+    Args:
+        callback (callable): function to execute, calling `scan_dir()`.
+        *args: arguments passed to the callback.
+        **kwargs: keywords arguments passed to the callback.
+    Returns:
+        Promise: fulfilled with the value returned by the callback.
+    """
+    return _get_executor().submit(callback, *args, **kwargs)
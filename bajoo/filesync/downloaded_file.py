@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from . import hash_service
+
+_logger = logging.getLogger(__name__)
+
+# Prefix of the files being downloaded. Files starting by ".bajoo" are
+# ignored by the sync (see `filepath.is_path_allowed()`).
+TMP_PREFIX = '.bajoo-download-'
+
+# Temporary files older than this (in seconds), and not in use, are left by a
+# previous execution and can be deleted (see `remove_stale_file()`).
+STALE_DELAY = 3600
+
+# Paths of the temporary files of the current downloads.
+_active_paths = set()
+_lock = threading.Lock()
+
+
+class DownloadedFile(object):
+    """File downloaded from a container, waiting to be moved into place.
+
+    The content is downloaded in a temporary file, located in the folder of
+    its final destination when possible. When the task has checked the
+    content (using the `md5` attribute, without reading the file again), it
+    puts the file into place by an atomic rename (see `move_to()`).
+
+    If the file has not been moved, it's deleted by `close()`. Instances are
+    context managers calling `close()` on exit.
+
+    Attributes:
+        path (str): path of the temporary file.
+        md5 (str): md5 hash of the (decrypted) content.
+    """
+
+    def __init__(self, path, md5=None):
+        self.path = path
+        self.md5 = md5
+        self._moved = False
+
+    @staticmethod
+    def create_tmp_file(dest_path):
+        """Create the temporary file receiving the download.
+
+        Args:
+            dest_path (str): final destination of the file.
+        Returns:
+            str: path of the new, empty, temporary file. It's in the same
+                folder than `dest_path` if this folder exists.
+        """
+        dest_dir = os.path.dirname(dest_path)
+        if not os.path.isdir(dest_dir):
+            dest_dir = None  # Not created for a file that may be discarded.
+        fd, tmp_path = tempfile.mkstemp(prefix=TMP_PREFIX, dir=dest_dir)
+        os.close(fd)
+        with _lock:
+            _active_paths.add(tmp_path)
+        return tmp_path
+
+    def open(self):
+        """Open the temporary file, for reading.
+
+        Returns:
+            file: the file, opened in binary mode.
+        """
+        return open(self.path, 'rb')
+
+    def compute_md5(self):
+        """Compute the md5 hash of the content, and set the `md5` attribute.
+
+        Returns:
+            str: the md5 hash.
+        """
+        with self.open() as file_content:
+            self.md5 = hash_service.compute_md5(file_content)
+        return self.md5
+
+    def move_to(self, dest_path):
+        """Put the file at its final destination, replacing any existing file.
+
+        Args:
+            dest_path (str): destination path. Its folder must exist.
+        Returns:
+            os.stat_result: stat of the file, once moved.
+        """
+        try:
+            _replace(self.path, dest_path)
+        except (IOError, OSError) as error:
+            if error.errno != errno.EXDEV:
+                raise
+            # The temporary file is on another file system.
+            shutil.move(self.path, dest_path)
+        self._moved = True
+        _release(self.path)
+        return os.stat(dest_path)
+
+    def close(self):
+        """Delete the temporary file, if it has not been moved."""
+        if self._moved:
+            return
+        self._moved = True
+        try:
+            os.remove(self.path)
+        except (IOError, OSError) as error:
+            if error.errno != errno.ENOENT:
+                _logger.warning('Unable to delete tmp file: %s', self.path,
+                                exc_info=True)
+        _release(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def remove_stale_file(path, stat_result):
+    """Delete a temporary file left by an interrupted download.
+
+    A download interrupted by the end of the process (or a crash) leaves its
+    temporary file in the synced folder. These files are ignored by the sync,
+    and are deleted when found by a folder scan.
+
+    Args:
+        path (Text): path of the temporary file (its name starts by
+            `TMP_PREFIX`).
+        stat_result (os.stat_result): stat of the file.
+    Returns:
+        bool: True if the file has been deleted; False if it may be in use.
+    """
+    if stat_result.st_mtime > time.time() - STALE_DELAY:
+        return False
+    with _lock:
+        if path in _active_paths:
+            return False
+    try:
+        os.remove(path)
+    except (IOError, OSError) as error:
+        if error.errno != errno.ENOENT:
+            _logger.info('Unable to delete stale tmp file %s: %s', path,
+                         error)
+        return False
+    _logger.debug('Stale tmp file %s deleted', path)
+    return True
+
+
+def _release(path):
+    with _lock:
+        _active_paths.discard(path)
+
+
+def _replace(src_path, dest_path):
+    """Rename a file, replacing the destination if it exists."""
+    if hasattr(os, 'replace'):
+        os.replace(src_path, dest_path)
+        return
+    # Python 2
+    if os.name == 'nt' and os.path.exists(dest_path):
+        # Not atomic, but os.rename() can't replace files under Windows.
+        os.remove(dest_path)
+    os.rename(src_path, dest_path)
@@ -13,6 +13,13 @@ if sys.platform == "darwin":
 _logger = logging.getLogger(__name__)
 
 
+_RESERVED_CHARACTERS = '<>:"/\|?*' + ''.join(chr(i) for i in range(31))
+_RESERVED_FILENAMES = frozenset(
+    ['CON', 'PRN', 'AUX', 'NUL'] +
+    list('COM%d' % i for i in range(1, 9)) +
+    list('LPT%d' % i for i in range(1, 9)))
+
+
 def is_path_allowed(file_path):
     """Check if a file path is allowed to be synced.
 
@@ -23,6 +30,14 @@ def is_path_allowed(file_path):
     """
 
     (dir_part, filename) = os.path.split(file_path)
+    return is_name_allowed(filename)
+
+
+def is_name_allowed(filename):
+    """Check if a file name is allowed to be synced.
+
+    See `is_path_allowed()`.
+    """
     if filename.startswith('.bajoo'):
         return False  # Bajoo container index
 
@@ -30,15 +45,10 @@ def is_path_allowed(file_path):
         return False  # Container encryption key
 
     if sys.platform in ['win32', 'cygwin', 'win64']:
-        reserved_characters = '<>:"/\|?*' + ''.join(chr(i) for i in range(31))
-        reserved_filename = ['CON', 'PRN', 'AUX', 'NUL']
-        reserved_filename += list('COM%d' % i for i in range(1, 9))
-        reserved_filename += list('LPT%d' % i for i in range(1, 9))
-
-        if any(c in reserved_characters for c in filename):
+        if any(c in _RESERVED_CHARACTERS for c in filename):
             return False
 
-        if filename.split('.')[0] in reserved_filename:
+        if filename.split('.')[0] in _RESERVED_FILENAMES:
             return False
 
     return True
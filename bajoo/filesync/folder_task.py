@@ -4,17 +4,68 @@ import errno
 import logging
 import os
 import stat
-import sys
-from ..common import config
+import time
 from ..common.strings import err2unicode
 from ..index.file_node import FileNode
 from ..index.folder_node import FolderNode
 from ..index.hints import ModifiedHint
 from ..index.hint_builder import HintBuilder
-from .filepath import is_hidden, is_path_allowed
+from . import dir_scanner
+from .abstract_task import _Task
 
 _logger = logging.getLogger(__name__)
 
+# A folder mtime more recent than this delay (in nanoseconds) is not
+# recorded: the folder could still be modified without changing its mtime,
+# on file systems with a coarse time resolution.
+MTIME_RACY_DELAY = 2 * 1000000000
+
+
+class FolderDiff(object):
+    """Differences between the children of a folder node and the folder.
+
+    Attributes:
+        deleted_children (List[BaseNode]): children no longer present.
+        replaced_children (List[BaseNode]): children replaced by an element
+            of another type (a file by a folder, or the reverse). The new
+            element is added once the old child is removed (see
+            `FolderNode.add_replaced_child()`).
+        new_files (List[Text]): names of the new files.
+        new_folders (List[Text]): names of the new folders.
+        new_file_sizes (Dict[Text, int]): size of the new files, by name,
+            when known. They're given to the hints, to prioritize the sync
+            of the small files (see `sync_priority`).
+    """
+
+    DELETED = 'deleted'
+    REPLACED = 'replaced'
+    NEW_FILE = 'new file'
+    NEW_FOLDER = 'new folder'
+
+    def __init__(self):
+        self.deleted_children = []
+        self.replaced_children = []
+        self.new_files = []
+        self.new_folders = []
+        self.new_file_sizes = {}
+
+    def __bool__(self):
+        return bool(self.deleted_children or self.replaced_children or
+                    self.new_files or self.new_folders)
+
+    __nonzero__ = __bool__  # Python 2
+
+    def iter_changes(self):
+        """Iterate over the changes, as (action, child or name) tuples."""
+        for child in self.deleted_children:
+            yield self.DELETED, child
+        for child in self.replaced_children:
+            yield self.REPLACED, child
+        for name in self.new_files:
+            yield self.NEW_FILE, name
+        for name in self.new_folders:
+            yield self.NEW_FOLDER, name
+
 
 class FolderTask(object):
     """Sync class in charge of Folder node.
@@ -28,8 +79,16 @@ class FolderTask(object):
     The sync is done is two parts:
      - execute() will detect any change and return the state and the children
         list that should be present
-     - diff_node_and_apply_result() will takes theses elements and adapt the
-        tree by adding/removing nodes (indirectly, through hint).
+     - diff_children() will compare theses elements to the node's children,
+        then apply_diff() will adapt the tree by adding/removing nodes
+        (indirectly, through hint), by batches.
+
+    The mtime of the folder is kept in the node's state. If it hasn't
+    changed since the last listing, no entry has been added nor removed:
+    the folder is not listed again. In both cases, the known files whose
+    fingerprint (size, mtime and inode) has changed are set not sync. It
+    makes the check of a tree mostly unchanged cheap (see
+    `IndexTree.set_tree_to_reconcile()`).
     """
 
     def __init__(self, local_container, node):
@@ -44,24 +103,206 @@ class FolderTask(object):
         return u'FolderTask("%s")' % self.node.get_full_path()
 
     def __call__(self):
+        index_tree = self.container.index_tree
         try:
             container_path = self.container.path
-            file_child_list, folder_child_list = self.execute(container_path,
-                                                              self.node,
-                                                              self.local_hint)
+            src_path = self.node.get_full_path()
+            with index_tree.lock:
+                known_files = self.get_known_files(self.node)
+                last_mtime = self.node.get_mtime()
+                can_skip_listing = (self.local_hint is None and
+                                    last_mtime is not None and
+                                    self.node.exists())
+
+            file_child_list, folder_child_list, file_stats, mtime = \
+                yield dir_scanner.submit(self.scan, container_path, src_path,
+                                         known_files, can_skip_listing,
+                                         last_mtime)
+            modified_files = self.find_modified_files(known_files, file_stats)
+            changes = None
+            if file_child_list is not None:
+                _logger.log(5, 'Apply result for FolderTask %s', src_path)
+                with index_tree.lock:
+                    changes = self.diff_children(self.node, file_child_list,
+                                                 folder_child_list,
+                                                 file_stats)
+                self.apply_diff(index_tree, self.node, changes)
         except Exception:
             _logger.exception('%s failed', self)
-            self.node.release()
+            with index_tree.lock:
+                self.node.release()
             raise
-        with self.container.index_tree.lock:
-            self.diff_node_and_apply_result(self.node, None,
-                                            file_child_list,
-                                            folder_child_list)
+        with index_tree.lock:
+            # The state is set last: if the index is saved meanwhile, the
+            # folder will be listed again.
+            new_state = None
+            if mtime is not None and \
+                    time.time() * 1000000000 - mtime > MTIME_RACY_DELAY and \
+                    not (changes and changes.replaced_children):
+                new_state = {'mtime_ns': mtime}
+            self.node.set_state(new_state)
+            self.apply_modified_files(self.node, modified_files)
             self.node.release()
         yield None
 
+    def scan(self, container_path, src_path, known_files, can_skip_listing,
+             last_mtime):
+        """Detect the changes of the folder, in the scanner threads.
+
+        Returns:
+            tuple: list of files and list of sub-folders (both None if the
+                folder has not been listed), stat of the files, by name,
+                and mtime of the folder.
+        """
+        # The mtime is read before the listing: a change made meanwhile
+        # will be detected by the next task.
+        mtime = self.get_mtime(container_path, src_path)
+        file_stats = None
+        if can_skip_listing and mtime == last_mtime:
+            file_stats = self.stat_files(container_path, src_path,
+                                         known_files)
+        if file_stats is not None:
+            _logger.log(5, 'Folder "%s" unchanged.', src_path)
+            return None, None, file_stats, mtime
+
+        file_stats = {}
+        file_child_list, folder_child_list = self.execute(
+            container_path, self.node, self.local_hint, file_stats)
+        return file_child_list, folder_child_list, file_stats, mtime
+
+    @staticmethod
+    def get_known_files(node):
+        """Get the files of the folder that could be modified silently.
+
+        Notes:
+            The index tree must be locked before calling this method.
+
+        Args:
+            node (FolderNode): target node.
+        Returns:
+            Dict[Text, Optional[Tuple[int, int, int]]]: fingerprint of each
+                sync file without task, by name.
+        """
+        return {name: child.get_fingerprint()
+                for name, child in node.children.items()
+                if isinstance(child, FileNode) and child.sync and
+                child.task is None}
+
+    @staticmethod
+    def get_mtime(container_path, src_path):
+        """Get the mtime of a local folder.
+
+        Returns:
+            Optional[int]: mtime in nanoseconds, or None if the folder is
+                not readable.
+        """
+        dir_path = os.path.normpath(os.path.join(container_path, src_path))
+        try:
+            stat_result = os.stat(dir_path)
+        except (OSError, IOError):
+            return None
+        return _Task._fingerprint_from_stat(stat_result)[1]
+
+    @staticmethod
+    def stat_files(container_path, src_path, names):
+        """Get the stat of the files of a folder which has not been listed.
+
+        Args:
+            container_path (Text): absolute path of the root container folder.
+            src_path (Text): path of the folder, relative to the root
+                container folder.
+            names (Iterable[Text]): names of the files.
+        Returns:
+            Optional[Dict[Text, os.stat_result]]: stat of each file, by
+                name. None if one of them is missing, or is not a regular
+                file anymore: the folder must be listed.
+        """
+        file_stats = {}
+        for name in names:
+            abs_path = os.path.join(container_path, src_path, name)
+            try:
+                file_stat = os.lstat(abs_path)
+            except (OSError, IOError) as e:
+                if e.errno == errno.ENOENT:
+                    return None
+                _logger.warning('File "%s" unreadable by stat: %s',
+                                abs_path, err2unicode(e))
+                continue
+            if not stat.S_ISREG(file_stat.st_mode):
+                return None
+            file_stats[name] = file_stat
+        return file_stats
+
+    @staticmethod
+    def find_modified_files(known_files, file_stats):
+        """Compare the fingerprints of the files to those of the index.
+
+        Args:
+            known_files (Dict): result of `get_known_files()`.
+            file_stats (Dict[Text, os.stat_result]): stat of the files
+                present in the folder, by name.
+        Returns:
+            Dict[Text, Tuple[int, int, int]]: actual fingerprints of the
+                files which have changed (or whose fingerprint is unknown).
+        """
+        modified_files = {}
+        for name, fingerprint in known_files.items():
+            file_stat = file_stats.get(name)
+            if file_stat is None:
+                continue  # Removed: handled by the listing.
+            actual_fingerprint = _Task._fingerprint_from_stat(file_stat)
+            if not FolderTask.is_same_fingerprint(fingerprint,
+                                                  actual_fingerprint):
+                modified_files[name] = actual_fingerprint
+        return modified_files
+
+    @staticmethod
+    def is_same_fingerprint(fingerprint, actual_fingerprint):
+        """Compare a fingerprint of the index to the actual one.
+
+        On Windows, the stats given by the folder listing have no inode (it's
+        set to 0). In this case, only the size and mtime are compared.
+
+        Args:
+            fingerprint (Optional[Tuple[int, int, int]]): fingerprint of the
+                index.
+            actual_fingerprint (Tuple[int, int, int]): fingerprint from the
+                file's stat.
+        Returns:
+            bool: True if the file has not changed.
+        """
+        if fingerprint is None:
+            return False
+        if not actual_fingerprint[2]:
+            return tuple(fingerprint[:2]) == tuple(actual_fingerprint[:2])
+        return tuple(fingerprint) == tuple(actual_fingerprint)
+
+    @staticmethod
+    def apply_modified_files(node, modified_files):
+        """Set "Modified" hints to the files which have changed.
+
+        Files modified by another task meanwhile are ignored.
+
+        Notes:
+            The index tree must be locked before calling this method.
+
+        Args:
+            node (FolderNode): target node
+            modified_files (Dict): result of `find_modified_files()`.
+        """
+        for name, fingerprint in modified_files.items():
+            child = node.children.get(name)
+            if not isinstance(child, FileNode) or not child.sync or \
+                    child.task is not None:
+                continue
+            if FolderTask.is_same_fingerprint(child.get_fingerprint(),
+                                              fingerprint):
+                continue
+            _logger.log(5, 'File "%s" has changed.', child.get_full_path())
+            HintBuilder.apply_modified_event(HintBuilder.SCOPE_LOCAL, child)
+
     @classmethod
-    def execute(cls, container_path, node, local_hint):
+    def execute(cls, container_path, node, local_hint, file_stats=None):
         """Execute the task.
 
         Note:
@@ -72,6 +313,8 @@ class FolderTask(object):
                 node.
             node (FolderNode): target node
             local_hint (Optional[Hint]): local hint of the target node.
+            file_stats (Optional[Dict]): if set, receives the stat of each
+                listed file. See `list_dir()`.
         Returns:
             Tuple[List[Text], List[Text]]: list of file, then list of
                 sub-folders present in the target folder.
@@ -87,20 +330,21 @@ class FolderTask(object):
             try:
                 os.rmdir(dir_path)
             except (IOError, OSError) as e:
-                if e.errno is errno.ENOENT:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR):
                     _logger.log(5, 'Folder "%s" is gone.', src_path)
                     return [], []
                 if e.errno is errno.ENOTEMPTY:
                     # File has been added.
-                    return cls.list_dir(container_path, src_path, local_hint)
+                    return cls.list_dir(container_path, src_path, local_hint,
+                                        file_stats)
                 else:
                     raise
             _logger.log(5, 'Empty folder "%s" removed.', src_path)
             return [], []
-        return cls.list_dir(container_path, src_path, local_hint)
+        return cls.list_dir(container_path, src_path, local_hint, file_stats)
 
     @staticmethod
-    def list_dir(container_path, src_path, local_hint):
+    def list_dir(container_path, src_path, local_hint, file_stats=None):
         """List elements presents in the directory
 
         Args:
@@ -109,6 +353,8 @@ class FolderTask(object):
                 container folder.
             local_hint (Hint): hint node. It's used to gives more accurate log
                 messages.
+            file_stats (Optional[Dict]): if set, receives the stat of each
+                listed file, by name.
         Returns:
             Tuple[List[Text], List[Text]]: list of file, then list of
                 sub-folders present in the target folder.
@@ -117,7 +363,7 @@ class FolderTask(object):
         dir_path = os.path.normpath(dir_path)
 
         try:
-            list_files = os.listdir(dir_path)
+            content = dir_scanner.scan_dir(dir_path)
         except (OSError, IOError) as e:
             if e.errno == errno.ENOENT:  # No such file or directory
                 if isinstance(local_hint, ModifiedHint):
@@ -127,43 +373,17 @@ class FolderTask(object):
                     _logger.log(5, 'Folder %s is gone.', src_path)
                 return [], []
             elif e.errno == errno.ENOTDIR:  # Not a directory
-                raise  # TODO: conflict between file and directory ?
+                # Replaced by a file: the parent folder will handle it once
+                # this node is removed.
+                _logger.log(5, 'Folder %s is not a folder anymore.',
+                            src_path)
+                return [], []
             else:
                 raise
 
-        file_list = []
-        folder_list = []
-        for name in list_files:
-            rel_path = os.path.join(src_path, name)
-            abs_path = os.path.join(container_path, rel_path)
-
-            if config.get('exclude_hidden_files') and is_hidden(abs_path):
-                continue
-
-            if sys.platform in ['win32', 'cygwin']:
-                rel_path = rel_path.replace('\\', '/')
-
-            if not is_path_allowed(rel_path):
-                continue
-
-            try:
-                file_stat = os.lstat(abs_path)
-            except (OSError, IOError) as e:
-                if e.errno == errno.ENOENT:
-                    continue  # file disappeared between list_dir() and stat()
-                else:
-                    _logger.warning('File "%s" unreadable by stat, when '
-                                    'listing content of "%s" folder: %s',
-                                    src_path, err2unicode(e))
-                    continue  # TODO: We shouldn't ignore these files.
-
-            if stat.S_ISDIR(file_stat.st_mode):
-                folder_list.append(name)
-            elif stat.S_ISREG(file_stat.st_mode):
-                file_list.append(name)
-            else:
-                _logger.info('Non-regular file %s ignored', abs_path)
-        return file_list, folder_list
+        if file_stats is not None:
+            file_stats.update(content.file_stats)
+        return content.files, content.folders
 
     @staticmethod
     def diff_node_and_apply_result(node, new_state, file_child_list,
@@ -176,49 +396,126 @@ class FolderTask(object):
         - Create and set "Modified" hints to new child element.
 
         Notes:
-            The index tree must be locked before calling this method.
+            The index tree must be locked before calling this method. For
+            large folders, `diff_children()` followed by `apply_diff()`
+            allows to release the lock between batches of changes.
 
         Args:
             node (FolderNode): target node
-            new_state (Optional[Dict]): new state for the target node. Actually
-                always None.
-            file_child_list (List[Text]): list of name of file child elements.
-            folder_child_list (List[Text]): list of name of folder child
+            new_state (Optional[Dict]): new state for the target node: None,
+                or the mtime of the listed folder.
+            file_child_list (Iterable[Text]): list of name of file child
+                elements.
+            folder_child_list (Iterable[Text]): list of name of folder child
                 elements.
         """
-        folder_path = node.get_full_path()
-        _logger.log(5, 'Apply result for FolderTask %s', folder_path)
-
+        changes = FolderTask.diff_children(node, file_child_list,
+                                           folder_child_list)
+        if changes.replaced_children:
+            new_state = None  # The folder must be listed again.
         node.set_state(new_state)
+        for action, value in changes.iter_changes():
+            FolderTask._apply_change(node, action, value,
+                                     changes.new_file_sizes)
+
+    @staticmethod
+    def diff_children(node, file_child_list, folder_child_list,
+                      file_stats=None):
+        """Compare the children of a node to the content of the folder.
 
-        child_to_delete = []
-        for child in node.children.values():
+        The comparison is done by set lookups, in a single pass over the
+        children.
 
-            # TODO: catch conflict between file and folders
-            if child.name in file_child_list:
-                file_child_list.remove(child.name)
-            elif child.name in folder_child_list:
-                folder_child_list.remove(child.name)
+        Notes:
+            The index tree must be locked before calling this method.
+
+        Args:
+            node (FolderNode): target node
+            file_child_list (Iterable[Text]): list of name of file child
+                elements.
+            folder_child_list (Iterable[Text]): list of name of folder child
+                elements.
+            file_stats (Optional[Dict[Text, os.stat_result]]): stat of the
+                files, by name. Used to know the size of the new files.
+        Returns:
+            FolderDiff: changes to apply to the node's children.
+        """
+        new_files = set(file_child_list)
+        new_folders = set(folder_child_list)
+        changes = FolderDiff()
+
+        for name, child in node.children.items():
+            if name in new_files:
+                new_files.discard(name)
+                if isinstance(child, FolderNode):
+                    changes.replaced_children.append(child)
+            elif name in new_folders:
+                new_folders.discard(name)
+                if isinstance(child, FileNode):
+                    changes.replaced_children.append(child)
             else:
-                child_to_delete.append(child)
+                changes.deleted_children.append(child)
+
+        changes.new_files = sorted(new_files)
+        changes.new_folders = sorted(new_folders)
+        if file_stats:
+            changes.new_file_sizes = dict(
+                (name, file_stats[name].st_size)
+                for name in changes.new_files if name in file_stats)
 
-        if child_to_delete or file_child_list or folder_child_list:
+        if changes:
             _logger.log(5,
-                        '%s child deleted, %s new file(s) and %s new '
-                        'folder(s) in folder %s',
-                        len(child_to_delete),
-                        len(file_child_list),
-                        len(folder_child_list),
-                        folder_path)
-
-        for child in child_to_delete:
-            HintBuilder.apply_deleted_event(HintBuilder.SCOPE_LOCAL, child)
-
-        for name in file_child_list:
-            child = FileNode(name)
-            node.add_child(child)
-            HintBuilder.apply_modified_event(HintBuilder.SCOPE_LOCAL, child)
-        for name in folder_child_list:
-            child = FolderNode(name)
+                        '%s child deleted, %s child replaced, %s new file(s) '
+                        'and %s new folder(s) in folder %s',
+                        len(changes.deleted_children),
+                        len(changes.replaced_children),
+                        len(changes.new_files), len(changes.new_folders),
+                        node.get_full_path())
+        return changes
+
+    @staticmethod
+    def apply_diff(index_tree, node, changes):
+        """Apply the changes found by `diff_children()`.
+
+        The changes are applied by batches of `HintBuilder.BATCH_SIZE`: the
+        tree lock is released between two batches, so a huge folder doesn't
+        block the other threads. Children modified meanwhile by another
+        event are left untouched.
+
+        Notes:
+            The index tree must NOT be locked before calling this method.
+
+        Args:
+            index_tree (IndexTree): tree owning the node.
+            node (FolderNode): target node, acquired by the task.
+            changes (FolderDiff): result of `diff_children()`.
+        """
+        events = list(changes.iter_changes())
+        for start in range(0, len(events), HintBuilder.BATCH_SIZE):
+            with index_tree.lock:
+                for action, value in \
+                        events[start:start + HintBuilder.BATCH_SIZE]:
+                    FolderTask._apply_change(node, action, value,
+                                             changes.new_file_sizes)
+
+    @staticmethod
+    def _apply_change(node, action, value, file_sizes):
+        if action in (FolderDiff.NEW_FILE, FolderDiff.NEW_FOLDER):
+            if value in node.children:
+                return  # Added meanwhile.
+            if action == FolderDiff.NEW_FILE:
+                child = FileNode(value)
+            else:
+                child = FolderNode(value)
             node.add_child(child)
-            HintBuilder.apply_modified_event(HintBuilder.SCOPE_LOCAL, child)
+            HintBuilder.apply_modified_event(HintBuilder.SCOPE_LOCAL, child,
+                                             size=file_sizes.get(value))
+            return
+
+        if node.children.get(value.name) is not value:
+            return  # Removed meanwhile.
+        if action == FolderDiff.REPLACED:
+            _logger.debug('"%s" has been replaced by an element of another '
+                          'type.', value.get_full_path())
+            node.add_replaced_child(value.name)
+        HintBuilder.apply_deleted_event(HintBuilder.SCOPE_LOCAL, value)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+"""Compute the md5 hash of file contents, out of the filesync workers.
+
+The hashes are computed by a small pool of threads dedicated to this task,
+so a big file doesn't block a filesync worker (see `task_consumer`) during
+its hash computation. Files are read by fixed-size blocks. They're not mapped
+in memory: a local file truncated during the hash computation would crash the
+process.
+
+Hashes of local files are memoized by their identity and version: device,
+inode, size and mtime (in nanoseconds). A file unchanged since its last hash
+computation (or an identical file checked by two tasks) is read only once.
+
+Besides md5, used by the server, a "fast hash" can be computed, for checking
+if a local file has changed (see `get_fast_hash_algorithm()`).
+"""
+
+from collections import OrderedDict
+import hashlib
+import io
+import logging
+import os
+import stat
+import tempfile
+import threading
+
+from ..common import config
+from ..promise import ThreadPoolExecutor
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+_logger = logging.getLogger(__name__)
+
+# Size of each block read from the files.
+CHUNK_SIZE = 1024 * 1024
+
+# Max number of hashes kept in the cache.
+CACHE_SIZE = 4096
+
+_MAX_WORKER = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+MD5 = 'md5'
+
+# Algorithm of the fast hashes, used only to detect changes of local files.
+# xxHash is an optional dependency; BLAKE2 requires Python 3.6.
+if xxhash is not None:
+    FAST_HASH_ALGORITHM = 'xxh64'
+elif hasattr(hashlib, 'blake2b'):
+    FAST_HASH_ALGORITHM = 'blake2b'
+else:
+    FAST_HASH_ALGORITHM = None
+
+# Hashes of local files, by (device, inode, size, mtime_ns, algorithm), in
+# LRU order.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(_MAX_WORKER)
+        return _executor
+
+
+def _get_fileno(file_content):
+    """Get the file descriptor of a file object, if it has one.
+
+    Returns:
+        Optional[int]: the file descriptor, or None if the file object isn't
+            backed by a real file.
+    """
+    if isinstance(file_content, tempfile.SpooledTemporaryFile):
+        return None  # fileno() would write the file on the disk.
+    try:
+        return file_content.fileno()
+    except (AttributeError, IOError, OSError, ValueError,
+            io.UnsupportedOperation):
+        return None
+
+
+def _get_cache_key(fileno):
+    """Build the key identifying the version of a file in the cache.
+
+    Returns:
+        Optional[Tuple[int, int, int, int]]: device, inode, size and mtime
+            (in nanoseconds). None if the file can't be identified.
+    """
+    stat_result = os.fstat(fileno)
+    if not stat.S_ISREG(stat_result.st_mode) or not stat_result.st_ino:
+        return None
+    mtime_ns = getattr(stat_result, 'st_mtime_ns', None)
+    if mtime_ns is None:  # Python 2
+        mtime_ns = int(stat_result.st_mtime * 1000000000)
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size,
+            mtime_ns)
+
+
+def _get_cached_hash(key):
+    with _cache_lock:
+        md5 = _cache.get(key)
+        if md5 is not None:
+            _cache[key] = _cache.pop(key)  # move to the end.
+        return md5
+
+
+def _cache_hash(key, md5):
+    with _cache_lock:
+        _cache.pop(key, None)
+        _cache[key] = md5
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _new_hash(algorithm):
+    if algorithm == MD5:
+        return hashlib.md5()
+    elif algorithm == 'xxh64':
+        return xxhash.xxh64()
+    elif algorithm == 'blake2b':
+        return hashlib.blake2b(digest_size=16)
+    raise ValueError('Unknown hash algorithm: %s' % algorithm)
+
+
+def get_fast_hash_algorithm():
+    """Get the algorithm to use for the fast hashes of the local files.
+
+    Returns:
+        Optional[str]: name of the algorithm. None if the fast hashes are
+            disabled (option "fast_local_hash"), or if no fast algorithm is
+            available.
+    """
+    if not config.get('fast_local_hash'):
+        return None
+    return FAST_HASH_ALGORITHM
+
+
+def _find_memoized_hashes(file_content, algorithms, memoize):
+    """Search the hashes of a file in the cache.
+
+    If found, the cursor is moved at the end of the file, as if the file was
+    read.
+
+    Returns:
+        Tuple[Optional[Tuple], Optional[Tuple[str]]]: the cache key of the
+            file (None if it can't be memoized), and its hashes (None if one
+            of them is unknown).
+    """
+    if not memoize or config.get('verify_all_hashes'):
+        return None, None
+    fileno = _get_fileno(file_content)
+    if fileno is None or file_content.tell() != 0:
+        return None, None
+    cache_key = _get_cache_key(fileno)
+    if cache_key is None:
+        return None, None
+    hashes = tuple(_get_cached_hash(cache_key + (algorithm,))
+                   for algorithm in algorithms)
+    if None in hashes:
+        return cache_key, None
+    file_content.seek(0, os.SEEK_END)
+    return cache_key, hashes
+
+
+def compute_hashes(file_content, algorithms, memoize=False):
+    """Compute one or many hashes of a file, in the current thread.
+
+    The file is read only once, whatever the number of algorithms. It's
+    hashed from the current position of the cursor, and the cursor is not
+    reset at the end.
+
+    Args:
+        file_content (file-like): file to hash, opened in binary mode.
+        algorithms (Sequence[str]): hash algorithms: `MD5`, or a value
+            returned by `get_fast_hash_algorithm()`.
+        memoize (bool): if True, the hashes are memoized. Should be set only
+            for local files, not for temporary files whose inode can be
+            reused. The memoization is always disabled when the option
+            "verify_all_hashes" is set.
+    Returns:
+        Tuple[str]: the hashes, in the same order than `algorithms`. md5
+            hashes are in hexadecimal form; other hashes are of the form
+            "<algorithm>:<hex>".
+    """
+    cache_key, hashes = _find_memoized_hashes(file_content, algorithms,
+                                              memoize)
+    if hashes is not None:
+        return hashes
+
+    hash_objects = [_new_hash(algorithm) for algorithm in algorithms]
+    while True:
+        buf = file_content.read(CHUNK_SIZE)
+        if not buf:
+            break
+        for hash_object in hash_objects:
+            hash_object.update(buf)
+    hashes = tuple(
+        hash_object.hexdigest() if algorithm == MD5 else
+        '%s:%s' % (algorithm, hash_object.hexdigest())
+        for algorithm, hash_object in zip(algorithms, hash_objects))
+
+    # The file may have been modified during the read.
+    if cache_key is not None and \
+            cache_key == _get_cache_key(file_content.fileno()):
+        for algorithm, value in zip(algorithms, hashes):
+            _cache_hash(cache_key + (algorithm,), value)
+    return hashes
+
+
+def compute_md5(file_content, memoize=False):
+    """Compute the md5 hash of a file, in the current thread.
+
+    Args:
+        file_content (file-like): file to hash. See `compute_hashes()`.
+        memoize (bool): see `compute_hashes()`.
+    Returns:
+        str: md5 hash, in hexadecimal form.
+    """
+    return compute_hashes(file_content, (MD5,), memoize)[0]
+
+
+def copy_and_compute_md5(file_content, dst_path):
+    """Write a file in `dst_path`, and compute its md5 hash at the same time.
+
+    The content is read only once: it can be a stream, like the output of
+    GPG. `file_content` is closed at the end.
+
+    Args:
+        file_content (file-like): file to copy, opened in binary mode.
+        dst_path (str): path of the destination file. It's overwritten if it
+            exists.
+    Returns:
+        str: md5 hash of the content, in hexadecimal form.
+    """
+    md5 = hashlib.md5()
+    with file_content, io.open(dst_path, 'wb') as dst_file:
+        while True:
+            buf = file_content.read(CHUNK_SIZE)
+            if not buf:
+                break
+            md5.update(buf)
+            dst_file.write(buf)
+    return md5.hexdigest()
+
+
+def submit(callback, *args, **kwargs):
+    """Execute a function computing hashes in the hash threads.
+
+    Args:
+        callback (callable): function to execute, calling `compute_hashes()`
+            or `compute_md5()`.
+        *args: arguments passed to the callback.
+        **kwargs: keywords arguments passed to the callback.
+    Returns:
+        Promise: fulfilled with the value returned by the callback.
+    """
+    return _get_executor().submit(callback, *args, **kwargs)
+
+
+def stop():
+    """Stop the hash threads, once the pending computations are done.
+
+    A new pool is started by the next call to `submit()`.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+def clear_cache():
+    """Forget all the memoized hashes."""
+    with _cache_lock:
+        _cache.clear()
@@ -43,9 +43,15 @@ class MovedStateMachineStatus(object):
         dest_path = os.path.join(self.task.local_path,
                                  self.destination_target.rel_path)
 
+        # If the fast hash of the file is known (probably by the source, as
+        # it's a move), the md5 is not computed.
+        if self.destination_target.fast_hash is not None:
+            known_target = self.destination_target
+        else:
+            known_target = self.source_target
         with open(dest_path, 'rb') as file_content:
-            self.current_local_dest_md5 = self.task._compute_md5_hash(
-                file_content)
+            self.current_local_dest_md5, _ = self.task._compute_local_hashes(
+                file_content, known_target)
 
         return self.current_local_dest_md5
 
@@ -95,8 +101,7 @@ class MovedLocalFilesTask(_Task):
 
             elif next_action == ACTION_RISK_OF_CONFLICT_REMOTE_SRC_FILE:
                 try:
-                    result = yield self.container.download(
-                        state.source_target.rel_path)
+                    result = yield self._download(state.source_target)
                     metadata, state.remote_src_file_content = result
                     state.remote_src_file_cyphered_md5 = metadata['hash']
                 except HTTPNotFoundError:
@@ -126,8 +131,7 @@ class MovedLocalFilesTask(_Task):
 
             elif next_action == ACTION_RISK_OF_CONFLICT_REMOTE_DEST_FILE:
                 try:
-                    result = yield self.container.download(
-                        state.destination_target.rel_path)
+                    result = yield self._download(state.destination_target)
                     metadata, remote_dest_file = result
                     remote_dest_cyphered_md5 = metadata['hash']
                 except HTTPNotFoundError:
@@ -233,12 +237,7 @@ class MovedLocalFilesTask(_Task):
             state.source_target.set_hash(None, None)
             return ACTION_CHECK_REMOTE_DEST_FILE
 
-        try:
-            md5 = self._compute_md5_hash(state.remote_src_file_content)
-            state.remote_src_file_content.seek(0)
-        except:
-            state.remote_src_file_content.close()
-            raise
+        md5 = state.remote_src_file_content.md5
 
         if state.source_target.local_md5 is None:
             current_local_dest_md5 = state.get_current_local_dest_md5()
@@ -268,7 +267,7 @@ class MovedLocalFilesTask(_Task):
             self._log(_logger, 'Move remote source file to the new '
                                'destination.')
 
-            state.current_local_dest_md5 = self._write_downloaded_file(
+            state.current_local_dest_md5, _ = self._write_downloaded_file(
                 state.remote_src_file_content,
                 state.destination_target)
             state.source_target.set_hash(None, None)
@@ -276,12 +275,13 @@ class MovedLocalFilesTask(_Task):
             self._log(_logger, 'Conflict with the file at the new destination!'
                                ' Recreate at source.')
 
-            local_src_md5 = self._write_downloaded_file(
+            local_src_md5, fingerprint = self._write_downloaded_file(
                 state.remote_src_file_content,
                 state.source_target)
 
             state.source_target.set_hash(local_src_md5,
-                                         state.remote_src_file_cyphered_md5)
+                                         state.remote_src_file_cyphered_md5,
+                                         fingerprint)
 
             state.skip_remote_source_remove = True
 
@@ -317,9 +317,7 @@ class MovedLocalFilesTask(_Task):
         if remote_dest_file_content is None:
             return ACTION_UPLOAD_DEST_FILE
 
-        remote_uncyphered_md5 = self._compute_md5_hash(
-            remote_dest_file_content)
-        remote_dest_file_content.seek(0)
+        remote_uncyphered_md5 = remote_dest_file_content.md5
 
         current_local_dest_md5 = state.get_current_local_dest_md5()
 
@@ -39,7 +39,7 @@ class RemovedRemoteFilesTask(_Task):
             return
 
         with open(src_path, 'rb') as file_content:
-            md5 = self._compute_md5_hash(file_content)
+            md5, _ = yield self._hash_local_file(file_content, target)
 
         if target.local_md5 != md5:
             self._log(_logger, 'File has been localy updated, '
@@ -60,4 +60,3 @@ class RemovedRemoteFilesTask(_Task):
 
         target.set_hash(None, None)
         return
-        yield  # make it a generator
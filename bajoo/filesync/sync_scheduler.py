@@ -1,8 +1,35 @@
 # -*- coding: utf-8 -*-
 
+from collections import deque
+import threading
+
 from ..index import IndexTree
 
 
+class _TreeEntry(object):
+    """Scheduling data of an index tree.
+
+    Attributes:
+        tree (IndexTree): the tree.
+        owner (Any): object associated to the tree (its container).
+        weight (int): number of nodes returned in a row, at each turn.
+        generator (Optional[Iterator]): result of
+            `tree.browse_all_non_sync_nodes()`, if a browse is ongoing.
+        queued (bool): True if the entry is in the ready queue (or is the
+            current entry).
+        notified (bool): True if the tree got new nodes to sync since the
+            last browse.
+    """
+
+    def __init__(self, tree, owner, weight):
+        self.tree = tree
+        self.owner = owner
+        self.weight = weight
+        self.generator = None
+        self.queued = False
+        self.notified = False
+
+
 class SyncScheduler(object):
     """Browse dirty indexes and find the node that should be cleaned first.
 
@@ -11,24 +38,48 @@ class SyncScheduler(object):
     finish, ...), and returns the node (with `get_node()`) in the best order
     possible.
 
-    When possible, the scheduler try to grep the nodes per tree.
+    Only the trees having nodes to sync are browsed: they're kept in a ready
+    queue, and a clean or blocked tree leaves the queue until it notifies
+    (by the `IndexTree.nodes_ready` signal) that new nodes are available. The
+    cost of `get_node()` doesn't depend of the number of clean trees.
+
+    The ready trees are served in a weighted round-robin: each tree gives up
+    to `weight` nodes in a row, then goes to the end of the queue.
+
+    `get_node()`, `add_index_tree()` and `remove_index_tree()` must be called
+    by the same thread (or under a common lock). The notifications can come
+    from any thread.
     """
 
     def __init__(self):
-        self._index_trees = []
+        self._entries = {}
 
-        # index of, the next tree to browse in self._index_trees
-        self._index_next_tree = 0
+        # Protects the ready queue and the `queued` and `notified` flags of
+        # the entries: the trees notify with their own lock acquired.
+        self._lock = threading.Lock()
+        self._ready = deque()
 
-        self._generators = []
+        # Entry being served, and number of nodes it can still give.
+        self._current = None
+        self._credit = 0
 
-    def add_index_tree(self, tree):
+    def add_index_tree(self, tree, owner=None, weight=1):
         """Add a new tree to browse.
 
         Args:
             tree (IndexTree): new tree to browse.
+            owner (optional): object associated to the tree, returned by
+                `get_owner()`.
+            weight (int, optional): max number of nodes of this tree
+                returned in a row. A tree with a weight of 2 get twice as
+                many tasks than a tree of weight 1, when both are dirty.
         """
-        self._index_trees.append(tree)
+        if tree in self._entries:
+            return
+        entry = _TreeEntry(tree, owner, max(1, weight))
+        self._entries[tree] = entry
+        tree.nodes_ready.connect(self._on_nodes_ready)
+        self._notify(entry)  # The tree can be already dirty.
 
     def remove_index_tree(self, tree):
         """Remove an index tree from the list
@@ -38,20 +89,43 @@ class SyncScheduler(object):
         Args:
             tree (IndexTree): the tree to remove.
         """
-
-        try:
-            self._index_trees.remove(tree)
-        except ValueError:
+        entry = self._entries.pop(tree, None)
+        if entry is None:
             return
 
-        if self._index_next_tree >= len(self._index_trees):
-            self._index_next_tree = 0
+        tree.nodes_ready.disconnect(self._on_nodes_ready)
+        with self._lock:
+            if entry.queued and entry is not self._current:
+                self._ready.remove(entry)
+            entry.queued = False
+        if entry is self._current:
+            self._current = None
+        if entry.generator is not None:
+            entry.generator.close()
+            entry.generator = None
 
-        for idx, data_tree in enumerate(self._generators):
-            if data_tree['tree'] is tree:
-                data_tree['gen'].close()
-                del self._generators[idx]
-                return
+    def get_owner(self, tree):
+        """Get the object associated to a tree by `add_index_tree()`.
+
+        Returns:
+            Any: the owner, or None if the tree is not in the scheduler.
+        """
+        entry = self._entries.get(tree)
+        return entry.owner if entry is not None else None
+
+    def _on_nodes_ready(self, tree):
+        """Called by the trees, from any thread, with their lock acquired."""
+        entry = self._entries.get(tree)
+        if entry is not None:
+            self._notify(entry)
+
+    def _notify(self, entry):
+        """Put a tree in the ready queue."""
+        with self._lock:
+            entry.notified = True
+            if not entry.queued:
+                entry.queued = True
+                self._ready.append(entry)
 
     def get_node(self):
         """Find the next node that should be sync.
@@ -61,39 +135,64 @@ class SyncScheduler(object):
                 and the IndexTree the node belongs to. If there is none
                 available, return (None, None)
         """
-
-        for data_tree in self._generators[:]:
-            try:
-                node = next(data_tree['gen'])
-            except StopIteration:
-                self._generators.remove(data_tree)
-            else:
-                if node is not IndexTree.WAIT_FOR_TASK:
-                    return data_tree['tree'], node
-
-        if len(self._generators) >= len(self._index_trees):
-            # All trees have a generator
-            return None, None
-
-        # new generator needed;
-        start_index = self._index_next_tree
         while True:
-            tree = self._index_trees[self._index_next_tree]
-            self._index_next_tree += 1
-            self._index_next_tree %= len(self._index_trees)
+            entry = self._current
+            if entry is None or self._credit <= 0:
+                entry = self._next_ready_entry()
+                if entry is None:
+                    return None, None
+                self._credit = entry.weight
+
+            node = self._browse(entry)
+            if node is not None:
+                self._credit -= 1
+                return entry.tree, node
+
+            # Clean or blocked: the tree leaves the queue, unless it has been
+            # notified meanwhile.
+            with self._lock:
+                self._current = None
+                if entry.notified and entry.tree in self._entries:
+                    self._ready.append(entry)
+                else:
+                    entry.queued = False
 
-            if tree not in (gen.get('tree') for gen in self._generators):
-                gen = tree.browse_all_non_sync_nodes()
+    def _next_ready_entry(self):
+        """Move the current entry at the end of the queue, and pop the next.
 
-                try:
-                    node = next(gen)
-                except StopIteration:
-                    pass  # clean tree
-                else:
-                    self._generators.append({'tree': tree, 'gen': gen})
-                    if node is not IndexTree.WAIT_FOR_TASK:
-                        return tree, node
+        Returns:
+            Optional[_TreeEntry]: the next entry to serve.
+        """
+        with self._lock:
+            if self._current is not None:
+                self._ready.append(self._current)
+                self._current = None
+            if not self._ready:
+                return None
+            self._current = self._ready.popleft()
+            self._current.notified = False
+            return self._current
+
+    def _browse(self, entry):
+        """Get the next node of a tree.
 
-            if self._index_next_tree == start_index:
-                # We've tested all trees.
-                return None, None
+        Returns:
+            Optional[BaseNode]: the node, or None if the tree is clean or all
+                its non-sync nodes are waiting for a task.
+        """
+        new_generator = False
+        while True:
+            if entry.generator is None:
+                entry.generator = entry.tree.browse_all_non_sync_nodes()
+                new_generator = True
+            try:
+                node = next(entry.generator)
+            except StopIteration:
+                entry.generator = None
+                if new_generator:
+                    return None  # clean tree
+                continue  # The previous browse may have missed some nodes.
+
+            if node is IndexTree.WAIT_FOR_TASK:
+                return None
+            return node
@@ -11,6 +11,13 @@ _logger = logging.getLogger(__name__)
 _MAX_SIMULTANEOUS_TASK = 100
 _MAX_WORKER = 5
 
+# Max number of started bulk tasks. The other slots are kept for the
+# metadata tasks, so they're never stuck behind large transfers.
+_MAX_BULK_TASK = 20
+
+# Max number of metadata tasks started in a row while bulk tasks are waiting.
+_MAX_METADATA_BURST = 8
+
 _executor = None
 
 
@@ -23,7 +30,12 @@ class FilesyncContext(SharedContext):
             queue (Promises not yet resolved).
         ongoing_task_queue (deque): List of started, segmented tasks, waiting
             for the next step.
-        task_queue (deque): non-started tasks (both high and low priority).
+        task_queue (deque): non-started metadata tasks (both high and low
+            priority).
+        bulk_task_queue (deque): non-started bulk tasks (both high and low
+            priority).
+        bulk_generators (set): generators of the started bulk tasks.
+        metadata_burst (int): number of metadata tasks started in a row.
     """
 
     def __init__(self):
@@ -31,6 +43,9 @@ class FilesyncContext(SharedContext):
         self.nb_ongoing_tasks = 0
         self.ongoing_task_queue = deque()
         self.task_queue = deque()
+        self.bulk_task_queue = deque()
+        self.bulk_generators = set()
+        self.metadata_burst = 0
 
 
 def start():
@@ -47,7 +62,7 @@ def stop():
         _executor.stop()
 
 
-def add_task(task, priority=False):
+def add_task(task, priority=False, bulk=False):
     """Add a task to the list.
 
     The task is a coroutine who performs IO-bound tasks. It can performs in
@@ -65,6 +80,10 @@ def add_task(task, priority=False):
             The task is considered done when it yield a non-Promise value.
         priority (boolean, optional): if True, the task is set on top of the
             queue.
+        bulk (boolean, optional): if True, the task transfers files content.
+            Bulk tasks have their own queue, and a limited number of them
+            are executed at the same time: the metadata tasks (folders,
+            moves, deletions, ...) are never stuck behind large transfers.
     Returns:
         Promise: Promise resolved when the task is done. If the task fails
             (raises an exception), the Promise is rejected with this exception.
@@ -73,21 +92,60 @@ def add_task(task, priority=False):
     gen = task()
     with _executor.context as ctx:
         gen_task = (deferred, gen)
+        queue = ctx.bulk_task_queue if bulk else ctx.task_queue
         if priority:
-            ctx.task_queue.appendleft(gen_task)
+            queue.appendleft(gen_task)
         else:
-            ctx.task_queue.append(gen_task)
+            queue.append(gen_task)
         _executor.context.condition.notify()
 
     return deferred.promise
 
 
+def _pop_new_task(ctx):
+    """Pop the next task to start.
+
+    Metadata tasks are started first, but after `_MAX_METADATA_BURST` of them
+    in a row, a waiting bulk task get its turn. Bulk tasks are started only
+    if less than `_MAX_BULK_TASK` of them are ongoing.
+
+    The context must be locked by the caller.
+
+    Returns:
+        Optional[Tuple[Deferred, generator]]: the task, or None if there is
+            no task which can be started.
+    """
+    can_start_bulk = (ctx.bulk_task_queue and
+                      len(ctx.bulk_generators) < _MAX_BULK_TASK)
+    if ctx.task_queue and not (can_start_bulk and
+                               ctx.metadata_burst >= _MAX_METADATA_BURST):
+        ctx.metadata_burst += 1
+        return ctx.task_queue.popleft()
+    if can_start_bulk:
+        ctx.metadata_burst = 0
+        deferred, gen = ctx.bulk_task_queue.popleft()
+        ctx.bulk_generators.add(gen)
+        return deferred, gen
+    return None
+
+
+def _end_task(context, gen):
+    """Release the slots of a started task, when it's done."""
+    with context:
+        context.nb_ongoing_tasks -= 1
+        context.bulk_generators.discard(gen)
+
+
 def _start_generator(context, deferred, gen):
     try:
         result = next(gen)
     except StopIteration:
+        with context:
+            context.bulk_generators.discard(gen)
         deferred.resolve(None)
     except:
+        with context:
+            context.bulk_generators.discard(gen)
         deferred.reject(*sys.exc_info())
     else:
         with context:
@@ -100,12 +158,10 @@ def _iter_generator(context, deferred, gen, value):
     try:
         result = gen.send(value)
     except StopIteration:
-        with context:
-            context.nb_ongoing_tasks -= 1
+        _end_task(context, gen)
         deferred.resolve(value)
     except:
-        with context:
-            context.nb_ongoing_tasks -= 1
+        _end_task(context, gen)
         deferred.reject(*sys.exc_info())
     else:
         _call_next_or_set_result(context, deferred, gen, result)
@@ -116,12 +172,10 @@ def _iter_generator_error(context, deferred, gen, reason):
     try:
         result = gen.throw(*reason)
     except StopIteration:
-        with context:
-            context.nb_ongoing_tasks -= 1
+        _end_task(context, gen)
         deferred.resolve(None)
     except:
-        with context:
-            context.nb_ongoing_tasks -= 1
+        _end_task(context, gen)
         deferred.reject(*sys.exc_info())
     else:
         _call_next_or_set_result(context, deferred, gen, result)
@@ -149,8 +203,7 @@ def _call_next_or_set_result(context, deferred, gen, value):
     if is_thenable(value):
         value.then(register_iteration, register_iteration_error, exc_info=True)
     else:
-        with context:
-            context.nb_ongoing_tasks -= 1
+        _end_task(context, gen)
         deferred.resolve(value)
         gen.close()
 
@@ -179,11 +232,10 @@ def _run_worker(context):
             except IndexError:
                 # Else, begin the next new task
                 if ctx.nb_ongoing_tasks < _MAX_SIMULTANEOUS_TASK:
-                    try:
-                        (deferred, generator) = ctx.task_queue.popleft()
+                    new_task = _pop_new_task(ctx)
+                    if new_task is not None:
+                        (deferred, generator) = new_task
                         is_ongoing_task = False
-                    except IndexError:
-                        pass
 
             if is_ongoing_task is None:
                 # No task to execute.
@@ -2,5 +2,6 @@
 
 from .index_saver import IndexSaver
 from .index_tree import IndexTree
+from .sqlite_index_saver import SQLiteIndexSaver
 
-__all__ = [IndexSaver, IndexTree]
+__all__ = [IndexSaver, IndexTree, SQLiteIndexSaver]
@@ -1,5 +1,22 @@
 # -*- coding: utf-8 -*-
 
+import sys
+
+
+def _intern_name(name):
+    """Intern the node name, as the same names are often used many times.
+
+    Python 2 can't intern unicode strings: the name is returned unchanged.
+    """
+    if type(name) is str and hasattr(sys, 'intern'):
+        return sys.intern(name)
+    return name
+
+
+def _sum_stats(stats, other_stats, sign=1):
+    """Add two tuples of stats, as returned by `BaseNode.get_stats()`."""
+    return tuple(a + sign * b for a, b in zip(stats, other_stats))
+
 
 class BaseNode(object):
     """Node member of IndexTree, representing an object of a container.
@@ -25,6 +42,10 @@ class BaseNode(object):
     event is detected, and the node's corresponding value as changed. It's a
     "hint" that can be used for syncing the node.
 
+    Statistics about the descendants (see `get_stats()`) are computed at the
+    first call, then kept up to date at each change of the hierarchy or of a
+    file's state.
+
     Attributes:
         name (Text): filename, used to represent the node.
         parent (Optional[BaseNode]): parent node. If None, this node is a root
@@ -57,52 +78,181 @@ class BaseNode(object):
         non-sync node is always dirty.
     """
 
+    # Nodes are numerous: slots save the memory of a per-instance dict.
+    __slots__ = ('name', 'parent', 'children', '_tree', '_sync', '_dirty',
+                 '_dirty_children', 'removed', '_error', 'state', '_task',
+                 '_local_hint', '_remote_hint', '_full_path', '_stats')
+
     def __init__(self, name):
         """Node constructor
 
         Args:
             name (Text): file name of the node.
         """
-        self.name = name
+        self.name = _intern_name(name)
         self.parent = None
+        # Memoized result of get_full_path(). Only set on nodes whose
+        # descendants have asked for their path.
+        self._full_path = None
+        # Aggregated stats of the descendants. None if not computed yet.
+        self._stats = None
         self.children = {}
+        self._tree = None
         self._sync = False
         self._dirty = True
+        self._dirty_children = 0  # number of children with the dirty flag.
         self.removed = False
 
-        self.error = None
+        self._error = None
         self.state = None
 
-        self.task = None
-        self.local_hint = None
-        self.remote_hint = None
+        self._task = None
+        self._local_hint = None
+        self._remote_hint = None
 
     def add_child(self, node):
         """Add a child to this node.
 
+        If the node has already a child of the same name, it's removed first.
+
         Args:
             node (BaseNode): new child.
         """
+        previous_node = self.children.get(node.name)
+        if previous_node is not None and previous_node is not node:
+            self.rm_child(previous_node)
+        self._prepare_change()
+        node._invalidate_full_path()
         node.parent = self
         self.children[node.name] = node
+        if self._are_stats_used():
+            self._add_stats(node._get_own_stats())
         if node.dirty:
+            self._dirty_children += 1
             self._propagate_dirty_flag()
+        if self._tree is not None:
+            node._set_tree(self._tree)
+            self._tree._on_node_added(node)
 
     def rm_child(self, node):
         """Remove a child from this node."""
+        self._prepare_change()
+        if self._tree is not None:
+            self._tree._on_node_removed(node)
+            node._set_tree(None)
+        if self._are_stats_used():
+            self._add_stats(node._get_own_stats(), sign=-1)
         del self.children[node.name]
         if not node.removed:
             node._propagate_removed_flag()
         if node.dirty:
+            self._dirty_children -= 1
             # will recalculate the dirty flag.
             self._clean_dirty_flags()
+        node._invalidate_full_path()
         node.parent = None
 
+    def _set_tree(self, tree):
+        """Set the IndexTree owning this node and all its descendants.
+
+        The tree is notified of each change of the persistent data (hierarchy
+        and states) made on the nodes it owns.
+
+        Args:
+            tree (Optional[IndexTree]): new owner. None if the node is detached
+                from any tree.
+        """
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            previous_tree = node._tree
+            node._tree = tree
+            if previous_tree is not None and previous_tree is not tree:
+                previous_tree._on_node_status_changed(node)
+            if tree is not None:
+                tree._on_node_status_changed(node)
+            nodes.extend(node._loaded_children().values())
+
+    def _loaded_children(self):
+        """Return the children, without loading them if they're lazy-loaded.
+
+        Children not loaded yet have no state to update: they are created
+        from the index with default values.
+
+        Returns:
+            Dict[Text, BaseNode]: children already in memory.
+        """
+        return self.children
+
     @property
     def dirty(self):
         """Read-only dirty flag"""
         return self._dirty
 
+    @property
+    def task(self):
+        """task Getter"""
+        return self._task
+
+    @task.setter
+    def task(self, task):
+        """Set the task, and inform the tree if the node become available.
+
+        Args:
+            task (Any): new task, or None if the node is released.
+        """
+        self._task = task
+        if self._tree is not None:
+            self._tree._on_node_status_changed(self)
+
+    @property
+    def error(self):
+        """error Getter"""
+        return self._error
+
+    @error.setter
+    def error(self, error):
+        """Set the error, and inform the tree.
+
+        Args:
+            error (Optional[Exception]): error of the last sync attempt.
+        """
+        self._error = error
+        if self._tree is not None:
+            self._tree._on_node_status_changed(self)
+
+    @property
+    def local_hint(self):
+        """local_hint Getter"""
+        return self._local_hint
+
+    @local_hint.setter
+    def local_hint(self, hint):
+        """Set the local hint, and inform the tree.
+
+        Args:
+            hint (Optional[Hint]): new local hint.
+        """
+        self._local_hint = hint
+        if self._tree is not None:
+            self._tree._on_node_hint_changed(self)
+
+    @property
+    def remote_hint(self):
+        """remote_hint Getter"""
+        return self._remote_hint
+
+    @remote_hint.setter
+    def remote_hint(self, hint):
+        """Set the remote hint, and inform the tree.
+
+        Args:
+            hint (Optional[Hint]): new remote hint.
+        """
+        self._remote_hint = hint
+        if self._tree is not None:
+            self._tree._on_node_hint_changed(self)
+
     @property
     def sync(self):
         """sync flag Getter"""
@@ -126,6 +276,8 @@ class BaseNode(object):
             self._clean_dirty_flags()
         else:
             self._propagate_dirty_flag()
+        if self._tree is not None:
+            self._tree._on_node_status_changed(self)
 
     def _propagate_dirty_flag(self):
         """Set this node and all ancestors as dirty."""
@@ -133,15 +285,79 @@ class BaseNode(object):
         while node and not node._dirty:
             node._dirty = True
             node = node.parent
+            if node:
+                node._dirty_children += 1
 
     def _clean_dirty_flags(self):
         """Clean dirty flag for this node and all its ancestors."""
         node = self
-        while node and node._sync:
-            if any(child.dirty for child in node.children.values()):
+        while node and node._sync and node._dirty:
+            if node._dirty_children:
                 break  # this node has at least one dirty child.
             node._dirty = False
             node = node.parent
+            if node:
+                node._dirty_children -= 1
+
+    def get_stats(self):
+        """Get statistics about all the descendants of this node.
+
+        Only the files having a state are counted. Their sizes are those
+        recorded at their last sync.
+
+        Returns:
+            Tuple[int, int, int]: number of folders, number of files, and
+                total size of the files (in bytes).
+        """
+        # The stats of the descendants are computed first, without recursion.
+        nodes = [self]
+        while nodes:
+            node = nodes[-1]
+            if node._get_cached_stats() is not None:
+                nodes.pop()
+                continue
+            missing = [child for child in node.children.values()
+                       if child._get_cached_stats() is None]
+            if missing:
+                nodes.extend(missing)
+                continue
+            stats = (0, 0, 0)
+            for child in node.children.values():
+                stats = _sum_stats(stats, child._get_own_stats())
+            node._stats = stats
+            nodes.pop()
+        return self._stats
+
+    def _get_cached_stats(self):
+        """Return the stats of the descendants, if they're already known."""
+        return self._stats
+
+    def _get_own_stats(self):
+        """Get the statistics of this node and all its descendants."""
+        nb_folders, nb_files, size = self.get_stats()
+        return nb_folders + 1, nb_files, size
+
+    def _are_stats_used(self):
+        """Check if the stats of this node are computed, and maintained.
+
+        When the stats of a node are computed, those of all its loaded
+        descendants are computed too, so its ancestors don't need to be
+        checked.
+        """
+        return self._stats is not None
+
+    def _add_stats(self, stats, sign=1):
+        """Update the stats of this node and its ancestors.
+
+        Args:
+            stats (Tuple[int, int, int]): stats to add (or subtract).
+            sign (int): 1 to add the stats; -1 to subtract them.
+        """
+        node = self
+        while node is not None:
+            if node._stats is not None:
+                node._stats = _sum_stats(node._stats, stats, sign)
+            node = node.parent
 
     def remove_itself(self):
         """Remove itself from the tree."""
@@ -149,9 +365,11 @@ class BaseNode(object):
             self.parent.rm_child(self)
 
     def _propagate_removed_flag(self):
-        self.removed = True
-        for n in self.children.values():
-            n._propagate_removed_flag()
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            node.removed = True
+            nodes.extend(node._loaded_children().values())
 
     def exists(self):
         """Check if the node physically existed the last time it was sync.
@@ -174,9 +392,22 @@ class BaseNode(object):
         Note: this method does not update the parent node! It should be used
         only on root nodes.
         """
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            node._set_not_sync_with_children()
+            nodes.extend(node._loaded_children().values())
+
+    def _set_not_sync_with_children(self):
+        """Part of `set_all_hierarchy_not_sync()` done on each node.
+
+        The node is considered as having all its children dirty.
+        """
         self._sync = False
-        for child in self.children.values():
-            child.set_all_hierarchy_not_sync()
+        self._dirty = True
+        self._dirty_children = len(self._loaded_children())
+        if self._tree is not None:
+            self._tree._on_node_status_changed(self)
 
     def get_full_path(self):
         """Return the path of the node, relative to the root node.
@@ -189,16 +420,45 @@ class BaseNode(object):
         """
         if self.parent is None:
             return u'.'
+        parent_path = self.parent._get_memoized_path()
+        if parent_path == u'.':
+            return self.name
+        return parent_path + u'/' + self.name
+
+    def _get_memoized_path(self):
+        """Same as `get_full_path()`, but memoize the result.
 
-        path_part = []
+        The paths of all the ancestors are also memoized. Only nodes having
+        children are memoized this way, so files don't keep their path.
+        """
+        if self._full_path is not None:
+            return self._full_path
+
+        uncached_nodes = []
         node = self
-        while node:
-            path_part.append(node.name)
+        while node.parent is not None and node._full_path is None:
+            uncached_nodes.append(node)
             node = node.parent
+        path = node._full_path if node.parent is not None else u'.'
 
-        path_part.reverse()
+        for node in reversed(uncached_nodes):
+            path = node.name if path == u'.' else path + u'/' + node.name
+            node._full_path = path
+        return path
 
-        return u'/'.join(path_part[1:])
+    def _invalidate_full_path(self):
+        """Forget the memoized paths of this node and its descendants.
+
+        Must be called before the node is re-parented. A node without
+        memoized path has no descendant with a memoized path, except if it's
+        a root node.
+        """
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            if node._full_path is not None or node.parent is None:
+                node._full_path = None
+                nodes.extend(node._loaded_children().values())
 
     def set_state(self, state):
         """Set the state of the node.
@@ -209,7 +469,22 @@ class BaseNode(object):
         Args:
             state (Optional[Dict]): new state
         """
+        self._prepare_change()
         self.state = state
+        self._notify_state_changed()
+
+    def _prepare_change(self):
+        """Inform the owning tree (if any) that the node will be modified.
+
+        It must be called before any change of the node's state or children.
+        """
+        if self._tree is not None:
+            self._tree._on_node_changing(self)
+
+    def _notify_state_changed(self):
+        """Inform the owning tree (if any) that the state has changed."""
+        if self._tree is not None:
+            self._tree._on_state_changed(self)
 
     def release(self):
         """Release the node reserved by a task.
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+
+"""Binary format (version 3) of the index file.
+
+The file starts by a fixed-size header: a magic string, the format version
+and the size of a JSON metadata block. The metadata contains the root node
+definition and all extra values passed by the caller (like the journal id).
+
+The rest of the file is a list of blocks. Each block contains the entries of
+all children of one folder, one after the other:
+- node type (1 byte), name length (2 bytes) and the name in UTF-8.
+- the state: 1 byte giving its kind, followed by:
+    - nothing if the state is None.
+    - 32 bytes if it's a pair of md5 (local_hash and remote_hash) in binary.
+    - 56 bytes if it's a pair of md5, followed by the file's fingerprint:
+        size (8 bytes), mtime in nanoseconds (8 bytes, signed) and inode (8
+        bytes).
+    - the same 56 bytes, followed by the fast hash of the file: its length (1
+        byte) and the hash, in ASCII.
+    - a JSON document (prefixed by its length, on 4 bytes) for all others.
+- for folders only: offset (8 bytes) and number of entries (4 bytes) of the
+    block of its own children.
+
+Blocks are written before the block of their parent folder. As all blocks
+are addressable independently, the children of a folder can be read only
+when they're needed (see `LazyChildren`).
+
+All integers are stored in little-endian.
+"""
+
+import json
+import struct
+
+from ..common.strings import ensure_unicode
+from .file_node import FileNode, _BinaryHash, _pack_hash, _unpack_hash
+from .folder_node import FolderNode
+from .index_snapshot import read_node
+
+MAGIC = b'BAJOOIDX'
+VERSION = 3
+
+_FILE_HEADER = struct.Struct('<8sBI')  # magic, version, metadata size
+_ENTRY_HEADER = struct.Struct('<BH')  # node type, name size
+_STATE_KIND = struct.Struct('<B')
+_JSON_SIZE = struct.Struct('<I')
+_CHILDREN_BLOCK = struct.Struct('<QI')  # offset, nb of entries
+_FINGERPRINT = struct.Struct('<QqQ')  # size, mtime_ns, inode
+_FAST_HASH_SIZE = struct.Struct('<B')
+
+_TYPE_FILE = 0
+_TYPE_FOLDER = 1
+
+_STATE_NONE = 0
+_STATE_MD5_PAIR = 1
+_STATE_JSON = 2
+_STATE_MD5_PAIR_FINGERPRINT = 3
+_STATE_MD5_PAIR_FINGERPRINT_FAST_HASH = 4
+
+_HASH_KEYS = {'local_hash', 'remote_hash'}
+_FINGERPRINT_KEYS = ('size', 'mtime_ns', 'inode')
+
+_HASH_SIZE = 16
+
+
+def is_binary_index(content):
+    """Check if a file content is a binary index.
+
+    Args:
+        content (bytes): content of the index file.
+    Returns:
+        bool: True if the content starts by the binary format's magic string.
+    """
+    return content[:len(MAGIC)] == MAGIC
+
+
+def read_metadata(content):
+    """Read the metadata of a binary index.
+
+    Args:
+        content (bytes): content of the index file.
+    Returns:
+        Dict: metadata, containing the 'root' node definition and all values
+            passed to `encode()`.
+    Raises:
+        ValueError: if the content is not a valid binary index.
+    """
+    if len(content) < _FILE_HEADER.size:
+        raise ValueError('Index file is truncated')
+    magic, version, metadata_size = _FILE_HEADER.unpack_from(content, 0)
+    if magic != MAGIC:
+        raise ValueError('Index file is not in binary format')
+    if version != VERSION:
+        raise ValueError('Unsupported index format version: %s' % version)
+    start = _FILE_HEADER.size
+    return json.loads(content[start:start + metadata_size].decode('utf-8'))
+
+
+def read_root_def(content):
+    """Get the definition of the root node of a binary index.
+
+    The root node definition has the same format than in
+    `IndexTree.load()`, except that its children are replaced by a
+    'lazy_children' member, of type `LazyChildren`.
+
+    Args:
+        content (bytes): content of the index file.
+    Returns:
+        Optional[Dict]: root node definition. None if the index is empty.
+    """
+    root = read_metadata(content).get('root')
+    if root is None:
+        return None
+    node_def = {'type': root['type'], 'state': root.get('state')}
+    if root.get('count'):
+        blocks_start = _FILE_HEADER.size + _FILE_HEADER.unpack_from(
+            content, 0)[2]
+        reader = _BlockReader(content, blocks_start)
+        node_def['lazy_children'] = LazyChildren(reader, root['offset'],
+                                                 root['count'])
+    return node_def
+
+
+def encode(root, metadata, read=read_node):
+    """Serialize a tree in binary format.
+
+    Folders whose children have not been loaded yet are copied from their
+    original blocks, without creating their nodes.
+
+    Args:
+        root (Optional[BaseNode]): root node of the tree.
+        metadata (Dict): extra values to store in the file. They must be
+            convertible in JSON.
+        read (Callable[[BaseNode], Tuple]): function reading the nodes' data.
+            See `index_snapshot.read_node()`.
+    Returns:
+        bytes: content of the index file.
+    """
+    metadata = dict(metadata)
+    blocks = bytearray()
+    if root is None:
+        metadata['root'] = None
+    else:
+        state, children, lazy_children = read(root)
+        offset, count = _write_block(
+            blocks, _iter_node_children(children, lazy_children, read))
+        metadata['root'] = {
+            'type': 'FILE' if isinstance(root, FileNode) else 'FOLDER',
+            'state': state,
+            'offset': offset,
+            'count': count
+        }
+
+    metadata = json.dumps(metadata).encode('utf-8')
+    return b''.join((_FILE_HEADER.pack(MAGIC, VERSION, len(metadata)),
+                     metadata, bytes(blocks)))
+
+
+def _iter_node_children(children, lazy_children, read):
+    """Yield the children of a node, as (is_folder, name, state, children).
+
+    `children` is an iterable of the same form, or None for files.
+
+    Args:
+        children (List[Tuple[Text, BaseNode]]): children of the node.
+        lazy_children (Optional[LazyChildren]): children not loaded yet.
+        read (Callable[[BaseNode], Tuple]): see `encode()`.
+    """
+    if lazy_children is not None:
+        for item in lazy_children.iter_items():
+            yield item
+        return
+
+    for name, child in children:
+        state, sub_children, sub_lazy_children = read(child)
+        if isinstance(child, FileNode):
+            yield False, name, state, None
+        else:
+            yield True, name, state, _iter_node_children(
+                sub_children, sub_lazy_children, read)
+
+
+def _write_block(blocks, children):
+    """Append the block of a folder (and the blocks of its descendants).
+
+    Args:
+        blocks (bytearray): buffer containing all blocks.
+        children (Iterable[Tuple]): children items, as returned by
+            `_iter_node_children()`.
+    Returns:
+        Tuple[int, int]: offset and number of entries of the block.
+    """
+    # Explicit stack of the folders being written: children items not
+    # written yet, block content and number of entries.
+    stack = [(iter(children), bytearray(), [0])]
+    while True:
+        items, block, count = stack[-1]
+        item = next(items, None)
+        if item is not None:
+            is_folder, name, state, sub_children = item
+            name = ensure_unicode(name).encode('utf-8')
+            block += _ENTRY_HEADER.pack(
+                _TYPE_FOLDER if is_folder else _TYPE_FILE, len(name))
+            block += name
+            block += _encode_state(state)
+            count[0] += 1
+            if is_folder:
+                # Its children block must be written first.
+                stack.append((iter(sub_children), bytearray(), [0]))
+            continue
+
+        stack.pop()
+        if count[0]:
+            result = len(blocks), count[0]
+            blocks += block
+        else:
+            result = 0, 0
+        if not stack:
+            return result
+        # End of the parent's entry: the position of this block.
+        stack[-1][1].extend(_CHILDREN_BLOCK.pack(*result))
+
+
+def _encode_fast_hash(value):
+    """Encode a fast hash, if it can be stored in binary form.
+
+    Returns:
+        Optional[bytes]: the length-prefixed hash, or None.
+    """
+    try:
+        fast_hash = value.encode('ascii')
+    except (AttributeError, UnicodeError):
+        return None
+    if len(fast_hash) > 255:
+        return None
+    return _FAST_HASH_SIZE.pack(len(fast_hash)) + fast_hash
+
+
+def _encode_state(state):
+    if state is None:
+        return _STATE_KIND.pack(_STATE_NONE)
+    keys = set(state.keys())
+    fast_hash = None
+    if 'fast_hash' in keys:
+        fast_hash = _encode_fast_hash(state['fast_hash'])
+        if fast_hash is not None:
+            keys.discard('fast_hash')
+    if keys == _HASH_KEYS or keys == _HASH_KEYS.union(_FINGERPRINT_KEYS):
+        local_hash = _pack_hash(state['local_hash'])
+        remote_hash = _pack_hash(state['remote_hash'])
+        if isinstance(local_hash, _BinaryHash) and \
+                isinstance(remote_hash, _BinaryHash):
+            if keys == _HASH_KEYS:
+                if fast_hash is None:
+                    return (_STATE_KIND.pack(_STATE_MD5_PAIR) + local_hash +
+                            remote_hash)
+            else:
+                try:
+                    fingerprint = _FINGERPRINT.pack(
+                        *(state[key] for key in _FINGERPRINT_KEYS))
+                except struct.error:
+                    pass  # Out of range: fallback to JSON.
+                else:
+                    if fast_hash is None:
+                        return (_STATE_KIND.pack(_STATE_MD5_PAIR_FINGERPRINT) +
+                                local_hash + remote_hash + fingerprint)
+                    return (_STATE_KIND.pack(
+                        _STATE_MD5_PAIR_FINGERPRINT_FAST_HASH) + local_hash +
+                        remote_hash + fingerprint + fast_hash)
+    data = json.dumps(state).encode('utf-8')
+    return _STATE_KIND.pack(_STATE_JSON) + _JSON_SIZE.pack(len(data)) + data
+
+
+class _BlockReader(object):
+    """Decode the blocks of an index file kept in memory."""
+
+    def __init__(self, content, blocks_start):
+        self._content = content
+        self._blocks_start = blocks_start
+        # Stats of the blocks already computed, by offset.
+        self._stats = {}
+
+    def get_stats(self, offset, count):
+        """Compute the stats of all the descendants described by a block.
+
+        Results are memorized, so sub-folders loaded later get their stats
+        without reading their blocks again.
+
+        Returns:
+            Tuple[int, int, int]: same value than `BaseNode.get_stats()`.
+        """
+        # The blocks of the sub-folders are computed first, without
+        # recursion.
+        blocks = [(offset, count)]
+        while blocks:
+            block_offset, block_count = blocks[-1]
+            if block_offset in self._stats:
+                blocks.pop()
+                continue
+            missing = [(children._offset, children.count)
+                       for is_folder, _name, _state, children
+                       in self.read_block(block_offset, block_count)
+                       if children is not None and
+                       children._offset not in self._stats]
+            if missing:
+                blocks.extend(missing)
+                continue
+
+            nb_folders = nb_files = total_size = 0
+            for is_folder, _name, state, children in self.read_block(
+                    block_offset, block_count):
+                if is_folder:
+                    nb_folders += 1
+                    if children is not None:
+                        sub_folders, sub_files, sub_size = \
+                            self._stats[children._offset]
+                        nb_folders += sub_folders
+                        nb_files += sub_files
+                        total_size += sub_size
+                elif state is not None:
+                    nb_files += 1
+                    total_size += state.get('size') or 0
+            self._stats[block_offset] = (nb_folders, nb_files, total_size)
+            blocks.pop()
+        return self._stats[offset]
+
+    def read_block(self, offset, count):
+        """Decode all entries of a block.
+
+        Yields:
+            Tuple[bool, Text, Optional[Dict], Optional[LazyChildren]]: for
+                each entry: True if it's a folder, the node's name, its state
+                and its children (None if there is none).
+        """
+        content = self._content
+        position = self._blocks_start + offset
+        for _ in range(count):
+            node_type, name_size = _ENTRY_HEADER.unpack_from(content, position)
+            position += _ENTRY_HEADER.size
+            name = content[position:position + name_size].decode('utf-8')
+            position += name_size
+
+            state_kind = _STATE_KIND.unpack_from(content, position)[0]
+            position += _STATE_KIND.size
+            if state_kind == _STATE_NONE:
+                state = None
+            elif state_kind in (_STATE_MD5_PAIR, _STATE_MD5_PAIR_FINGERPRINT,
+                                _STATE_MD5_PAIR_FINGERPRINT_FAST_HASH):
+                middle = position + _HASH_SIZE
+                end = middle + _HASH_SIZE
+                state = {
+                    'local_hash': _BinaryHash(content[position:middle]),
+                    'remote_hash': _BinaryHash(content[middle:end])
+                }
+                position = end
+                if state_kind != _STATE_MD5_PAIR:
+                    state.update(zip(_FINGERPRINT_KEYS,
+                                     _FINGERPRINT.unpack_from(content,
+                                                              position)))
+                    position += _FINGERPRINT.size
+                if state_kind == _STATE_MD5_PAIR_FINGERPRINT_FAST_HASH:
+                    size = _FAST_HASH_SIZE.unpack_from(content, position)[0]
+                    position += _FAST_HASH_SIZE.size
+                    state['fast_hash'] = content[
+                        position:position + size].decode('ascii')
+                    position += size
+            else:
+                data_size = _JSON_SIZE.unpack_from(content, position)[0]
+                position += _JSON_SIZE.size
+                state = json.loads(
+                    content[position:position + data_size].decode('utf-8'))
+                position += data_size
+
+            children = None
+            if node_type == _TYPE_FOLDER:
+                child_offset, child_count = _CHILDREN_BLOCK.unpack_from(
+                    content, position)
+                position += _CHILDREN_BLOCK.size
+                if child_count:
+                    children = LazyChildren(self, child_offset, child_count)
+            yield node_type == _TYPE_FOLDER, name, state, children
+
+
+class LazyChildren(object):
+    """Children of a folder node, not loaded yet from the index file.
+
+    Attributes:
+        count (int): number of children.
+        check_fingerprints (bool): if True, the files having a fingerprint
+            are created sync: their parent folder's task will check them (see
+            `IndexTree.set_tree_to_reconcile()`). Otherwise, all nodes are
+            created non-sync.
+    """
+
+    __slots__ = ('_reader', '_offset', 'count', 'check_fingerprints')
+
+    def __init__(self, reader, offset, count):
+        self._reader = reader
+        self._offset = offset
+        self.count = count
+        self.check_fingerprints = False
+
+    def load_nodes(self):
+        """Create the child nodes.
+
+        Returns:
+            List[BaseNode]: children, without parent. Sub-folders are
+                themselves lazy-loaded.
+        """
+        nodes = []
+        for is_folder, name, state, children in self._reader.read_block(
+                self._offset, self.count):
+            if is_folder:
+                node = FolderNode(name)
+                if children is not None:
+                    children.check_fingerprints = self.check_fingerprints
+                    node.set_lazy_children(children)
+            else:
+                node = FileNode(name)
+            node.set_state(state)
+            if self.check_fingerprints and not is_folder and \
+                    node.get_fingerprint() is not None:
+                node.sync = True
+            nodes.append(node)
+        return nodes
+
+    def get_stats(self):
+        """Same as `BaseNode.get_stats()`, without creating the nodes."""
+        return self._reader.get_stats(self._offset, self.count)
+
+    def iter_items(self):
+        """Same as `_iter_node_children()`, without creating the nodes."""
+        for is_folder, name, state, children in self._reader.read_block(
+                self._offset, self.count):
+            if children is not None:
+                yield is_folder, name, state, children.iter_items()
+            else:
+                yield is_folder, name, state, () if is_folder else None
+
+    def iter_files(self, path):
+        """Browse the states of all descendant files, without loading them.
+
+        Args:
+            path (Text): full path of the folder owning the children.
+        Yields:
+            Tuple[Text, Optional[Dict]]: path and state of each file. Hashes
+                are in their hexadecimal form.
+        """
+        blocks = [(path, self)]
+        while blocks:
+            path, lazy_children = blocks.pop()
+            for is_folder, name, state, children in \
+                    lazy_children._reader.read_block(lazy_children._offset,
+                                                     lazy_children.count):
+                child_path = name if path == u'.' else path + u'/' + name
+                if is_folder:
+                    if children is not None:
+                        blocks.append((child_path, children))
+                elif state is not None:
+                    yield child_path, {key: _unpack_hash(value)
+                                       for key, value in state.items()}
+                else:
+                    yield child_path, None
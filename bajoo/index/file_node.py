@@ -1,10 +1,54 @@
 # -*- coding: utf-8 -*-
 
+import binascii
 import logging
-from .base_node import BaseNode
+import re
+from .base_node import BaseNode, _sum_stats
+
+try:
+    from types import MappingProxyType
+    _NO_CHILDREN = MappingProxyType({})
+except ImportError:  # Python 2
+    class _ReadOnlyDict(dict):
+        def __setitem__(self, key, value):
+            raise TypeError('FileNode can\'t have children.')
+
+    _NO_CHILDREN = _ReadOnlyDict()
 
 _logger = logging.getLogger(__name__)
 
+_MD5_HEX_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Optional items of the state, describing the local file at the last sync.
+_FINGERPRINT_KEYS = ('size', 'mtime_ns', 'inode')
+
+
+class _BinaryHash(bytes):
+    """md5 sum stored in its 16-bytes binary form."""
+    __slots__ = ()
+
+
+def _pack_hash(value):
+    """Convert an hexadecimal md5 sum in its (twice smaller) binary form.
+
+    Values that are not md5 hex digests are returned unchanged.
+    """
+    if isinstance(value, (bytes, type(u''))) and len(value) == 32:
+        if isinstance(value, bytes):
+            text_value = value.decode('ascii', 'replace')
+        else:
+            text_value = value
+        if _MD5_HEX_PATTERN.match(text_value):
+            return _BinaryHash(binascii.unhexlify(text_value))
+    return value
+
+
+def _unpack_hash(value):
+    """Reverse of `_pack_hash()`."""
+    if isinstance(value, _BinaryHash):
+        return binascii.hexlify(value).decode('ascii')
+    return value
+
 
 class FileNode(BaseNode):
     """Node representing a single file.
@@ -12,14 +56,83 @@ class FileNode(BaseNode):
     When not None, the `state` attribute contains two values `local_hash` and
     `remote_hash`, md5 of the file's content. These values should not be None
     if the state exists.
+    The state can also contains the "fingerprint" of the local file, as seen
+    when its local hash has been computed: three values `size`, `mtime_ns`
+    and `inode`. If the file has still the same fingerprint, it can be
+    considered unchanged without computing its hash again.
+    At last, the optional value `fast_hash` is another hash of the local
+    file, cheaper to compute than md5, of the form "<algorithm>:<hex>". It's
+    used only to detect local changes.
+
+    To reduce the memory footprint of big trees, the state is not stored as a
+    dict: both hashes are kept in slots, in binary form when they are md5 hex
+    digests. The `state` attribute returns a new dict at each access;
+    modifying it has no effect on the node. File nodes have no children: they
+    all share the same read-only empty mapping.
     """
 
+    __slots__ = ('_local_hash', '_remote_hash', '_fingerprint', '_fast_hash')
+
+    @property
+    def children(self):
+        """Always empty read-only mapping."""
+        return _NO_CHILDREN
+
+    @children.setter
+    def children(self, children):
+        if children:
+            raise ValueError('FileNode can\'t have children.')
+
+    @property
+    def state(self):
+        """state Getter"""
+        if self._local_hash is None and self._remote_hash is None:
+            return None
+        state = {
+            'local_hash': _unpack_hash(self._local_hash),
+            'remote_hash': _unpack_hash(self._remote_hash)
+        }
+        if self._fingerprint is not None:
+            state.update(zip(_FINGERPRINT_KEYS, self._fingerprint))
+        if self._fast_hash is not None:
+            state['fast_hash'] = self._fast_hash
+        return state
+
+    @state.setter
+    def state(self, state):
+        """Set the state, without any check nor notification.
+
+        Args:
+            state (Optional[Dict]): new state
+        """
+        if state is None:
+            self._local_hash = self._remote_hash = None
+            self._fingerprint = self._fast_hash = None
+        else:
+            self._local_hash = _pack_hash(state.get('local_hash'))
+            self._remote_hash = _pack_hash(state.get('remote_hash'))
+            if all(state.get(key) is not None for key in _FINGERPRINT_KEYS):
+                self._fingerprint = tuple(state[key]
+                                          for key in _FINGERPRINT_KEYS)
+            else:
+                self._fingerprint = None
+            self._fast_hash = state.get('fast_hash')
+
     def set_state(self, state):
-        if self.state is not None:
-            if set(state.keys()) != {'local_hash', 'remote_hash'}:
+        if self.state is not None and state is not None:
+            keys = set(state.keys())
+            keys.discard('fast_hash')
+            if keys != {'local_hash', 'remote_hash'} and \
+                    keys != {'local_hash', 'remote_hash'}.union(
+                        _FINGERPRINT_KEYS):
                 raise ValueError('FileNode state must have two items '
-                                 '"local_hash" and "remote_hash"')
+                                 '"local_hash" and "remote_hash", and '
+                                 'optionally a fingerprint and a fast hash.')
+        self._prepare_change()
+        old_stats = self._get_own_stats()
         self.state = state
+        self._report_stats_change(old_stats)
+        self._notify_state_changed()
 
     def get_hashes(self):
         """Get both local and remote hashes of the node.
@@ -30,11 +143,27 @@ class FileNode(BaseNode):
             Optional[Tuple[str, str]]: tuple of local and remote
                 hashes, in that order.
         """
-        if not self.state:
-            return None, None
-        return self.state['local_hash'], self.state['remote_hash']
+        return _unpack_hash(self._local_hash), _unpack_hash(self._remote_hash)
+
+    def get_fingerprint(self):
+        """Get the fingerprint of the local file, at the last sync.
+
+        Returns:
+            Optional[Tuple[int, int, int]]: size, mtime (in nanoseconds) and
+                inode of the file. None if unknown.
+        """
+        return self._fingerprint
 
-    def set_hashes(self, local_hash, remote_hash):
+    def get_fast_hash(self):
+        """Get the fast hash of the local file, at the last sync.
+
+        Returns:
+            Optional[str]: hash of the form "<algorithm>:<hex>", or None.
+        """
+        return self._fast_hash
+
+    def set_hashes(self, local_hash, remote_hash, fingerprint=None,
+                   fast_hash=None):
         """Set new values for both local and remote hashes.
 
         Note: hashes must be either both None, or both set to a valid value.
@@ -42,18 +171,48 @@ class FileNode(BaseNode):
         Args:
             local_hash (Optional[str]): new value for local hash
             remote_hash (Optional[str]): new value for remote hash
+            fingerprint (Optional[Tuple[int, int, int]]): size, mtime (in
+                nanoseconds) and inode of the local file whose content has
+                the hash `local_hash`. None if unknown.
+            fast_hash (Optional[str]): fast hash of the same local file. None
+                if unknown.
         """
-        if local_hash is None and remote_hash is None:
-            self.state = None
-            return
-
-        if local_hash is None or remote_hash is None:
+        if (local_hash is None) != (remote_hash is None):
             raise ValueError('either both hashes are None, or both hash must '
                              'exists.')
 
-        if self.state is None:
-            self.state = {}
-        self.state.update({
-            'local_hash': local_hash,
-            'remote_hash': remote_hash
-        })
+        self._prepare_change()
+        old_stats = self._get_own_stats()
+        if local_hash is None:
+            self.state = None
+        else:
+            self._local_hash = _pack_hash(local_hash)
+            self._remote_hash = _pack_hash(remote_hash)
+            self._fingerprint = tuple(fingerprint) if fingerprint else None
+            self._fast_hash = fast_hash
+        self._report_stats_change(old_stats)
+        self._notify_state_changed()
+
+    def get_stats(self):
+        return 0, 0, 0
+
+    def _get_cached_stats(self):
+        return 0, 0, 0
+
+    def _get_own_stats(self):
+        if self._local_hash is None and self._remote_hash is None:
+            return 0, 0, 0
+        size = self._fingerprint[0] if self._fingerprint else 0
+        return 0, 1, size
+
+    def _report_stats_change(self, old_stats):
+        """Update the stats of the ancestors, after a change of state.
+
+        Args:
+            old_stats (Tuple[int, int, int]): result of `_get_own_stats()`
+                before the change.
+        """
+        new_stats = self._get_own_stats()
+        if new_stats != old_stats and self.parent is not None and \
+                self.parent._are_stats_used():
+            self.parent._add_stats(_sum_stats(new_stats, old_stats, -1))
@@ -1,15 +1,184 @@
 # -*- coding: utf-8 -*-
 
 from .base_node import BaseNode
+from .hint_builder import HintBuilder
 
 
 class FolderNode(BaseNode):
     """Node representing a classic folder.
 
     Server-side, folders are implicit and don't exists as entity. As a
-    consequence, the `state` attribute is always `None`
+    consequence, the `state` attribute only describes the local folder: it's
+    either `None`, or `{'mtime_ns': mtime}`, the modification time of the
+    local folder (in nanoseconds) when its content has been listed. If the
+    folder has still the same mtime, no entry has been added nor removed
+    since.
+
+    When loaded from a binary index, the children of a folder are created only
+    at the first access to the `children` attribute. Until then, the folder
+    is considered dirty if it has at least one child, as freshly loaded nodes
+    are never sync.
+
+    When a child is replaced by a local element of another type (a file by a
+    folder, or the reverse), the old child is deleted first. The name is kept
+    in memory (not in the index), and the folder is listed again once the
+    child has been removed, to create the node of the new element.
     """
 
+    __slots__ = ('_children', '_lazy_children', '_replaced_children')
+
+    def __init__(self, name):
+        self._lazy_children = None
+        self._replaced_children = None
+        BaseNode.__init__(self, name)
+
+    @property
+    def children(self):
+        """children Getter. Load them if needed."""
+        if self._lazy_children is not None:
+            self._load_children()
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self._children = children
+
+    def set_lazy_children(self, lazy_children):
+        """Set the children to load at the first access.
+
+        Args:
+            lazy_children (LazyChildren): children not loaded yet, from a
+                binary index.
+        """
+        self._lazy_children = lazy_children
+        self._dirty_children += lazy_children.count
+
+    def _load_children(self):
+        """Create the child nodes. It's not a modification of the tree."""
+        # Not a modification, but the children can't be read meanwhile.
+        self._prepare_change()
+        lazy_children, self._lazy_children = self._lazy_children, None
+        for child in lazy_children.load_nodes():
+            child.parent = self
+            self._children[child.name] = child
+            if self._tree is not None:
+                child._set_tree(self._tree)
+            if self._stats is not None:
+                child.get_stats()  # Cheap: memoized by the index reader.
+
+        # All lazy children were counted as dirty, but some of them may have
+        # been created sync (see `set_all_folders_not_sync()`).
+        self._dirty_children = sum(1 for child in self._children.values()
+                                   if child.dirty)
+        if self._sync:
+            self._clean_dirty_flags()
+
+    def add_replaced_child(self, name):
+        """Mark a child as replaced by an element of another type.
+
+        The child itself must be deleted by the caller. Once it's removed
+        from the tree, a "Modified" hint is set on this folder.
+
+        Args:
+            name (Text): name of the child.
+        """
+        if self._replaced_children is None:
+            self._replaced_children = set()
+        self._replaced_children.add(name)
+
+    def rm_child(self, node):
+        BaseNode.rm_child(self, node)
+        if self._replaced_children and node.name in self._replaced_children:
+            self._replaced_children.discard(node.name)
+            HintBuilder.apply_modified_event(HintBuilder.SCOPE_LOCAL, self)
+
+    def _loaded_children(self):
+        if self._lazy_children is not None:
+            return {}
+        return self._children
+
+    def _get_cached_stats(self):
+        if self._stats is None and self._lazy_children is not None:
+            # Computed from the index, without loading the children.
+            self._stats = self._lazy_children.get_stats()
+        return self._stats
+
+    def exists(self):
+        # The state describes the local folder, not the synced content.
+        if self._lazy_children is not None:
+            return True
+        return bool(self.children) or self.parent is None
+
+    def _set_not_sync_with_children(self):
+        BaseNode._set_not_sync_with_children(self)
+        if self._lazy_children is not None:
+            # Children not loaded yet will be created non-sync.
+            self._lazy_children.check_fingerprints = False
+            self._dirty_children = self._lazy_children.count
+
+    def set_all_folders_not_sync(self):
+        """Set the sync flag to False for this folder and all sub-folders.
+
+        The files having a fingerprint, and no hint, task nor error, are set
+        sync: their parent folder's task will check if they have changed.
+        Files not loaded yet will be created the same way. The other files
+        keep their flags.
+
+        Note: like `set_all_hierarchy_not_sync()`, this method does not
+        update the parent node. It should be used only on root nodes.
+        """
+        folders = []
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, FolderNode):
+                folders.append(node)
+                nodes.extend(node._loaded_children().values())
+            elif (node.get_fingerprint() is not None and
+                  node.local_hint is None and node.remote_hint is None and
+                  node.task is None and node.error is None):
+                node._sync = True
+                node._dirty = False
+                if node._tree is not None:
+                    node._tree._on_node_status_changed(node)
+
+        # Children are updated before their parent.
+        for folder in reversed(folders):
+            folder._set_not_sync_with_folders()
+
+    def _set_not_sync_with_folders(self):
+        """Part of `set_all_folders_not_sync()` done on each folder.
+
+        The loaded children must have been updated first.
+        """
+        self._sync = False
+        self._dirty = True
+        self._dirty_children = sum(
+            1 for child in self._loaded_children().values() if child.dirty)
+        if self._lazy_children is not None:
+            # Files not loaded yet will be created sync, if they can.
+            self._lazy_children.check_fingerprints = True
+            self._dirty_children += self._lazy_children.count
+        if self._tree is not None:
+            self._tree._on_node_status_changed(self)
+
+    def get_mtime(self):
+        """Get the mtime of the local folder, when it has been listed.
+
+        Returns:
+            Optional[int]: mtime, in nanoseconds. None if unknown.
+        """
+        if self.state is None:
+            return None
+        return self.state.get('mtime_ns')
+
     def set_state(self, state):
         if state is not None:
-            raise ValueError('FolderNode accepts only None state.')
+            # Indexes may store None hashes for the folders.
+            state = {key: value for key, value in state.items()
+                     if value is not None}
+            if set(state.keys()) - {'mtime_ns'}:
+                raise ValueError('FolderNode state accepts only "mtime_ns".')
+            state = state or None
+        if state != self.state:
+            BaseNode.set_state(self, state)
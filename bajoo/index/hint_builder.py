@@ -21,14 +21,24 @@ class HintBuilder(object):
     - The "path" version, when the caller doesn't have the node. It's an
       independent action. In this case HintBuilder is in charge of the tree
       lock.
+    - The "paths" version, a batch of "path" actions. The tree lock is
+      acquired once for many events, and released every `BATCH_SIZE` events
+      to not block the other threads too long. Move events, received one by
+      one, have no such version.
     """
 
-    # TODO: handle case when there is conflict between node of different types
-    # (files and folders)
+    # The hints don't handle an element replaced by one of another type (a
+    # file by a folder, or the reverse): the replacement is detected by the
+    # folder scan (see `FolderTask.diff_children()`), which deletes the old
+    # node. Once it's removed, the folder is scanned again and the new element
+    # is added (see `FolderNode.add_replaced_child()`).
 
     SCOPE_LOCAL = 'local'
     SCOPE_REMOTE = 'remote'
 
+    # Max number of events applied without releasing the tree lock.
+    BATCH_SIZE = 1000
+
     @classmethod
     def _get_hint(cls, node, scope):
         if scope is cls.SCOPE_LOCAL:
@@ -82,7 +92,7 @@ class HintBuilder(object):
         cls._set_hint(dest_node, scope, DestMoveHint(source_node))
 
     @classmethod
-    def apply_modified_event(cls, scope, node, new_state=None):
+    def apply_modified_event(cls, scope, node, new_state=None, size=None):
         """Create or update hint from a MODIFIED or an ADDED event.
 
         Note:
@@ -94,26 +104,27 @@ class HintBuilder(object):
             new_state (Optional[Dict]): new information that could replace
                 (part of) the node state. state content is dependent of the
                 node type.
+            size (Optional[int]): size of the new content, if known.
         """
         node.sync = False
         previous_hint = cls._get_hint(node, scope)
 
         if isinstance(previous_hint,
                       (type(None), DeletedHint, ModifiedHint)):
-            cls._set_hint(node, scope, ModifiedHint(new_state))
+            cls._set_hint(node, scope, ModifiedHint(new_state, size))
         elif isinstance(previous_hint, SourceMoveHint):
             # If we've a 'MOVE' event, we're sure the source state is the
             # new state of the destination node.
             cls._set_hint(previous_hint.dest_node, scope,
                           ModifiedHint(node.state))
-            cls._set_hint(node, scope, ModifiedHint(new_state))
+            cls._set_hint(node, scope, ModifiedHint(new_state, size))
         elif isinstance(previous_hint, DestMoveHint):
             cls._set_delete_hint(previous_hint.source_node, scope)
-            cls._set_hint(node, scope, ModifiedHint(new_state))
+            cls._set_hint(node, scope, ModifiedHint(new_state, size))
 
     @classmethod
     def apply_modified_event_from_path(cls, tree, scope, path, new_state,
-                                       node_factory):
+                                       node_factory, size=None):
         """Create or update hint from a MODIFIED or an ADDED event.
 
         Args:
@@ -126,10 +137,35 @@ class HintBuilder(object):
             node_factory (Callable[[Text], BaseNode]): function used to create
                 the node, if needed. It receives the node's name in argument
                 and must return a single node.
+            size (Optional[int]): size of the new content, if known.
         """
         with tree.lock:
             node = tree.get_or_create_node_by_path(path, node_factory)
-            cls.apply_modified_event(scope, node, new_state)
+            cls.apply_modified_event(scope, node, new_state, size)
+
+    @classmethod
+    def apply_modified_events_from_paths(cls, tree, scope, events,
+                                         node_factory):
+        """Create or update hints from many MODIFIED or ADDED events.
+
+        Events are applied sorted by path, so the nodes of a same folder are
+        found without walking the tree from the root each time.
+
+        Args:
+            tree (IndexTree): index of concerned nodes.
+            scope (str): One of SCOPE_LOCAL or SCOPE_REMOTE.
+            events (Iterable[Tuple]): path, new state and optionally size
+                of each added/modified element. See
+                `apply_modified_event_from_path()`.
+            node_factory (Callable[[Text], BaseNode]): function used to create
+                the nodes, if needed.
+        """
+        def apply_event(path, new_state, size=None):
+            node = tree.get_or_create_node_by_path(path, node_factory)
+            cls.apply_modified_event(scope, node, new_state, size)
+
+        events = sorted(events, key=lambda event: event[0])
+        cls._apply_in_batches(tree, events, apply_event)
 
     @classmethod
     def apply_deleted_event(cls, scope, node):
@@ -174,6 +210,26 @@ class HintBuilder(object):
                 return  # Nothing to do: the node don't exists.
             cls.apply_deleted_event(scope, node)
 
+    @classmethod
+    def apply_deleted_events_from_paths(cls, tree, scope, paths):
+        """Create or update hints from many DELETED events.
+
+        Events are applied sorted by path. See
+        `apply_modified_events_from_paths()`.
+
+        Args:
+            tree (IndexTree): index of concerned nodes.
+            scope (str): One of SCOPE_LOCAL or SCOPE_REMOTE.
+            paths (Iterable[Text]): paths of the deleted elements.
+        """
+        def apply_event(path):
+            node = tree.get_node_by_path(path)
+            if node is not None:
+                cls.apply_deleted_event(scope, node)
+
+        events = sorted((path,) for path in paths)
+        cls._apply_in_batches(tree, events, apply_event)
+
     @classmethod
     def apply_move_event_from_path(cls, tree, scope, src_path, dst_path,
                                    node_factory):
@@ -241,6 +297,21 @@ class HintBuilder(object):
                                         dst_node)
                 cls._set_delete_hint(src_node, scope)
 
+    @classmethod
+    def _apply_in_batches(cls, tree, events, apply_event):
+        """Apply events, by batches of `BATCH_SIZE` under the tree lock.
+
+        Args:
+            tree (IndexTree): index of concerned nodes.
+            events (List[Tuple]): events to apply.
+            apply_event (Callable): function applying one event. It receives
+                the event's values in arguments.
+        """
+        for start in range(0, len(events), cls.BATCH_SIZE):
+            with tree.lock:
+                for event in events[start:start + cls.BATCH_SIZE]:
+                    apply_event(*event)
+
     @classmethod
     def break_coupled_hints(cls, node, scope=None):
         """Convert couples of linked hints into two independent hints.
@@ -18,10 +18,13 @@ class ModifiedHint(BaseHint):
         new_state (Optional[Any]): if set, state data that should be used to
             determine the new state of the node. It will be used by the Task.
             The type of data depends of the node.
+        size (Optional[int]): if known, size of the new content, in bytes.
+            It's only used to prioritize the tasks.
     """
-    def __init__(self, new_state=None):
+    def __init__(self, new_state=None, size=None):
         BaseHint.__init__(self)
         self.new_data = new_state
+        self.size = size
 
 
 class SourceMoveHint(BaseHint):
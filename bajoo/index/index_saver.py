@@ -7,10 +7,12 @@ import os
 from tempfile import NamedTemporaryFile
 import threading
 import time
+import uuid
 
 from ..common.fs import hide_file_if_windows, replace_file
 from ..common.path import get_cache_dir
 from ..common.strings import ensure_unicode
+from . import binary_index
 
 # To avoid index saving after every file change, the software waits
 # until activity stops during at least 1.0 seconds
@@ -20,16 +22,39 @@ _SAVE_AFTER_INACTIVE_DURING = 1.0
 # the index file will be saved every 30 seconds
 _MAX_TIMER_RESTART = 30
 
+# The journal is merged into the index file when its size exceeds this ratio
+# of the index file size (and at least _MIN_COMPACTION_SIZE bytes). So the
+# cost of the compactions is proportional to the amount of changes.
+_COMPACTION_RATIO = 0.5
+_MIN_COMPACTION_SIZE = 1024 * 1024
+
 _logger = logging.getLogger(__name__)
 
 
 class IndexSaver(object):
+    """Persists an IndexTree in the container folder.
+
+    The index is stored in two files: a snapshot of the whole tree (the "index
+    file"), and an append-only journal of the changes made since this
+    snapshot. Each save only appends the new journal entries. When the journal
+    becomes too big, it's compacted: a new snapshot is written and the journal
+    is reset.
+
+    The first line of the journal contains the journal id. The snapshot
+    contains the id of the journal that must be replayed on it. A journal with
+    another id is obsolete and is ignored.
+
+    Snapshots are written in the binary format (see `binary_index`). Index
+    files in the older JSON formats are still loaded, and are converted at
+    the next save.
+    """
+
     def __init__(self, index_tree, directory, model_id):
         """IndexSaver constructor
 
         Args:
             index_tree (IndexTree): index to save. Must have two methods
-                `load()` and `export_data()`.
+                `load()` and `export_binary()`, and a `mutated` signal.
             directory (Text): directory containing the index file.
             model_id (Text): unique ID used in the filename.
         """
@@ -49,6 +74,23 @@ class IndexSaver(object):
         self.short_timer_lock = threading.Lock()
         self.last_timer = None
 
+        # Protects all journal attributes below.
+        self._journal_lock = threading.Lock()
+        # Journal entries not yet written.
+        self._pending_entries = []
+        # Id of the journal file. If None, there is no journal file matching
+        # the snapshot, and the next save must be a compaction.
+        self._journal_id = None
+        self._journal_size = 0
+        self._snapshot_size = 0
+
+        index_tree.mutated.connect(self._on_index_mutated)
+
+    @property
+    def journal_path(self):
+        """Path of the journal file, next to the index file."""
+        return self.index_path + u'.journal'
+
     def set_directory(self, directory):
         """Set the index directory
 
@@ -111,11 +153,81 @@ class IndexSaver(object):
     def load(self):
         """Load the index file
 
+        If a journal matching the index file exists, its entries are added to
+        the returned data, under the key 'journal'.
+
         No error management occurs here, it will be manage by local_container
         """
 
-        with io.open(self.index_path, encoding='utf-8') as index_file:
-            return json.load(index_file)
+        with io.open(self.index_path, 'rb') as index_file:
+            content = index_file.read()
+        snapshot_size = len(content)
+
+        if binary_index.is_binary_index(content):
+            metadata = binary_index.read_metadata(content)
+            journal_id = metadata.get('journal_id')
+            data = {'version': binary_index.VERSION, 'binary': content}
+        else:
+            data = json.loads(content.decode('utf-8'))
+            journal_id = None
+            if 'version' in data:  # The legacy format has no journal.
+                journal_id = data.pop('journal_id', None)
+
+        journal_size = 0
+        if journal_id is not None:
+            entries, journal_size = self._read_journal(journal_id)
+            if journal_size is None:
+                # No valid journal: the next save must be a compaction.
+                journal_id = None
+            if entries:
+                data['journal'] = entries
+        if data.get('version') != binary_index.VERSION:
+            # Convert the index in the binary format, at the next save.
+            journal_id = None
+
+        with self._journal_lock:
+            self._pending_entries = []
+            self._journal_id = journal_id
+            self._journal_size = journal_size
+            self._snapshot_size = snapshot_size
+        return data
+
+    def _read_journal(self, journal_id):
+        """Read the journal entries.
+
+        If a line is truncated (in case of crash during a write), it and all
+        following lines are ignored.
+
+        Args:
+            journal_id (Text): expected id of the journal.
+        Returns:
+            Tuple[List[Dict], Optional[int]]: the list of valid entries and
+                the journal file size. If the journal file is missing,
+                obsolete or truncated, the size is None.
+        """
+        entries = []
+        try:
+            with io.open(self.journal_path, encoding='utf-8') as journal_file:
+                try:
+                    header = json.loads(next(journal_file))
+                except (StopIteration, ValueError):
+                    header = {}
+                if header.get('journal_id') != journal_id:
+                    _logger.info('Journal of index %s is obsolete.',
+                                 self.index_path)
+                    return [], None
+                for line in journal_file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        _logger.warning('Journal of index %s is truncated.',
+                                        self.index_path)
+                        return entries, None
+        except (IOError, OSError):
+            _logger.info('No journal found for index %s', self.index_path,
+                         exc_info=True)
+            return [], None
+        return entries, os.path.getsize(self.journal_path)
 
     def create_empty_file(self):
         """Create the index file.
@@ -126,6 +238,14 @@ class IndexSaver(object):
             index_file.write(u'{}')
 
         self._hide_file_if_win(self.index_path)
+        with self._journal_lock:
+            self._pending_entries = []
+            self._journal_id = None
+
+    def _on_index_mutated(self, entry):
+        """Keep the journal entry, until the next save."""
+        with self._journal_lock:
+            self._pending_entries.append(entry)
 
     def _short_timer_saving(self, nb_err=0):
         current_time = time.time()
@@ -147,30 +267,85 @@ class IndexSaver(object):
         self._save(nb_err)
 
     def _save(self, nb_err=0):
-        # the file index need to be deleted because python is not able to
-        # open write access on a hidden file (windows issue)
-        _logger.debug('save index')
-
-        index_data = self.index_tree.export_data()
+        with self._journal_lock:
+            entries = self._pending_entries
+            self._pending_entries = []
+            compaction_needed = (
+                self._journal_id is None or
+                self._journal_size > max(_MIN_COMPACTION_SIZE,
+                                         self._snapshot_size *
+                                         _COMPACTION_RATIO))
 
         try:
-            tmp_index_file = NamedTemporaryFile(mode='w+', dir=get_cache_dir(),
-                                                delete=False)
-            with tmp_index_file:
-                json.dump(index_data, tmp_index_file)
-            replace_file(tmp_index_file.name, self.index_path)
-            self._hide_file_if_win(self.index_path)
+            if compaction_needed:
+                self._compact()
+            elif entries:
+                self._append_to_journal(entries)
         except:
             _logger.exception('Unable to save index %s:' % self.index_path)
 
+            # The journal file may be corrupted: the next save must rewrite
+            # the whole index.
+            with self._journal_lock:
+                self._journal_id = None
             self.trigger_save(nb_err+1)
 
-    def _hide_file_if_win(self, index_path):
+    def _append_to_journal(self, entries):
+        """Write journal entries at the end of the journal file."""
+        _logger.log(5, 'save %s entries in journal of index %s',
+                    len(entries), self.index_path)
+        content = u''.join(ensure_unicode(json.dumps(entry)) + u'\n'
+                           for entry in entries)
+        with io.open(self.journal_path, 'a', encoding='utf-8') as journal:
+            journal.write(content)
+
+        with self._journal_lock:
+            self._journal_size += len(content)
+
+    def _compact(self):
+        """Write a full snapshot of the index, and start a new journal."""
+        _logger.debug('save index')
+
+        journal_id = uuid.uuid4().hex
+        with self._journal_lock:
+            # Entries added from now may or may not be included in the
+            # snapshot. In any case, they will be written in the new journal.
+            self._pending_entries = []
+            self._journal_id = None
+
+        content = self.index_tree.export_binary({'journal_id': journal_id})
+
+        # the file index need to be replaced because python is not able to
+        # open write access on a hidden file (windows issue)
+        self._write_file(self.index_path, content)
+        journal_header = json.dumps({'journal_id': journal_id}) + '\n'
+        self._write_file(self.journal_path, journal_header.encode('utf-8'))
+
+        with self._journal_lock:
+            self._journal_id = journal_id
+            self._journal_size = len(journal_header)
+            self._snapshot_size = len(content)
+
+    def _write_file(self, path, content):
+        """Atomically replace a file.
+
+        Args:
+            path (Text): destination file.
+            content (bytes): new content of the file.
+        """
+        tmp_file = NamedTemporaryFile(mode='wb', dir=get_cache_dir(),
+                                      delete=False)
+        with tmp_file:
+            tmp_file.write(content)
+        replace_file(tmp_file.name, path)
+        self._hide_file_if_win(path)
+
+    def _hide_file_if_win(self, path):
         try:
-            hide_file_if_windows(self.index_path)
+            hide_file_if_windows(path)
         except:
             _logger.warning('Tentative to set HIDDEN file attribute to '
-                            '%s failed' % index_path, exc_info=True)
+                            '%s failed' % path, exc_info=True)
 
     def stop(self):
         if self.last_timer:
@@ -179,5 +354,10 @@ class IndexSaver(object):
         # if it fails to get the lock, a timer was running, need to save
         if not self.short_timer_lock.acquire(False):
             self._save()
+        else:
+            with self._journal_lock:
+                has_pending_entries = bool(self._pending_entries)
+            if has_pending_entries:
+                self._save()
 
         self.short_timer_lock.release()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+
+def read_node(node):
+    """Read the persistent data of a node.
+
+    The caller must own the tree lock (or a snapshot lock, see
+    `IndexSnapshot`).
+
+    Args:
+        node (BaseNode): node to read.
+    Returns:
+        Tuple[Optional[Dict], List[Tuple[Text, BaseNode]], LazyChildren]:
+            a copy of the node's state, the list of its children (name and
+            node) and the children not loaded yet (None if there is none).
+            When the children are not loaded, the list is empty.
+    """
+    state = node.state
+    if state is not None:
+        state = dict(state)
+    lazy_children = getattr(node, '_lazy_children', None)
+    if lazy_children is not None:
+        return state, [], lazy_children
+    return state, list(node._loaded_children().items()), None
+
+
+class IndexSnapshot(object):
+    """Consistent view of an IndexTree, readable without the tree lock.
+
+    The snapshot is created in constant time: it only keeps a reference to
+    the root node. Nodes are not copied, except when they're modified while
+    the snapshot is open. In that case, the tree calls `preserve()` before
+    the modification, and the snapshot keeps a copy of the node's previous
+    data (copy-on-write).
+
+    Reading and preserving a node are protected by the snapshot's own lock,
+    held only the time of copying one node, so the tree can be modified
+    while a snapshot is read.
+
+    Attributes:
+        root (Optional[BaseNode]): root node of the tree, when the snapshot
+            was taken.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        # Data of the nodes modified since the snapshot, by node.
+        self._preserved = {}
+
+    def read_node(self, node):
+        """Read the data of a node, as it was when the snapshot was taken.
+
+        Args:
+            node (BaseNode): node part of the snapshot.
+        Returns:
+            Tuple: same values than `read_node()`.
+        """
+        with self._lock:
+            data = self._preserved.get(node)
+            if data is None:
+                data = read_node(node)
+            return data
+
+    def preserve(self, node):
+        """Copy the data of a node, before its modification.
+
+        Only the first copy is kept: it's the version of the snapshot.
+
+        Note:
+            The tree lock must be acquired by the caller.
+
+        Args:
+            node (BaseNode): node about to be modified.
+        """
+        with self._lock:
+            if node not in self._preserved:
+                self._preserved[node] = read_node(node)
+
+    def preserve_hierarchy(self, node):
+        """Copy the data of a node and all its descendants.
+
+        Used when nodes are detached from the tree, as further modifications
+        would not be notified.
+
+        Note:
+            The tree lock must be acquired by the caller.
+
+        Args:
+            node (BaseNode): root of the hierarchy.
+        """
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            self.preserve(node)
+            nodes.extend(node._loaded_children().values())
@@ -1,12 +1,24 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
 from contextlib import contextmanager
+import heapq
+import itertools
 import logging
 import os.path
 import threading
+from ..common.signal import Signal
 from ..common.strings import ensure_unicode
-from .file_node import FileNode
+from . import binary_index
+from .file_node import FileNode, _unpack_hash
 from .folder_node import FolderNode
+from .index_snapshot import IndexSnapshot, read_node
+from . import sync_priority
+
+try:
+    from types import MappingProxyType as _read_only_view
+except ImportError:  # Python 2
+    _read_only_view = dict
 
 _logger = logging.getLogger(__name__)
 
@@ -26,14 +38,178 @@ class IndexTree(object):
 
     All access to nodes must be protected by using the `self.lock`, including
     the read access to properties like hints.
+
+    The exports are made from a copy-on-write snapshot (see `IndexSnapshot`):
+    the lock is held only to take the snapshot, not during the serialization.
+
+    Each change of the persistent data (the hierarchy and the node's states)
+    is described by a journal entry, and notified through the `mutated`
+    signal. Replaying these entries (see `apply_journal()`) on the previously
+    exported data gives the actual tree. Journal entries are dict of one of
+    the following forms:
+    - {'op': 'add', 'path': path, 'node': node_def}: a new node (and its
+        descendants) has been added. `node_def` has the same format than in
+        `load()`.
+    - {'op': 'rm', 'path': path}: the node and its descendants have been
+        removed.
+    - {'op': 'state', 'path': path, 'state': state}: the node's state has been
+        replaced.
+
+    Attributes:
+        mutated (Signal[Dict]): signal fired, with the tree lock acquired, each
+            time the persistent data is modified. The argument is the journal
+            entry describing the change.
+        nodes_ready (Signal[IndexTree]): signal fired, with the tree lock
+            acquired, when a node becomes available for
+            `browse_all_non_sync_nodes()` while there was none. Handlers
+            must not block.
     """
 
     # Special value, yielded by browse_all_non_sync_nodes()
     WAIT_FOR_TASK = object()
 
+    # Max number of entries kept in the path -> node cache.
+    PATH_CACHE_SIZE = 4096
+
     def __init__(self):
         self.lock = threading.Lock()
-        self._root = None
+        self._root_node = None
+        self.mutated = Signal()
+        self.nodes_ready = Signal()
+
+        # Non-sync nodes without task, with the sequence number given when
+        # they became available and their current key. The heap contains
+        # entries (key, seq, node), with key = seq + delay, in the order they
+        # should be synced (see `sync_priority`). Entries whose key and seq
+        # don't match `_ready_nodes` are outdated, and are dropped when
+        # reached.
+        self._ready_nodes = {}
+        self._ready_heap = []
+        self._ready_counter = itertools.count()
+        # Nodes in error. When empty, the ancestors of the ready nodes don't
+        # need to be checked.
+        self._error_nodes = set()
+
+        # Recently requested nodes, by path, in LRU order. Entries are
+        # validated on read: nodes removed from the tree are ignored.
+        self._path_cache = OrderedDict()
+
+        # Snapshots being read. They must be informed of all modifications.
+        self._snapshots = []
+
+        # Remote hash of each file, by path. Built by the first call to
+        # `get_remote_hashes()`, then kept up to date by the node callbacks.
+        self._remote_hashes = None
+
+    def _get_root(self):
+        return self._root_node
+
+    def _set_root(self, root):
+        """Replace the root node, and make the tree owner of all its nodes.
+
+        Args:
+            root (Optional[BaseNode]): new root node.
+        """
+        if self._root_node is not None:
+            for snapshot in self._snapshots:
+                snapshot.preserve_hierarchy(self._root_node)
+            self._root_node._set_tree(None)
+        self._path_cache.clear()
+        self._root_node = root
+        if root is not None:
+            root._set_tree(self)
+        if self._remote_hashes is not None:
+            # The views already given must stay valid: same dict instance.
+            self._remote_hashes.clear()
+            if root is not None:
+                self._get_remote_hashes(root, self._remote_hashes)
+
+    # The nodes must know the tree they belong to: the root is always
+    # replaced through `_set_root()`.
+    _root = property(_get_root, _set_root)
+
+    def _on_node_status_changed(self, node):
+        """Called by the nodes when their sync flag, task or error change.
+
+        It keeps up to date the queue of nodes available for
+        `browse_all_non_sync_nodes()`, and the set of nodes in error. Detached
+        nodes are removed from them.
+        """
+        if node._tree is self and not node.sync and node.task is None:
+            if node not in self._ready_nodes:
+                seq = next(self._ready_counter)
+                self._push_ready_node(node, seq)
+                if len(self._ready_nodes) == 1:
+                    self.nodes_ready.fire(self)
+        elif self._ready_nodes.pop(node, None) is not None:
+            if len(self._ready_heap) > 2 * len(self._ready_nodes) + 64:
+                self._compact_ready_heap()
+        if node._tree is self and node.error:
+            self._error_nodes.add(node)
+        else:
+            self._error_nodes.discard(node)
+
+    def _on_node_hint_changed(self, node):
+        """Called by the nodes when their local or remote hint change.
+
+        The delay of a queued node depends on its hints: its entry is moved
+        in the queue. The hints are often set after the node has been queued.
+        """
+        entry = self._ready_nodes.get(node)
+        if entry is not None:
+            seq, key = entry
+            if seq + sync_priority.get_delay(node) != key:
+                self._push_ready_node(node, seq)
+                if len(self._ready_heap) > 2 * len(self._ready_nodes) + 64:
+                    self._compact_ready_heap()
+
+    def _push_ready_node(self, node, seq):
+        """Add a node to the queue, or replace its entry.
+
+        Args:
+            node (BaseNode): node available.
+            seq (int): sequence number given when the node became available.
+        """
+        key = seq + sync_priority.get_delay(node)
+        self._ready_nodes[node] = (seq, key)
+        heapq.heappush(self._ready_heap, (key, seq, node))
+
+    def _on_node_changing(self, node):
+        """Called by the nodes before a change of their state or children."""
+        for snapshot in self._snapshots:
+            snapshot.preserve(node)
+
+    def _on_node_added(self, node):
+        """Called by the nodes when a child (and its hierarchy) is added."""
+        if self._remote_hashes is not None:
+            self._get_remote_hashes(node, self._remote_hashes)
+        self.mutated.fire({'op': 'add', 'path': node.get_full_path(),
+                           'node': self._export_node(node)})
+
+    def _on_node_removed(self, node):
+        """Called by the nodes when a child is about to be removed."""
+        for snapshot in self._snapshots:
+            # Once detached, its modifications will not be notified.
+            snapshot.preserve_hierarchy(node)
+        if self._remote_hashes is not None:
+            if isinstance(node, FileNode):
+                self._remote_hashes.pop(node.get_full_path(), None)
+            else:
+                for path in self._get_remote_hashes(node, {}):
+                    self._remote_hashes.pop(path, None)
+        self.mutated.fire({'op': 'rm', 'path': node.get_full_path()})
+
+    def _on_state_changed(self, node):
+        """Called by the nodes when theirs state has been replaced."""
+        path = node.get_full_path()
+        if self._remote_hashes is not None and isinstance(node, FileNode):
+            remote_hash = node.get_hashes()[1]
+            if remote_hash is None:
+                self._remote_hashes.pop(path, None)
+            else:
+                self._remote_hashes[path] = remote_hash
+        state = dict(node.state) if node.state is not None else None
+        self.mutated.fire({'op': 'state', 'path': path, 'state': state})
 
     def browse_all_non_sync_nodes(self):
         """Browse through the tree and yields all the non-sync nodes.
@@ -72,32 +248,63 @@ class IndexTree(object):
             Iterator[Union[IndexNode,IndexTree.WAIT_FOR_TASK]]: generator that
                 will loop over all non-sync nodes.
         """
-        last_iteration_was_empty = False
         with self.lock:
             while self._root and self._root.dirty:
-                if last_iteration_was_empty:
+                node = self._pop_ready_node()
+                if node is None:
                     # All non-sync nodes are blocked by tasks
                     with self._reverse_lock_context():
                         yield self.WAIT_FOR_TASK
+                    continue
 
-                last_iteration_was_empty = True
-                for node in self._browse_non_sync_nodes(self._root):
-                    last_iteration_was_empty = False
+                node.task = True  # Set node "reserved" for a future task.
+                with self._reverse_lock_context():
+                    yield node
 
-                    node.task = True  # Set node "reserved" for a future task.
-                    with self._reverse_lock_context():
-                        yield node
+    def _compact_ready_heap(self):
+        """Rebuild the heap of ready nodes without the outdated entries."""
+        self._ready_heap = [(key, seq, node) for node, (seq, key)
+                            in self._ready_nodes.items()]
+        heapq.heapify(self._ready_heap)
 
-    def _browse_non_sync_nodes(self, current_node):
-        if not current_node.sync and current_node.task is None:
-            yield current_node
+    def _pop_ready_node(self):
+        """Pop the available node which should be synced first.
 
-        for node in (node for node in list(current_node.children.values())
-                     if node.dirty and not node.removed and not node.error):
-            # Note: The tree might change during a `yield`. `self._is_in_tree`
-            # check that current_node is still part of the tree.
-            for n in self._browse_non_sync_nodes(node):
-                yield n
+        Nodes are served in the order they became available, each one being
+        delayed by a bounded number of nodes depending on its expected cost
+        (see `sync_priority.get_delay()`). Nodes are moved in the queue when
+        their hints change; as the delay also depends on their state, it's
+        evaluated again when the node is popped.
+
+        Nodes in error, or whose an ancestor is in error, are dropped from the
+        queue: they will be queued again if their status change.
+
+        Returns:
+            Optional[BaseNode]: a non-sync node without task, or None if there
+                is none.
+        """
+        heap = self._ready_heap
+        while heap:
+            key, seq, node = heap[0]
+            if self._ready_nodes.get(node) != (seq, key):
+                heapq.heappop(heap)  # outdated entry
+                continue
+            new_key = seq + sync_priority.get_delay(node)
+            if new_key != key:
+                self._ready_nodes[node] = (seq, new_key)
+                heapq.heapreplace(heap, (new_key, seq, node))
+                continue
+
+            heapq.heappop(heap)
+            del self._ready_nodes[node]
+            if not self._error_nodes:
+                return node
+            current = node
+            while current.parent is not None and not current.error:
+                current = current.parent
+            if current.parent is None:  # The root node is never skipped.
+                return node
+        return None
 
     @contextmanager
     def _reverse_lock_context(self):
@@ -118,17 +325,18 @@ class IndexTree(object):
         Returns:
             Optional[BaseNode]: if exists, the node referenced by this path.
         """
-        node_path = ensure_unicode(node_path)
-        node_names = os.path.normpath(node_path).split(os.path.sep)
+        node = self._get_cached_node(node_path)
+        if node is not None:
+            return node
 
+        node_names = self._split_path(node_path)
         if node_names == ['.']:
             return self._root
 
-        node = self._root
-        for name in node_names:
-            if node is None:
-                return None
-            node = node.children.get(name)
+        parent = self._get_parent_node(node_names, create=False)
+        node = self._find_path(parent, node_names[-1:])
+        if node is not None:
+            self._cache_node(node_path, node)
         return node
 
     def get_or_create_node_by_path(self, node_path, node_factory):
@@ -145,16 +353,92 @@ class IndexTree(object):
         Return:
             BaseNode: node referenced by the path.
         """
-        node_path = ensure_unicode(node_path)
-        node_names = os.path.normpath(node_path).split(os.path.sep)
+        node = self._get_cached_node(node_path)
+        if node is not None:
+            return node
 
+        node_names = self._split_path(node_path)
         if not self._root:
-            self._root = FolderNode(u'.')
+            self._set_root(FolderNode(u'.'))
 
         if node_names == ['.']:
             return self._root
 
-        node = self._root
+        parent = self._get_parent_node(node_names, create=True)
+        node = self._create_path(parent, node_names[-1:], node_factory)
+        self._cache_node(node_path, node)
+        return node
+
+    @staticmethod
+    def _split_path(node_path):
+        node_path = ensure_unicode(node_path)
+        return os.path.normpath(node_path).split(os.path.sep)
+
+    def _get_parent_node(self, node_names, create):
+        """Search the parent folder of a node, using the path cache.
+
+        Parents are cached too, so nodes of the same folder requested one
+        after the other (like sorted paths) need to walk from the root only
+        once.
+
+        Args:
+            node_names (List[Text]): name of each node, from the root
+                (excluded) to the target node.
+            create (bool): if True, missing folders are created.
+        Returns:
+            Optional[BaseNode]: the parent node. None if it doesn't exist.
+        """
+        if len(node_names) == 1:
+            return self._root
+
+        parent_path = u'/'.join(node_names[:-1])
+        parent = self._get_cached_node(parent_path)
+        if parent is None:
+            if create:
+                parent = self._create_path(self._root, node_names[:-1],
+                                           FolderNode)
+            else:
+                parent = self._find_path(self._root, node_names[:-1])
+            if parent is not None:
+                self._cache_node(parent_path, parent)
+        return parent
+
+    def _get_cached_node(self, node_path):
+        """Search a node in the path cache.
+
+        Args:
+            node_path (Text): path of the node, as given by the caller.
+        Returns:
+            Optional[BaseNode]: the cached node, if it's still in the tree.
+        """
+        node = self._path_cache.pop(node_path, None)
+        if node is None:
+            return None
+        if node.removed or node._tree is not self:
+            return None
+        self._path_cache[node_path] = node  # Move at the end (LRU).
+        return node
+
+    def _cache_node(self, node_path, node):
+        if node._tree is not self:
+            return
+        self._path_cache[node_path] = node
+        if len(self._path_cache) > self.PATH_CACHE_SIZE:
+            self._path_cache.popitem(last=False)
+
+    @staticmethod
+    def _create_path(node, node_names, node_factory):
+        """Search a node, from a starting node. Create it if needed.
+
+        Args:
+            node (BaseNode): node from which the search starts.
+            node_names (List[Text]): name of each node, from the starting node
+                (excluded) to the target node.
+            node_factory (Callable[[Text], BaseNode]): constructor of the leaf
+                node. Missing intermediate nodes are FolderNode instances.
+        Returns:
+            BaseNode: node referenced by the path.
+        """
         for idx, name in enumerate(node_names):
             parent = node
             node = parent.children.get(name)
@@ -173,17 +457,36 @@ class IndexTree(object):
             if self._root:
                 self._root.set_all_hierarchy_not_sync()
 
+    def set_tree_to_reconcile(self):
+        """Set the tree to check the local changes made since the last sync.
+
+        It's an incremental alternative to `set_tree_not_sync()`: only the
+        folders are set not sync. The task of a folder lists its content only
+        if its mtime has changed, and sets not sync only the files whose
+        fingerprint has changed (see `FolderTask`). Files without fingerprint
+        or with pending hints keep their flag.
+        """
+        with self.lock:
+            if self._root:
+                self._root.set_all_folders_not_sync()
+
     def load(self, data):
         """Load the tree from JSON data.
 
-        There is two format used to store data. The "legacy" format (version
-        prior to 0.4.0) and the actual one. If the legacy format is detected,
-        `load()` will call `_legacy_load()`.
-
-        The `data` dict contains two members:
-        - 'version' contains the version format, and should be "2"
-        - 'root': root node representing the top-level folder. If there is no
-            information, "root" can be None.
+        There is three format used to store data. The "legacy" format (version
+        prior to 0.4.0), the JSON format (version 2) and the binary format
+        (version 3). If the legacy format is detected, `load()` will call
+        `_legacy_load()`.
+
+        The `data` dict contains the following members:
+        - 'version' contains the version format, and should be "2" or "3".
+        - 'root': (version 2 only) root node representing the top-level
+            folder. If there is no information, "root" can be None.
+        - 'binary': (version 3 only) content of the binary index file. See
+            the `binary_index` module. The nodes are loaded only when they're
+            accessed.
+        - 'journal' (optional): list of journal entries to replay on the
+            loaded tree (see `apply_journal()`).
 
         Each node has the following attributes:
         - "type": one of "FILE" or "FOLDER".
@@ -231,12 +534,19 @@ class IndexTree(object):
             self._legacy_load(data)
             return
 
-        # TODO: assert version is 2 ?
-
-        root_def = data.get('root')
+        root = None
+        if format_version == binary_index.VERSION:
+            root_def = binary_index.read_root_def(data['binary'])
+        else:
+            root_def = data.get('root')
         if root_def:
-            with self.lock:
-                self._root = self._load_node(u'.', root_def)
+            root = self._load_node(u'.', root_def)
+        journal = data.get('journal')
+        if journal:
+            root = self._replay_journal(root, journal)
+
+        with self.lock:
+            self._set_root(root)
 
     def _load_node(self, name, node_def):
         """Create a node instance from a node definition.
@@ -247,16 +557,32 @@ class IndexTree(object):
         Returns:
             baseNode: Node created from definition.
         """
-
-        if node_def.get('type') == "FOLDER":
-            node = FolderNode(name)
-        else:
-            node = FileNode(name)
-
-        node.set_state(node_def.get('state'))
-        for (name, node_def) in node_def.get('children', {}).items():
-            node.add_child(self._load_node(name, node_def))
-        return node
+        root = None
+        # Nodes are created top-down, but attached bottom-up: a node is
+        # always detached when it receives its children, so adding them
+        # doesn't walk up the ancestors.
+        links = []
+        stack = [(None, name, node_def)]
+        while stack:
+            parent, name, node_def = stack.pop()
+            if node_def.get('type') == "FOLDER":
+                node = FolderNode(name)
+            else:
+                node = FileNode(name)
+
+            node.set_state(node_def.get('state'))
+            if node_def.get('lazy_children') is not None:
+                node.set_lazy_children(node_def['lazy_children'])
+            if parent is None:
+                root = node
+            else:
+                links.append((parent, node))
+            for child_name, child_def in node_def.get('children', {}).items():
+                stack.append((node, child_name, child_def))
+
+        for parent, node in reversed(links):
+            parent.add_child(node)
+        return root
 
     def _legacy_load(self, data):
         """Load index tree from legacy JSON file format.
@@ -282,12 +608,89 @@ class IndexTree(object):
                 the value is a tuple of two hashes, the first one is the local
                 hash, and the second is the remote hash.
         """
+        root = None
+        for path, (local_hash, remote_hash,) in data.items():
+            if root is None:
+                root = FolderNode(u'.')
+            node_names = os.path.normpath(ensure_unicode(path)).split(
+                os.path.sep)
+            node = self._create_path(root, node_names, FileNode)
+            node.set_state({'local_hash': local_hash,
+                            'remote_hash': remote_hash})
+
         with self.lock:
-            self._root = None
-            for path, (local_hash, remote_hash,) in data.items():
-                node = self.get_or_create_node_by_path(path, FileNode)
-                node.set_state({'local_hash': local_hash,
-                                'remote_hash': remote_hash})
+            self._set_root(root)
+
+    def apply_journal(self, entries):
+        """Replay a list of journal entries on the tree.
+
+        Entries are applied in order. Applying them many times gives the same
+        result, so a journal can safely be replayed on a tree which already
+        contains some of its changes.
+
+        Args:
+            entries (List[Dict]): journal entries, as sent by the `mutated`
+                signal.
+        """
+        with self.lock:
+            root = self._replay_journal(self._root, entries)
+            if root is not self._root:
+                self._set_root(root)
+
+    def _replay_journal(self, root, entries):
+        """Apply journal entries on a hierarchy.
+
+        Args:
+            root (Optional[BaseNode]): root node of the hierarchy.
+            entries (List[Dict]): journal entries
+        Returns:
+            Optional[BaseNode]: root node after the journal application. It's
+                only different from `root` if the hierarchy was empty.
+        """
+        for entry in entries:
+            op = entry.get('op')
+            node_names = os.path.normpath(entry.get('path', u'.')).split(
+                os.path.sep)
+            if node_names == ['.']:
+                continue  # The root node is never added nor removed.
+
+            if op == 'add':
+                if root is None:
+                    root = FolderNode(u'.')
+                node = self._find_path(root, node_names)
+                if node is not None:
+                    node.remove_itself()
+                node_def = entry.get('node', {})
+                self._create_path(root, node_names,
+                                  lambda name: self._load_node(name, node_def))
+            elif op == 'rm':
+                node = self._find_path(root, node_names)
+                if node is not None:
+                    node.remove_itself()
+            elif op == 'state':
+                node = self._find_path(root, node_names)
+                if node is not None:
+                    node.set_state(entry.get('state'))
+            else:
+                _logger.warning('Unknown journal operation: %s', op)
+        return root
+
+    @staticmethod
+    def _find_path(node, node_names):
+        """Search a node, from a starting node.
+
+        Args:
+            node (Optional[BaseNode]): node from which the search starts.
+            node_names (List[Text]): name of each node, from the starting node
+                (excluded) to the target node.
+        Returns:
+            Optional[BaseNode]: if exists, the node referenced by the path.
+        """
+        for name in node_names:
+            if node is None:
+                return None
+            node = node.children.get(name)
+        return node
 
     def export_data(self):
         """Export all persistent data of the tree.
@@ -299,63 +702,170 @@ class IndexTree(object):
             Dict: index data, under the form of Dict and List directly
                 convertible to JSON format.
         """
-        with self.lock:
+        with self._open_snapshot() as snapshot:
             root = None
-            if self._root:
-                root = self._export_node(self._root)
+            if snapshot.root:
+                root = self._export_node(snapshot.root, snapshot.read_node)
 
             return {
                 'version': 2,
                 'root': root
             }
 
-    def _export_node(self, node):
+    def export_binary(self, metadata):
+        """Export all persistent data of the tree, in the binary format.
+
+        Folders not loaded yet are copied without being loaded.
+
+        Args:
+            metadata (Dict): extra values to store in the file. See
+                `binary_index.encode()`.
+        Returns:
+            bytes: binary content, loadable by `load()` (version 3).
+        """
+        with self._open_snapshot() as snapshot:
+            return binary_index.encode(snapshot.root, metadata,
+                                       snapshot.read_node)
+
+    @contextmanager
+    def _open_snapshot(self):
+        """Take a snapshot of the tree, valid until the context exits.
+
+        The lock is acquired only to take the snapshot: the snapshot can be
+        read while the tree is modified.
+
+        Yields:
+            IndexSnapshot: the tree snapshot.
+        """
+        with self.lock:
+            snapshot = IndexSnapshot(self._root)
+            self._snapshots.append(snapshot)
+        try:
+            yield snapshot
+        finally:
+            with self.lock:
+                self._snapshots.remove(snapshot)
+
+    def _export_node(self, node, read=read_node):
         """Export node in a serialized format convertible to JSON.
 
+        Children not loaded yet are exported from the index file.
+
         Args:
             node (BaseNode): node to export.
+            read (Callable[[BaseNode], Tuple]): function reading the node's
+                data. See `index_snapshot.read_node()`.
         Returns:
-            Dict: serialized node
+            Dict: serialized node. States are copies of the node's states.
         """
-        if isinstance(node, FileNode):
-            node_type = "FILE"
-        else:
-            node_type = "FOLDER"
-
-        result = {
-            'type': node_type
-        }
-        if node.state is not None:
-            result['state'] = node.state
-        if node.children:
-            result['children'] = {name: self._export_node(child)
-                                  for name, child in node.children.items()}
+        result = {}
+        stack = [(node, result)]
+        while stack:
+            node, node_def = stack.pop()
+            if isinstance(node, FileNode):
+                node_def['type'] = "FILE"
+            else:
+                node_def['type'] = "FOLDER"
+
+            state, children, lazy_children = read(node)
+            if state is not None:
+                node_def['state'] = state
+            if lazy_children is not None:
+                node_def['children'] = self._export_lazy_children(
+                    lazy_children.iter_items())
+            elif children:
+                node_def['children'] = {}
+                for name, child in children:
+                    child_def = node_def['children'][name] = {}
+                    stack.append((child, child_def))
+        return result
+
+    def _export_lazy_children(self, items):
+        """Export children not loaded, as `_export_node()` does.
+
+        Args:
+            items (Iterable[Tuple]): children, as returned by
+                `LazyChildren.iter_items()`.
+        Returns:
+            Dict[Text, Dict]: serialized children, by name.
+        """
+        result = {}
+        stack = [(items, result)]
+        while stack:
+            items, node_defs = stack.pop()
+            for is_folder, name, state, children in items:
+                node_def = {'type': 'FOLDER' if is_folder else 'FILE'}
+                if state is not None:
+                    node_def['state'] = {key: _unpack_hash(value)
+                                         for key, value in state.items()}
+                if children:
+                    node_def['children'] = {}
+                    stack.append((children, node_def['children']))
+                node_defs[name] = node_def
         return result
 
     def get_remote_hashes(self):
         """Get the flatten list of remote hashes of all file nodes.
 
+        The list is built by the first call only. Then, it's maintained by the
+        tree at each modification, and the same list is returned without
+        copy, as a read-only view (a copy under Python 2).
+
         Note:
             Nodes that are not instance of FileNode are ignored.
+            The view is modified with the tree lock acquired. Readers that
+            don't own the lock can check keys and read values, but must
+            iterate over a copy (eg: `list(view.items())`).
 
         Returns:
-            Dict[Text, str]: dict of all files, with file path as key and
+            Mapping[Text, str]: dict of all files, with file path as key and
                 remote hash as value.
         """
 
         with self.lock:
-            if not self._root:
-                return {}
-            return self._get_remote_hashes(self._root, {})
+            if self._remote_hashes is None:
+                self._remote_hashes = {}
+                if self._root:
+                    self._get_remote_hashes(self._root, self._remote_hashes)
+            return _read_only_view(self._remote_hashes)
 
     def _get_remote_hashes(self, node, acc):
-        if isinstance(node, FileNode) and node.state:
-            if 'remote_hash' in node.state:
-                acc[node.get_full_path()] = node.state['remote_hash']
-        for child in node.children.values():
-            self._get_remote_hashes(child, acc)
+        # The paths are built during the browse, from the parent's path.
+        stack = [(node, node.get_full_path())]
+        while stack:
+            node, path = stack.pop()
+            if isinstance(node, FileNode):
+                remote_hash = node.get_hashes()[1]
+                if remote_hash is not None:
+                    acc[path] = remote_hash
+            elif isinstance(node, FolderNode) and \
+                    node._lazy_children is not None:
+                # Read the hashes from the index, without loading the nodes.
+                for file_path, state in node._lazy_children.iter_files(path):
+                    if state and state.get('remote_hash') is not None:
+                        acc[file_path] = state['remote_hash']
+            else:
+                for name, child in node.children.items():
+                    child_path = name if path == u'.' else path + u'/' + name
+                    stack.append((child, child_path))
         return acc
 
+    def get_stats(self):
+        """Get statistics about the content of the tree.
+
+        The stats are maintained by the nodes: only the first call has to
+        browse the tree (or the index file, for nodes not loaded yet).
+
+        Returns:
+            Tuple[int, int, int]: number of folders, number of files, and
+                total size of the files (in bytes), as known at their last
+                sync. The root folder is not counted.
+        """
+        with self.lock:
+            if not self._root:
+                return 0, 0, 0
+            return self._root.get_stats()
+
     def is_dirty(self):
         """Determine if the tree is dirty or sync.
 
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import json
+import logging
+import os.path
+import sqlite3
+import threading
+
+from .index_saver import IndexSaver
+
+_logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS containers ('
+    '    container_id TEXT PRIMARY KEY'
+    ')',
+    'CREATE TABLE IF NOT EXISTS nodes ('
+    '    container_id TEXT NOT NULL,'
+    '    path TEXT NOT NULL,'
+    '    type TEXT NOT NULL,'
+    '    local_hash,'
+    '    remote_hash,'
+    '    extra_state TEXT,'
+    '    PRIMARY KEY (container_id, path)'
+    ')'
+)
+
+
+class SQLiteIndexSaver(IndexSaver):
+    """Persists an IndexTree in a SQLite database.
+
+    The database is shared by all containers of a user profile. It contains
+    one row per node, keyed by container id and node path. The root node has
+    the path '.'.
+
+    The journal entries of the tree are applied in a single transaction at
+    each save, so the database is always consistent, even after a crash.
+
+    The index file in the container folder is still created, as a marker of
+    the container folder. If the container is not known by the database at
+    load, its index is read from the index file (and its journal), and is
+    written in the database at the next save.
+    """
+
+    def __init__(self, index_tree, directory, model_id, db_path):
+        """SQLiteIndexSaver constructor
+
+        Args:
+            index_tree (IndexTree): index to save.
+            directory (Text): container folder.
+            model_id (Text): container id.
+            db_path (Text): path of the SQLite database.
+        """
+        IndexSaver.__init__(self, index_tree, directory, model_id)
+        self.db_path = db_path
+
+        self._db_lock = threading.Lock()
+        self._connection = None
+        # If True, the next save rewrite all rows of the container.
+        self._full_write_needed = False
+
+    def _get_connection(self):
+        """Open the database if needed. `self._db_lock` must be acquired."""
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path,
+                                               check_same_thread=False)
+            with self._connection:
+                for statement in _SCHEMA:
+                    self._connection.execute(statement)
+        return self._connection
+
+    def load(self):
+        """Load the index of the container.
+
+        Returns:
+            Dict: index data, loadable by `IndexTree.load()`.
+        Raises:
+            IOError: if the container is not in the database, and the index
+                file doesn't exists; or if the container folder is missing.
+        """
+        with self._db_lock:
+            connection = self._get_connection()
+            known = connection.execute(
+                'SELECT 1 FROM containers WHERE container_id = ?',
+                (self.model_id,)).fetchone()
+            if known:
+                rows = connection.execute(
+                    'SELECT path, type, local_hash, remote_hash, extra_state '
+                    'FROM nodes WHERE container_id = ? ORDER BY path',
+                    (self.model_id,)).fetchall()
+
+        if not known:
+            _logger.info('Container %s not found in the index database. '
+                         'Read the index file.', self.model_id)
+            data = IndexSaver.load(self)
+            with self._journal_lock:
+                self._pending_entries = []
+                self._full_write_needed = True
+            return data
+
+        if not os.path.isdir(self.directory):
+            raise IOError(errno.ENOENT, 'Container folder is missing',
+                          self.directory)
+
+        with self._journal_lock:
+            self._pending_entries = []
+            self._full_write_needed = False
+        return {'version': 2, 'root': self._build_root_def(rows)}
+
+    @staticmethod
+    def _build_root_def(rows):
+        """Build the tree definition (see IndexTree.load()) from rows.
+
+        Args:
+            rows (List[Tuple]): rows of the nodes table, sorted by path. A
+                parent path is always sorted before the paths of its
+                children.
+        Returns:
+            Optional[Dict]: definition of the root node.
+        """
+        if not rows:
+            return None
+        root_def = {'type': 'FOLDER'}
+        node_defs = {u'.': root_def}
+        for path, node_type, local_hash, remote_hash, extra_state in rows:
+            node_def = node_defs.get(path)
+            if node_def is None:
+                node_def = node_defs[path] = {}
+                parent_path, _, name = path.rpartition(u'/')
+                parent_def = node_defs.get(parent_path or u'.')
+                if parent_def is None:
+                    _logger.warning('Orphan node %s in index database. '
+                                    'Ignored.', path)
+                    continue
+                parent_def.setdefault('children', {})[name] = node_def
+            node_def['type'] = node_type
+            node_def['state'] = _state_from_row(local_hash, remote_hash,
+                                                extra_state)
+        return root_def
+
+    def create_empty_file(self):
+        """Create the index file, and an empty index in database."""
+        IndexSaver.create_empty_file(self)
+        with self._db_lock:
+            connection = self._get_connection()
+            with connection:
+                connection.execute('DELETE FROM nodes WHERE container_id = ?',
+                                   (self.model_id,))
+                connection.execute(
+                    'INSERT OR REPLACE INTO containers (container_id) '
+                    'VALUES (?)', (self.model_id,))
+        with self._journal_lock:
+            self._full_write_needed = False
+
+    def _save(self, nb_err=0):
+        with self._journal_lock:
+            entries = self._pending_entries
+            self._pending_entries = []
+            full_write = self._full_write_needed
+            self._full_write_needed = False
+
+        try:
+            if full_write:
+                self._write_all()
+            elif entries:
+                self._apply_entries(entries)
+        except Exception:
+            _logger.exception('Unable to save index of container %s in '
+                              'database:' % self.model_id)
+            # Some entries are lost: the next save must rewrite all.
+            with self._journal_lock:
+                self._full_write_needed = True
+            self.trigger_save(nb_err + 1)
+
+    def _write_all(self):
+        """Replace all the rows of the container by the whole tree."""
+        _logger.debug('save whole index of container %s in database',
+                      self.model_id)
+        with self._journal_lock:
+            # Entries added from now will be applied at the next save.
+            self._pending_entries = []
+        root_def = self.index_tree.export_data().get('root')
+
+        with self._db_lock:
+            connection = self._get_connection()
+            with connection:
+                connection.execute('DELETE FROM nodes WHERE container_id = ?',
+                                   (self.model_id,))
+                if root_def:
+                    self._insert_nodes(connection, u'.', root_def)
+                connection.execute(
+                    'INSERT OR REPLACE INTO containers (container_id) '
+                    'VALUES (?)', (self.model_id,))
+
+    def _apply_entries(self, entries):
+        """Apply journal entries to the database, in one transaction."""
+        _logger.log(5, 'apply %s entries in database for container %s',
+                    len(entries), self.model_id)
+        with self._db_lock:
+            connection = self._get_connection()
+            with connection:
+                for entry in entries:
+                    if entry['op'] == 'add':
+                        self._delete_nodes(connection, entry['path'])
+                        self._insert_nodes(connection, entry['path'],
+                                           entry['node'])
+                    elif entry['op'] == 'rm':
+                        self._delete_nodes(connection, entry['path'])
+                    elif entry['op'] == 'state':
+                        self._update_state(connection, entry['path'],
+                                           entry['state'])
+
+    def _insert_nodes(self, connection, path, node_def):
+        """Insert the rows of a node and all its descendants."""
+        rows = []
+        stack = [(path, node_def)]
+        while stack:
+            path, node_def = stack.pop()
+            rows.append((self.model_id, path, node_def.get('type', 'FILE')) +
+                        _state_to_row(node_def.get('state')))
+            for name, child_def in node_def.get('children', {}).items():
+                child_path = name if path == u'.' else path + u'/' + name
+                stack.append((child_path, child_def))
+        connection.executemany(
+            'INSERT OR REPLACE INTO nodes (container_id, path, type, '
+            'local_hash, remote_hash, extra_state) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def _delete_nodes(self, connection, path):
+        """Delete the rows of a node and all its descendants."""
+        # All descendants paths are between "path/" and "path0", as '0' is
+        # the character following '/'.
+        connection.execute(
+            'DELETE FROM nodes WHERE container_id = ? AND '
+            '(path = ? OR (path >= ? AND path < ?))',
+            (self.model_id, path, path + u'/', path + u'0'))
+
+    def _update_state(self, connection, path, state):
+        cursor = connection.execute(
+            'UPDATE nodes SET local_hash = ?, remote_hash = ?, '
+            'extra_state = ? WHERE container_id = ? AND path = ?',
+            _state_to_row(state) + (self.model_id, path))
+        if cursor.rowcount == 0 and path == u'.':
+            # The root node is created implicitly.
+            self._insert_nodes(connection, path,
+                               {'type': 'FOLDER', 'state': state})
+
+    def stop(self):
+        IndexSaver.stop(self)
+        with self._db_lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def _state_to_row(state):
+    """Split a state in 3 columns: local_hash, remote_hash and extra_state.
+
+    Values other than the hashes are stored in JSON, in extra_state. It's
+    NULL when there is no other value, except for states without any hash.
+    """
+    if state is None:
+        return None, None, None
+    local_hash = state.get('local_hash')
+    remote_hash = state.get('remote_hash')
+    extra = {key: value for key, value in state.items()
+             if key not in ('local_hash', 'remote_hash')}
+    extra_state = None
+    if extra or (local_hash is None and remote_hash is None):
+        extra_state = json.dumps(extra)
+    return local_hash, remote_hash, extra_state
+
+
+def _state_from_row(local_hash, remote_hash, extra_state):
+    """Reverse of `_state_to_row()`."""
+    if local_hash is None and remote_hash is None and extra_state is None:
+        return None
+    state = json.loads(extra_state) if extra_state else {}
+    state['local_hash'] = local_hash
+    state['remote_hash'] = remote_hash
+    return state
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""Order in which the non-sync nodes are synced.
+
+The nodes waiting for a task are served in the order they became non-sync,
+but each node can be delayed by a bounded number of positions, depending of
+the expected cost of its task:
+
+- Metadata-only changes (folders, deletions and moves) are never delayed:
+  they're cheap, and they often unblock other operations.
+- Local changes are favored over the changes coming from the server: a file
+  the user has just saved should be uploaded first.
+- Larger files are delayed more.
+
+As the delay is bounded, a node is overtaken by at most `MAX_DELAY` nodes
+queued after it: a huge file can't be starved by a continuous flow of small
+ones.
+"""
+
+from .file_node import FileNode
+from .hints import DeletedHint, DestMoveHint, ModifiedHint, SourceMoveHint
+
+# Delay of the changes coming only from the server, in number of nodes.
+REMOTE_DELAY = 64
+
+# Delay of the files, by size: (max size in bytes, delay in number of nodes).
+SIZE_DELAYS = (
+    (1024 * 1024, 0),
+    (32 * 1024 * 1024, 32),
+    (512 * 1024 * 1024, 256),
+)
+
+# Delay of the files larger than the last size of `SIZE_DELAYS`.
+LARGE_FILE_DELAY = 1024
+
+MAX_DELAY = REMOTE_DELAY + LARGE_FILE_DELAY
+
+# Local files up to this size are synced in priority (see `is_urgent()`).
+SMALL_FILE_SIZE = SIZE_DELAYS[0][0]
+
+
+def get_size(node):
+    """Get the expected size of the content to transfer for a node.
+
+    The size given by the last event is used when known; else, it's the size
+    of the last synced version.
+
+    Args:
+        node (BaseNode): non-sync node.
+    Returns:
+        Optional[int]: size in bytes. None if unknown, or if the node is not
+            a file.
+    """
+    if not isinstance(node, FileNode):
+        return None
+    for hint in (node.local_hint, node.remote_hint):
+        size = getattr(hint, 'size', None)
+        if size is not None:
+            return size
+    fingerprint = node.get_fingerprint()
+    return fingerprint[0] if fingerprint is not None else None
+
+
+def is_metadata_only(node):
+    """Check if the sync of a node doesn't need to transfer any content.
+
+    Args:
+        node (BaseNode): non-sync node.
+    Returns:
+        bool: True for folders, deletions and moves.
+    """
+    if not isinstance(node, FileNode):
+        return True
+    hint = node.local_hint or node.remote_hint  # Same order as TaskBuilder
+    return isinstance(hint, (DeletedHint, SourceMoveHint, DestMoveHint))
+
+
+def get_delay(node):
+    """Get the number of nodes which can be synced before this one.
+
+    Args:
+        node (BaseNode): non-sync node.
+    Returns:
+        int: delay, in number of nodes. Between 0 and `MAX_DELAY`.
+    """
+    if is_metadata_only(node):
+        return 0
+    delay = 0
+    if node.local_hint is None and node.remote_hint is not None:
+        delay = REMOTE_DELAY
+
+    size = get_size(node)
+    if size is None:
+        return delay
+    for max_size, size_delay in SIZE_DELAYS:
+        if size <= max_size:
+            return delay + size_delay
+    return delay + LARGE_FILE_DELAY
+
+
+def is_urgent(node):
+    """Check if a node is a small file modified locally.
+
+    Their tasks are put on top of the task queue (see `filesync.add_task()`).
+
+    Args:
+        node (BaseNode): non-sync node.
+    Returns:
+        bool: True if the node's task should be executed first.
+    """
+    if not isinstance(node.local_hint, ModifiedHint):
+        return False
+    size = get_size(node)
+    return size is not None and size <= SMALL_FILE_SIZE
@@ -10,7 +10,7 @@ from .common.i18n import _, N_
 from .common.signal import Signal
 from .common.strings import err2unicode
 from .encryption.errors import PassphraseAbortError
-from .index import IndexTree, IndexSaver
+from .index import IndexTree, IndexSaver, SQLiteIndexSaver
 from .promise import reduce_coroutine
 
 
@@ -64,15 +64,28 @@ class LocalContainer(object):
         ContainerStatus.WAIT_PASSPHRASE: N_('Passphrase needed')
     }
 
-    def __init__(self, model, container):
+    def __init__(self, model, container, index_db_path=None):
+        """LocalContainer constructor
+
+        Args:
+            model (ContainerModel): persistent data of the container.
+            container (Optional[Container]): API container object.
+            index_db_path (Optional[Text]): if set, the index is stored in
+                this SQLite database instead of the index file.
+        """
         self._status = ContainerStatus.SYNC_STOP
         self.error_msg = None
         self.container = container
         self.model = model
         self.is_moving = False
         self.index_tree = IndexTree()
-        self.index_saver = IndexSaver(self.index_tree, self.model.path,
-                                      self.model.id)
+        if index_db_path:
+            self.index_saver = SQLiteIndexSaver(self.index_tree,
+                                                self.model.path,
+                                                self.model.id, index_db_path)
+        else:
+            self.index_saver = IndexSaver(self.index_tree, self.model.path,
+                                          self.model.id)
         self.status_changed = Signal()
 
     @property
@@ -193,9 +206,12 @@ class LocalContainer(object):
     def get_remote_index(self):
         """Returns the remote part of the index.
 
+        The result is a read-only view of the index, kept up to date by the
+        index tree (see `IndexTree.get_remote_hashes()`).
+
         Returns:
-            dict: list of files, of the form {'file/name': md5sum}, with md5sum
-                the md5 hash of the remote file.
+            Mapping: list of files, of the form {'file/name': md5sum}, with
+                md5sum the md5 hash of the remote file.
         """
 
         return self.index_tree.get_remote_hashes()
@@ -214,27 +230,19 @@ class LocalContainer(object):
         """
         Get the statistics information relating to the local folder.
 
+        The values come from the index: they describe the files as they were
+        at their last sync, and the disk is never read. The container folder
+        itself is counted as a folder. The files synced before their size was
+        recorded in the index (by an older version of the index, or before
+        their first rehash) are counted with a size of 0.
+
         Returns <tuple>: (number of folders, number of files, total_size)
         """
-        total_size = 0
-        n_folders = 0
-        n_files = 0
-
-        _logger.debug('Get stats about container %s ..', self.container.id)
-        if self.model.path and os.path.exists(self.model.path):
-            for dir_path, dir_names, files_names in os.walk(self.model.path):
+        n_folders, n_files, total_size = self.index_tree.get_stats()
+        with self.index_tree.lock:
+            if self.index_tree.get_node_by_path(u'.') is not None:
                 n_folders += 1
-
-                for file_name in files_names:
-                    n_files += 1
-                    file_path = os.path.join(dir_path, file_name)
-                    total_size += os.path.getsize(file_path)
-
-            _logger.log(5, 'Stat collected for container %s',
-                        self.container.id)
-            return n_folders, n_files, total_size
-
-        return 0, 0, 0
+        return n_folders, n_files, total_size
 
     def get_status_text(self):
         return LocalContainer._status_texts.get(self._status, _('Unknown'))
@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""Downloads kept on the disk, so they can be resumed after an interruption.
+
+The data of a large download is written in the cache folder as it's
+received, and a small JSON file describes it (URL, ETag and total size).
+If the download is interrupted (connection lost, client stopped), the next
+download of the same URL requests only the missing part, using the `Range`
+HTTP header. The `If-Range` header, set to the ETag of the partial data,
+makes the server send the full content if the file has changed meanwhile.
+
+Partial downloads are identified by their URL. A URL can't be downloaded by
+two requests at the same time: the second one is not resumable (see
+`PartialDownload.create()`).
+
+A download can also be written directly in a file given by the caller (see
+`PartialDownload.create_in_file()`). It's resumed if the transfer is
+interrupted, but it's not kept on the disk for a later download.
+"""
+
+import errno
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from ..common.path import get_cache_dir
+from ..data import BadMd5SumException, BadSizeException
+
+_logger = logging.getLogger(__name__)
+
+# Name of the folder, in the cache directory.
+FOLDER_NAME = 'downloads'
+
+# Downloads smaller than this size are not kept on the disk.
+MIN_SIZE = 4 * 1024 * 1024
+
+# Partial downloads not resumed since this delay (in seconds) are deleted.
+MAX_AGE = 7 * 24 * 3600
+
+CHUNK_SIZE = 64 * 1024
+
+# URLs of the partial downloads in use. Protected by `_lock`.
+_active_urls = set()
+_lock = threading.Lock()
+_cleaned = False
+
+
+def _get_folder():
+    """Get the folder of the partial downloads, and create it if needed.
+
+    At the first call, the partial downloads too old are deleted.
+    """
+    global _cleaned
+
+    folder = os.path.join(get_cache_dir(), FOLDER_NAME)
+    try:
+        os.makedirs(folder)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    with _lock:
+        need_cleaning = not _cleaned
+        _cleaned = True
+    if need_cleaning:
+        _remove_old_files(folder)
+    return folder
+
+
+def _remove_old_files(folder):
+    limit = time.time() - MAX_AGE
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+        except (IOError, OSError):
+            _logger.debug('Unable to remove old partial download %s', path,
+                          exc_info=True)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except (IOError, OSError) as e:
+        if e.errno != errno.ENOENT:
+            _logger.warning('Unable to delete file: %s', path, exc_info=True)
+
+
+def _get_state_path(folder, url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(folder, '%s.json' % key)
+
+
+class _DownloadedFile(io.FileIO):
+    """Read-only file, deleted when closed."""
+
+    def close(self):
+        closed = self.closed
+        io.FileIO.close(self)
+        if not closed:
+            _remove(self.name)
+
+
+class PartialDownload(object):
+    """Data of a download, possibly incomplete, stored on the disk.
+
+    Instances are obtained by `load()`, `create()` or `create_in_file()`, and
+    must be released by one of `release()`, `discard()` or `complete()`.
+
+    Attributes:
+        url (str): URL of the file.
+        etag (str): ETag of the file, as sent by the server.
+        md5 (Optional[str]): md5 of the full content, if known. It's usually
+            the ETag, except for the large objects uploaded by segments.
+        total_size (int): size of the full content.
+        size (int): size of the data already received.
+    """
+
+    def __init__(self, url, etag, md5, total_size, state_path, data_path):
+        self.url = url
+        self.etag = etag
+        self.md5 = md5
+        self.total_size = total_size
+        self.size = 0
+        self._state_path = state_path
+        self._data_path = data_path
+        self._md5 = hashlib.md5()
+        self._file = None
+
+    @staticmethod
+    def _acquire(url):
+        with _lock:
+            if url in _active_urls:
+                return False
+            _active_urls.add(url)
+            return True
+
+    @staticmethod
+    def _release_url(url):
+        with _lock:
+            _active_urls.discard(url)
+
+    @classmethod
+    def load(cls, url):
+        """Find the partial download of an URL, kept by a previous attempt.
+
+        Args:
+            url (str): URL of the file.
+        Returns:
+            Optional[PartialDownload]: the partial download, or None if there
+                is none (or if it's in use).
+        """
+        if not cls._acquire(url):
+            return None
+        partial = None
+        try:
+            state_path = _get_state_path(_get_folder(), url)
+            state = _read_state(state_path)
+            data_path = os.path.join(os.path.dirname(state_path),
+                                     state['data_file'])
+            partial = cls(url, state['etag'], state['md5'],
+                          state['total_size'], state_path, data_path)
+            if state['url'] != url:
+                raise ValueError('URL mismatch')  # sha1 collision
+            partial._file = io.open(data_path, 'r+b')
+            while True:
+                chunk = partial._file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                partial._md5.update(chunk)
+                partial.size += len(chunk)
+        except (IOError, OSError, ValueError, KeyError) as e:
+            if partial is not None:
+                if getattr(e, 'errno', None) != errno.ENOENT:
+                    _logger.info('Partial download of %s not usable: %s',
+                                 url, e)
+                partial.discard()
+            else:
+                cls._release_url(url)
+            return None
+
+        if partial.size >= partial.total_size:
+            partial.discard()  # Can't be resumed. Should not happen.
+            return None
+        _logger.debug('Partial download of %s found: %s/%s bytes', url,
+                      partial.size, partial.total_size)
+        return partial
+
+    @classmethod
+    def create(cls, url, etag, md5, total_size):
+        """Start a new partial download, replacing any previous one.
+
+        Args:
+            url (str): URL of the file.
+            etag (str): ETag of the file.
+            md5 (Optional[str]): md5 of the full content, if known.
+            total_size (int): size of the full content.
+        Returns:
+            Optional[PartialDownload]: the new partial download, or None if
+                the file is too small, or if it's already being downloaded.
+        """
+        if total_size < MIN_SIZE or not cls._acquire(url):
+            return None
+        try:
+            folder = _get_folder()
+            state_path = _get_state_path(folder, url)
+            _remove_previous_data(state_path)
+            fd, data_path = tempfile.mkstemp(dir=folder, suffix='.part')
+            partial = cls(url, etag, md5, total_size, state_path, data_path)
+            partial._file = io.open(fd, 'r+b')
+            state = {
+                'url': url,
+                'etag': etag,
+                'md5': md5,
+                'total_size': total_size,
+                'data_file': os.path.basename(data_path)
+            }
+            with io.open(state_path, 'wb') as state_file:
+                state_file.write(json.dumps(state).encode('utf-8'))
+        except (IOError, OSError):
+            _logger.warning('Unable to store the partial download of %s',
+                            url, exc_info=True)
+            cls._release_url(url)
+            return None
+        return partial
+
+    @classmethod
+    def create_in_file(cls, url, etag, md5, total_size, data_path):
+        """Start a new download, written in a file given by the caller.
+
+        The download can be resumed after an interruption, as long as the
+        instance is not released, but no state is kept on the disk.
+
+        Args:
+            url (str): URL of the file.
+            etag (str): ETag of the file.
+            md5 (Optional[str]): md5 of the full content, if known.
+            total_size (int): size of the full content.
+            data_path (str): path of the file receiving the content. It's
+                truncated. It's never deleted, even by `discard()`.
+        Returns:
+            Optional[PartialDownload]: the new download, or None if the URL is
+                already being downloaded.
+        """
+        if not cls._acquire(url):
+            return None
+        partial = cls(url, etag, md5, total_size, None, data_path)
+        try:
+            partial._file = io.open(data_path, 'wb')
+        except (IOError, OSError):
+            cls._release_url(url)
+            raise
+        return partial
+
+    def get_content_md5(self):
+        """Get the md5 of the data received so far.
+
+        Returns:
+            str: md5 hash, in hexadecimal form.
+        """
+        return self._md5.hexdigest()
+
+    def get_range_headers(self):
+        """Get the HTTP headers requesting the missing part of the file.
+
+        Returns:
+            dict: the "Range" and "If-Range" headers.
+        """
+        return {
+            'Range': 'bytes=%s-' % self.size,
+            'If-Range': self.etag
+        }
+
+    def receive(self, stream):
+        """Append the data read from a stream, until its end.
+
+        The data is written on the disk as it's received, so it's kept even
+        if the stream is interrupted by an exception.
+
+        Args:
+            stream (File-like): source of the data, starting at the offset
+                `size` of the file.
+        Raises:
+            BadSizeException: the stream has ended before the end of the file.
+        """
+        self._file.seek(self.size)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self._file.write(chunk)
+            self._md5.update(chunk)
+            self.size += len(chunk)
+        self._file.flush()
+        if self.size != self.total_size:
+            raise BadSizeException(received=self.size,
+                                   expected=self.total_size)
+
+    def release(self):
+        """Stop the download, and keep the data for a later resume."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._release_url(self.url)
+
+    def discard(self):
+        """Stop the download, and delete its data."""
+        self.release()
+        if self._state_path is not None:
+            _remove(self._state_path)
+            _remove(self._data_path)
+
+    def complete(self):
+        """Check the downloaded file, and get it.
+
+        Returns:
+            Optional[File]: the downloaded file, opened for reading. It's
+                deleted when closed. None if the data has been written in the
+                caller's file (see `create_in_file()`).
+        Raises:
+            BadMd5SumException: the content doesn't match the expected md5.
+                The partial download is discarded.
+        """
+        md5 = self._md5.hexdigest()
+        if self.md5 is not None and md5 != self.md5:
+            self.discard()
+            raise BadMd5SumException(received=md5, expected=self.md5)
+
+        self.release()
+        if self._state_path is None:
+            return None
+        _remove(self._state_path)
+        return _DownloadedFile(self._data_path, 'rb')
+
+
+def _read_state(state_path):
+    with io.open(state_path, 'rb') as state_file:
+        return json.loads(state_file.read().decode('utf-8'))
+
+
+def _remove_previous_data(state_path):
+    """Delete the data of a partial download replaced by a new one."""
+    try:
+        data_file = _read_state(state_path)['data_file']
+    except (IOError, OSError, ValueError, KeyError):
+        return
+    _remove(os.path.join(os.path.dirname(state_path), data_file))
@@ -2,12 +2,43 @@
 
 import io
 import logging
+import socket
 
-from ..data import ChunkData
+import requests.packages.urllib3 as urllib3
+
+from ..common.i18n import N_
+from ..data import BadSizeException, ChunkData
 from . import errors
+from .partial_download import CHUNK_SIZE, PartialDownload
 
 _logger = logging.getLogger(__name__)
 
+# Maximum number of consecutive interruptions of a download, without any
+# progress, before giving up.
+MAX_RESUME_ATTEMPTS = 3
+
+# Errors interrupting the transfer of a response body.
+_INTERRUPTION_ERRORS = (BadSizeException, urllib3.exceptions.ProtocolError,
+                        urllib3.exceptions.ReadTimeoutError, socket.error)
+
+# Size of the chunks sent when the size of the uploaded file is unknown.
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _is_seekable(file):
+    try:
+        return file.seekable()
+    except AttributeError:
+        return True  # Python 2 file
+
+
+def _iter_chunks(file):
+    while True:
+        data = file.read(UPLOAD_CHUNK_SIZE)
+        if not data:
+            return
+        yield data
+
 
 @errors.handler
 def json_request(request, session, proxy_settings=None):
@@ -47,6 +78,25 @@ def json_request(request, session, proxy_settings=None):
 def download(request, session, proxy_settings=None):
     """Performs a download HTTP requests, then returns the result.
 
+    Large files are kept on the disk while they're downloaded (see
+    `partial_download`). If the transfer is interrupted, it's resumed where
+    it stopped, using a `Range` request. If it can't be completed, the data
+    is kept for the next download of the same URL, even after a restart.
+
+    Two optional parameters, not sent to the server, can be set in the
+    request params:
+      - 'size_limit' (int): if the file is of this size or more, and if the
+        server accepts range requests, the content is not downloaded: only
+        the headers are returned, and 'content' is None. It lets the caller
+        download it by ranges.
+      - 'dst' (File-like): the request is a range request (its "Range"
+        header must be set). The content of the range is written in `dst`,
+        from its start, and 'content' is None.
+      - 'dst_path' (str): the content is written in this file, instead of a
+        temporary file. 'content' is None, and the result has a 4th key,
+        'md5', the md5 hash of the written content. An interrupted transfer
+        is resumed, but the data is not kept for a later download.
+
     Args:
         request (Request):
         session (requests.Session)
@@ -61,21 +111,245 @@ def download(request, session, proxy_settings=None):
     """
     params = request.params
     params.setdefault('proxies', proxy_settings)
+    size_limit = params.pop('size_limit', None)
+    dst = params.pop('dst', None)
+    dst_path = params.pop('dst_path', None)
+
+    if dst is not None:
+        return _download_range(request, session, params, dst)
+
+    partial = None
+    if request.verb == 'GET' and dst_path is None:
+        partial = PartialDownload.load(request.url)
+    nb_failures = 0
+
+    try:
+        while True:
+            response = _send_download_request(request, session, params,
+                                              partial)
+
+            if partial is not None and response.status_code == 416:
+                # Range not satisfiable: the file has probably shrunk.
+                response.close()
+                partial.discard()
+                partial = None
+                continue
+
+            response.raise_for_status()
+
+            if partial is not None and not _match_range(response, partial):
+                # The file has changed: the server sends it from the start.
+                _logger.debug('Partial download of %s is obsolete.',
+                              request.url)
+                partial.discard()
+                partial = None
+                if response.status_code == 206:  # Unexpected range.
+                    response.close()
+                    continue
+
+            if partial is None:
+                if _is_too_large(request, response, size_limit):
+                    response.close()
+                    _logger.log(5, 'Content of %s not downloaded: too large.',
+                                request.url)
+                    return {
+                        'code': response.status_code,
+                        'headers': response.headers,
+                        'content': None
+                    }
+                partial = _create_partial_download(request, response,
+                                                   dst_path)
+                if partial is None:
+                    return _download_in_memory(request, response, dst_path)
+
+            size_before = partial.size
+            try:
+                with response.raw:
+                    partial.receive(response.raw)
+            except _INTERRUPTION_ERRORS as error:
+                if partial.size > size_before:
+                    nb_failures = 0
+                nb_failures += 1
+                if nb_failures > MAX_RESUME_ATTEMPTS:
+                    _logger.info('Download of %s interrupted at %s/%s bytes',
+                                 request.url, partial.size, partial.total_size)
+                    if isinstance(error, BadSizeException):
+                        raise
+                    raise BadSizeException(received=partial.size,
+                                           expected=partial.total_size)
+                _logger.debug('Download of %s interrupted at %s/%s bytes: '
+                              'resume it.', request.url, partial.size,
+                              partial.total_size)
+                continue
+
+            total_size = partial.total_size
+            content_md5 = partial.get_content_md5()
+            content = partial.complete()
+            partial = None
+            break
+    finally:
+        if partial is not None:
+            partial.release()
+
+    _logger.log(5, "Downloaded %s bytes from %s", total_size, request.url)
+
+    result = {
+        'code': 200,
+        'headers': response.headers,
+        'content': content
+    }
+    if dst_path is not None:
+        result['md5'] = content_md5
+    return result
+
+
+def _send_download_request(request, session, params, partial):
+    """Send the request, asking only the missing part if it's resumed."""
+    if partial is not None:
+        params = dict(params)
+        headers = dict(params.get('headers') or {})
+        headers.update(partial.get_range_headers())
+        params['headers'] = headers
+
     response = session.request(method=request.verb, url=request.url,
                                stream=True, **params)
 
     _logger.log(5, "request %s -> %s", request, response.status_code)
+    return response
 
-    response.raise_for_status()
 
+def _get_md5(response):
+    """Get the md5 of the content, given by the ETag.
+
+    Returns:
+        Optional[str]: the md5, or None if it's unknown. The ETag of a large
+            object uploaded by segments is not the md5 of its content.
+    """
+    if response.headers.get('x-static-large-object'):
+        return None
+    return response.headers.get('etag')
+
+
+def _match_range(response, partial):
+    """Check if a response contains the missing part of a partial download.
+    """
+    if response.status_code != 206:
+        return False
+    expected_range = 'bytes %s-%s/%s' % (partial.size, partial.total_size - 1,
+                                         partial.total_size)
+    return response.headers.get('content-range') == expected_range
+
+
+def _create_partial_download(request, response, dst_path=None):
+    """Prepare the storage of a download on the disk, if it's worth it.
+
+    Args:
+        dst_path (str, optional): if set, the file receiving the content.
+    Returns:
+        Optional[PartialDownload]: None if the file should not be resumable.
+    """
+    etag = response.headers.get('etag')
+    size = response.headers.get('content-length')
+    if (request.verb != 'GET' or response.status_code != 200 or not etag or
+            not size or response.headers.get('content-encoding')):
+        return None
+    if dst_path is not None:
+        return PartialDownload.create_in_file(request.url, etag,
+                                              _get_md5(response), int(size),
+                                              dst_path)
+    return PartialDownload.create(request.url, etag, _get_md5(response),
+                                  int(size))
+
+
+def _is_too_large(request, response, size_limit):
+    """Check if a file should be downloaded by ranges instead.
+
+    Returns:
+        bool: True if the file is of size `size_limit` or more, and the
+            server can send it by ranges.
+    """
+    size = response.headers.get('content-length')
+    return (size_limit is not None and request.verb == 'GET' and
+            response.status_code == 200 and size and
+            int(size) >= size_limit and
+            response.headers.get('accept-ranges') == 'bytes' and
+            response.headers.get('etag') and
+            not response.headers.get('content-encoding'))
+
+
+def _download_range(request, session, params, dst):
+    """Download a range of a file, and write it in `dst`."""
+    response = session.request(method=request.verb, url=request.url,
+                               stream=True, **params)
+
+    _logger.log(5, "request %s -> %s", request, response.status_code)
+
+    try:
+        response.raise_for_status()
+
+        requested_range = params['headers']['Range']
+        content_range = response.headers.get('content-range', '')
+        if (response.status_code != 206 or not content_range.startswith(
+                'bytes %s/' % requested_range[len('bytes='):])):
+            raise errors.NetworkError(message=N_(
+                'The server has sent an unexpected part of the file.'))
+
+        expected_size = int(response.headers['content-length'])
+        size = 0
+        dst.seek(0)
+        try:
+            while True:
+                chunk = response.raw.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                size += len(chunk)
+        except _INTERRUPTION_ERRORS:
+            pass  # The size doesn't match: handled below.
+        if size != expected_size:
+            raise BadSizeException(received=size, expected=expected_size)
+    finally:
+        response.close()
+
+    _logger.log(5, "Downloaded %s bytes from %s (%s)", size, request.url,
+                content_range)
+
+    return {
+        'code': response.status_code,
+        'headers': response.headers,
+        'content': None
+    }
+
+
+def _download_in_memory(request, response, dst_path=None):
+    """Download the whole file in a temporary file (or in memory).
+
+    Args:
+        dst_path (str, optional): if set, the file receiving the content,
+            instead of a temporary file.
+    """
     with response.raw:
-        data = ChunkData(response.raw,
-                         hint_size=response.headers.get('content-length'),
-                         hint_md5=response.headers.get('etag'))
+        if dst_path is None:
+            data = ChunkData(response.raw,
+                             hint_size=response.headers.get('content-length'),
+                             hint_md5=_get_md5(response))
+        else:
+            with io.open(dst_path, 'wb') as dst_file:
+                data = ChunkData(
+                    response.raw,
+                    hint_size=response.headers.get('content-length'),
+                    hint_md5=_get_md5(response), dst_file=dst_file)
 
     _logger.log(5, "Downloaded %s bytes from %s",
                 data.total_size, request.url)
 
+    if dst_path is not None:
+        return {
+            'code': response.status_code,
+            'headers': response.headers,
+            'content': None,
+            'md5': data.partial_md5_sum
+        }
     return {
         'code': response.status_code,
         'headers': response.headers,
@@ -88,7 +362,8 @@ def upload(request, session, proxy_settings=None):
     """Performs an upload HTTP requests, then returns the result.
 
     Args:
-        request (Request):
+        request (Request): its source can be a non-seekable stream, of
+            unknown size.
         session (requests.Session)
         proxy_settings (dict, optional): proxy settings to pass to the requests
             library.
@@ -114,8 +389,14 @@ def upload(request, session, proxy_settings=None):
     with file:
         _logger.log(5, "start request %s", request)
 
+        data = file
+        if not _is_seekable(file):
+            # The size is unknown (eg: data encrypted on the fly). The file is
+            # sent using the chunked transfer encoding.
+            data = _iter_chunks(file)
+
         response = session.request(method=request.verb, url=request.url,
-                                   data=file, **params)
+                                   data=data, **params)
 
         _logger.log(5, "request %s -> %s", request, response.status_code)
 
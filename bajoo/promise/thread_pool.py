@@ -41,3 +41,13 @@ class ThreadPoolExecutor(object):
         f.add_done_callback(on_future_done)
 
         return df.promise
+
+    def shutdown(self, wait=True):
+        """Stop the threads, once the pending callables are executed.
+
+        No callable can be submitted after the call.
+
+        Args:
+            wait (bool): if True, returns only when all threads are joined.
+        """
+        self._executor.shutdown(wait)
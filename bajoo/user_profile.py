@@ -263,6 +263,13 @@ class UserProfile(object):
         p = u'%s-gpg' % hashlib.md5(self.email.encode('utf-8')).hexdigest()
         return os.path.join(get_data_dir(), p)
 
+    @property
+    def index_db_path(self):
+        """Path of the SQLite database storing the containers indexes."""
+        p = u'%s-index.sqlite' % hashlib.md5(
+            self.email.encode('utf-8')).hexdigest()
+        return os.path.join(get_data_dir(), p)
+
     def get_all_containers(self):
         """Returns all containers saved.
 
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import threading
+import time
+
+import pytest
+
+from bajoo.api import ranged_download
+from bajoo.common import config
+from bajoo.network.errors import ConnectionError, CorruptedDownloadError
+from bajoo.promise import ThreadPoolExecutor
+
+RANGE_SIZE = 1000
+
+
+class FakeStorage(object):
+    """Stand-in for the storage server, used as session.
+
+    Requests are executed by a pool of threads, like the network workers.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.etag = hashlib.md5(content).hexdigest()
+        self.requested_ranges = []
+        self.failures = {}  # first byte of the range -> number of failures
+        self.max_running = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(8)
+
+    def _get_range(self, headers, dst):
+        with self._lock:
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+            self.requested_ranges.append(headers['Range'])
+        try:
+            time.sleep(0.01)
+            assert headers['If-Match'] == self.etag
+            start, end = headers['Range'][len('bytes='):].split('-')
+            start, end = int(start), int(end)
+            dst.seek(0)
+            dst.write(self.content[start:start + 500])
+            with self._lock:
+                if self.failures.get(start):
+                    self.failures[start] -= 1
+                    raise ConnectionError(None)
+            dst.write(self.content[start + 500:end + 1])
+            return {'code': 206, 'headers': {}, 'content': None}
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def download_storage_file(self, verb, url, headers=None, dst=None,
+                              priority=100):
+        assert priority > 100
+        return self._executor.submit(self._get_range, headers, dst)
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    options = {
+        'download_range_size': RANGE_SIZE,
+        'ranged_download_parallelism': 3
+    }
+    get = config.get
+    monkeypatch.setattr(config, 'get',
+                        lambda key: options[key] if key in options
+                        else get(key))
+    content = b''.join(b'%04d' % i for i in range(2600))  # 10400 bytes
+    return FakeStorage(content)
+
+
+class TestRangedDownload(object):
+
+    def _download(self, storage, dst, md5=None):
+        return ranged_download.download(storage, '/storages/abc/big file',
+                                        dst, len(storage.content),
+                                        storage.etag, md5).result(5)
+
+    def test_download_by_ranges(self, storage):
+        dst = io.BytesIO()
+        md5 = self._download(storage, dst, storage.etag)
+
+        assert md5 == storage.etag
+        assert dst.getvalue() == storage.content
+        assert len(storage.requested_ranges) == 11
+        assert 'bytes=10000-10399' in storage.requested_ranges
+        assert 1 < storage.max_running <= 3
+
+    def test_failed_range_is_retried_alone(self, storage):
+        storage.failures[4000] = 2
+        dst = io.BytesIO()
+        self._download(storage, dst, storage.etag)
+
+        assert dst.getvalue() == storage.content
+        assert storage.requested_ranges.count('bytes=4000-4999') == 3
+        assert len(storage.requested_ranges) == 13
+
+    def test_download_failure(self, storage):
+        storage.failures[4000] = 3
+        with pytest.raises(ConnectionError):
+            self._download(storage, io.BytesIO())
+
+    def test_corrupted_download(self, storage):
+        storage.content = storage.content[:-1] + b'x'
+        with pytest.raises(CorruptedDownloadError):
+            self._download(storage, io.BytesIO(), storage.etag)
+
+    def test_invalid_range_size(self, storage, monkeypatch):
+        get = config.get
+        monkeypatch.setattr(config, 'get',
+                            lambda key: 0 if key == 'download_range_size'
+                            else get(key))
+        dst = io.BytesIO()
+        assert self._download(storage, dst, storage.etag) == storage.etag
+        assert dst.getvalue() == storage.content
+        assert storage.requested_ranges == ['bytes=0-10399']
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from bajoo.api import segmented_upload
+from bajoo.common import config
+from bajoo.network.errors import ConnectionError
+from bajoo.promise import ThreadPoolExecutor
+
+SEGMENT_SIZE = 1000
+
+
+class FakeStorage(object):
+    """Stand-in for the storage server, used as session.
+
+    Requests are executed by a pool of threads, like the network workers.
+    Manifests are resolved as the concatenation of their segments.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.manifests = {}
+        self.put_count = {}
+        self.failures = {}  # end of url -> number of failures to simulate
+        self.max_running = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(8)
+
+    def _put(self, url, source, params):
+        with self._lock:
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+            self.put_count[url] = self.put_count.get(url, 0) + 1
+        try:
+            time.sleep(0.01)
+            with source:
+                content = source.read()
+            with self._lock:
+                for url_end, nb_failures in self.failures.items():
+                    if url.endswith(url_end) and nb_failures:
+                        self.failures[url_end] -= 1
+                        raise ConnectionError(None)
+            if params.get('params') == {'multipart-manifest': 'put'}:
+                self.manifests[url] = json.loads(content.decode('utf-8'))
+                etag = '"%s"' % hashlib.md5(content).hexdigest()
+            else:
+                self.objects[url] = content
+                etag = hashlib.md5(content).hexdigest()
+            return {'code': 201, 'headers': {'etag': etag}, 'content': None}
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def upload_storage_file(self, verb, url, source, **params):
+        return self._executor.submit(self._put, url, source, params)
+
+    def send_storage_request(self, verb, url, **params):
+        def delete():
+            del self.objects[url]
+        return self._executor.submit(delete)
+
+    def get_large_object(self, url):
+        return b''.join(
+            self.objects['/storages/%s' % entry['path'][1:]]
+            for entry in self.manifests[url])
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    options = {
+        'segmented_upload_threshold': 2 * SEGMENT_SIZE,
+        'upload_segment_size': SEGMENT_SIZE,
+        'segmented_upload_parallelism': 3
+    }
+    get = config.get
+    monkeypatch.setattr(config, 'get',
+                        lambda key: options[key] if key in options
+                        else get(key))
+    return FakeStorage()
+
+
+class TestSegmentedUpload(object):
+
+    content = b''.join(b'%04d' % i for i in range(2600))  # 10400 bytes
+
+    def _upload(self, storage):
+        return segmented_upload.upload(storage, 'abc', 'big file',
+                                       io.BytesIO(self.content),
+                                       len(self.content)).result(5)
+
+    def test_get_size(self):
+        source = io.BytesIO(b'abcdef')
+        source.seek(2)
+        assert segmented_upload.get_size(source) == 4
+        assert source.tell() == 2
+
+    def test_threshold(self, storage):
+        assert not segmented_upload.is_segmented_upload_needed(None)
+        assert not segmented_upload.is_segmented_upload_needed(1999)
+        assert segmented_upload.is_segmented_upload_needed(2000)
+
+    def test_upload_by_segments(self, storage):
+        result = self._upload(storage)
+
+        url = '/storages/abc/big file'
+        assert result['headers']['etag']
+        assert len(storage.manifests[url]) == 11
+        assert storage.get_large_object(url) == self.content
+        for path in storage.objects:
+            assert path.startswith('/storages/abc/.bajoo-segments/')
+            assert path.rsplit('/', 1)[1].startswith('.bajoo')
+        assert 1 < storage.max_running <= 3
+
+    def test_failed_segment_is_retried_alone(self, storage):
+        storage.failures['.bajoo-00000004'] = 2
+        self._upload(storage)
+
+        assert sorted(storage.put_count.values()) == [1] * 11 + [3]
+        assert storage.get_large_object('/storages/abc/big file') == \
+            self.content
+
+    def test_upload_failure_removes_segments(self, storage):
+        storage.failures['.bajoo-00000004'] = 3
+        with pytest.raises(ConnectionError):
+            self._upload(storage)
+
+        time.sleep(0.2)  # Segments are removed in background.
+        assert storage.objects == {}
+        assert storage.manifests == {}
@@ -1,12 +1,16 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from bajoo.common import config
+from bajoo.filesync import hash_service
+from bajoo.filesync.abstract_task import _Task
 from bajoo.filesync.added_local_files_task import AddedLocalFilesTask
 from bajoo.filesync.task_consumer import start, stop
 from .utils import TestTaskAbstract, generate_random_string, assert_content, \
     FakeFile
 
 import os
+import pytest
 import tempfile
 
 
@@ -157,6 +161,151 @@ class Test_Local_file_exists(TestTaskAbstract):
                                   self.local_file.remote_hash)
 
 
+class Test_Fingerprint(TestTaskAbstract):
+
+    def setup_method(self, method):
+        TestTaskAbstract.setup_method(self, method)
+        self.local_file = FakeFile()
+        self.add_file_to_close(self.local_file)
+        self.fingerprint = _Task._get_fingerprint(self.local_file.descr)
+
+    def test_UnchangedFileIsNotHashed(self):
+        # The stale local hash proves the file has not been read.
+        self.local_container.inject_hash(
+            path=self.local_file.filename,
+            local_hash="plop",
+            remote_hash=self.local_file.remote_hash,
+            fingerprint=self.fingerprint)
+
+        self.execute_task(generate_task(self, target=self.local_file.filename))
+        self.assert_no_error_on_task()
+
+        self.check_action()  # no action
+        self.assert_conflict(count=0)
+        self.assert_hash_in_index(self.local_file.filename,
+                                  "plop",
+                                  self.local_file.remote_hash)
+
+    def test_ChangedFingerprint(self):
+        self.local_container.inject_hash(
+            path=self.local_file.filename,
+            local_hash="plop",
+            remote_hash=self.local_file.remote_hash,
+            fingerprint=(0, 0, 0))
+
+        self.execute_task(generate_task(self, target=self.local_file.filename))
+        self.assert_no_error_on_task()
+
+        flist = (self.local_file.filename,)
+        self.check_action(getinfo=flist, uploaded=flist)
+        self.assert_hash_in_index(
+            self.local_file.filename,
+            self.local_file.local_hash,
+            self.local_file.filename +
+            "HASH_UPLOADED")
+        node = self.local_container.index_tree.get_node_by_path(
+            self.local_file.filename)
+        assert node.get_fingerprint() == self.fingerprint
+
+    def test_VerifyAllHashes(self, monkeypatch):
+        original_get = config.get
+        monkeypatch.setattr(config, 'get', lambda key: (
+            key == 'verify_all_hashes' or original_get(key)))
+        self.local_container.inject_hash(
+            path=self.local_file.filename,
+            local_hash="plop",
+            remote_hash=self.local_file.remote_hash,
+            fingerprint=self.fingerprint)
+
+        self.execute_task(generate_task(self, target=self.local_file.filename))
+        self.assert_no_error_on_task()
+
+        flist = (self.local_file.filename,)
+        self.check_action(getinfo=flist, uploaded=flist)
+        self.assert_hash_in_index(
+            self.local_file.filename,
+            self.local_file.local_hash,
+            self.local_file.filename +
+            "HASH_UPLOADED")
+
+
+@pytest.mark.skipif(hash_service.FAST_HASH_ALGORITHM is None,
+                    reason='No fast hash algorithm available')
+class Test_FastHash(TestTaskAbstract):
+
+    def setup_method(self, method):
+        TestTaskAbstract.setup_method(self, method)
+        self.local_file = FakeFile()
+        self.add_file_to_close(self.local_file)
+        hash_service.clear_cache()
+        self.fast_hash, = hash_service.compute_hashes(
+            self.local_file.descr, (hash_service.FAST_HASH_ALGORITHM,))
+        self.local_file.descr.seek(0)
+
+    def teardown_method(self, method):
+        hash_service.clear_cache()
+        TestTaskAbstract.teardown_method(self, method)
+
+    def _enable_fast_hash(self, monkeypatch):
+        original_get = config.get
+        monkeypatch.setattr(config, 'get', lambda key: (
+            key == 'fast_local_hash' or original_get(key)))
+
+    def test_SameFastHashSkipsMd5(self, monkeypatch):
+        self._enable_fast_hash(monkeypatch)
+        # The stale local hash proves the md5 has not been computed.
+        self.local_container.inject_hash(
+            path=self.local_file.filename,
+            local_hash="plop",
+            remote_hash=self.local_file.remote_hash,
+            fingerprint=(0, 0, 0),
+            fast_hash=self.fast_hash)
+
+        self.execute_task(generate_task(self, target=self.local_file.filename))
+        self.assert_no_error_on_task()
+
+        self.check_action()  # no action
+        self.assert_hash_in_index(self.local_file.filename,
+                                  "plop",
+                                  self.local_file.remote_hash)
+
+    def test_FastHashIsSavedWithMd5(self, monkeypatch):
+        self._enable_fast_hash(monkeypatch)
+        self.local_container.inject_hash(
+            path=self.local_file.filename,
+            local_hash="plop",
+            remote_hash=self.local_file.remote_hash,
+            fingerprint=(0, 0, 0),
+            fast_hash=hash_service.FAST_HASH_ALGORITHM + ':0')
+
+        self.execute_task(generate_task(self, target=self.local_file.filename))
+        self.assert_no_error_on_task()
+
+        flist = (self.local_file.filename,)
+        self.check_action(getinfo=flist, uploaded=flist)
+        node = self.local_container.index_tree.get_node_by_path(
+            self.local_file.filename)
+        assert node.get_hashes()[0] == self.local_file.local_hash
+        assert node.get_fast_hash() == self.fast_hash
+
+    def test_FastHashIsIgnoredWhenDisabled(self):
+        self.local_container.inject_hash(
+            path=self.local_file.filename,
+            local_hash="plop",
+            remote_hash=self.local_file.remote_hash,
+            fingerprint=(0, 0, 0),
+            fast_hash=self.fast_hash)
+
+        self.execute_task(generate_task(self, target=self.local_file.filename))
+        self.assert_no_error_on_task()
+
+        flist = (self.local_file.filename,)
+        self.check_action(getinfo=flist, uploaded=flist)
+        node = self.local_container.index_tree.get_node_by_path(
+            self.local_file.filename)
+        assert node.get_fast_hash() is None
+
+
 class Test_Conflict(TestTaskAbstract):
 
     def setup_method(self, method):
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+
+import pytest
+
+from bajoo.filesync import dir_scanner, downloaded_file
+
+
+@pytest.fixture
+def folder(tmpdir):
+    folder = tmpdir.mkdir('folder')
+    folder.join('file').write('content')
+    folder.join('.hidden file').write('content')
+    folder.join('.bajoo-index').write('content')
+    folder.mkdir('subfolder')
+    return folder
+
+
+class TestDirScanner(object):
+
+    def test_scan_dir(self, folder):
+        content = dir_scanner.scan_dir(folder.strpath)
+        assert content.files == ['file']
+        assert content.folders == ['subfolder']
+        assert list(content.file_stats) == ['file']
+        assert content.file_stats['file'].st_size == len('content')
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='symlink')
+    def test_scan_dir_ignore_symlinks(self, folder):
+        os.symlink(folder.join('file').strpath,
+                   folder.join('link').strpath)
+        content = dir_scanner.scan_dir(folder.strpath)
+        assert content.files == ['file']
+
+    def test_scan_dir_without_scandir(self, folder, monkeypatch):
+        monkeypatch.setattr(dir_scanner, 'scandir', None)
+        content = dir_scanner.scan_dir(folder.strpath)
+        assert content.files == ['file']
+        assert content.folders == ['subfolder']
+        assert content.file_stats['file'].st_size == len('content')
+
+    def test_scan_dir_removes_stale_downloads(self, folder):
+        stale = folder.join(downloaded_file.TMP_PREFIX + 'stale')
+        stale.write('content')
+        old = time.time() - downloaded_file.STALE_DELAY - 10
+        os.utime(stale.strpath, (old, old))
+        folder.join(downloaded_file.TMP_PREFIX + 'recent').write('content')
+
+        content = dir_scanner.scan_dir(folder.strpath)
+        assert content.files == ['file']
+        assert not stale.check()
+        assert folder.join(downloaded_file.TMP_PREFIX + 'recent').check()
+
+    def test_scan_missing_dir(self, tmpdir):
+        with pytest.raises(OSError):
+            dir_scanner.scan_dir(tmpdir.join('missing').strpath)
+
+    def test_submit(self, folder):
+        promises = [dir_scanner.submit(dir_scanner.scan_dir, path)
+                    for path in (folder.strpath,
+                                 folder.join('subfolder').strpath)]
+        assert [p.result(1).files for p in promises] == [['file'], []]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from bajoo.filesync.downloaded_file import DownloadedFile, TMP_PREFIX, \
+    STALE_DELAY, remove_stale_file
+
+
+class TestDownloadedFile(object):
+
+    def setup_method(self, method):
+        self.folder = tempfile.mkdtemp()
+        self.dest_path = os.path.join(self.folder, 'file.txt')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.folder)
+
+    def _create(self, content=b'content'):
+        path = DownloadedFile.create_tmp_file(self.dest_path)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return DownloadedFile(path)
+
+    def test_tmp_file_is_created_next_to_the_destination(self):
+        path = DownloadedFile.create_tmp_file(self.dest_path)
+        assert os.path.dirname(path) == self.folder
+        assert os.path.basename(path).startswith(TMP_PREFIX)
+
+    def test_tmp_file_of_missing_folder(self):
+        dest_path = os.path.join(self.folder, 'missing', 'file.txt')
+        path = DownloadedFile.create_tmp_file(dest_path)
+        try:
+            assert os.path.dirname(path) == tempfile.gettempdir()
+        finally:
+            os.remove(path)
+
+    def test_compute_md5(self):
+        downloaded_file = self._create()
+        with downloaded_file:
+            assert downloaded_file.compute_md5() == \
+                hashlib.md5(b'content').hexdigest()
+            assert downloaded_file.md5 == hashlib.md5(b'content').hexdigest()
+
+    def test_move_replaces_the_destination(self):
+        with open(self.dest_path, 'wb') as f:
+            f.write(b'old content')
+        with self._create() as downloaded_file:
+            stat_result = downloaded_file.move_to(self.dest_path)
+        assert stat_result.st_size == len(b'content')
+        with open(self.dest_path, 'rb') as f:
+            assert f.read() == b'content'
+        assert os.listdir(self.folder) == ['file.txt']
+
+    def test_close_deletes_the_file_not_moved(self):
+        with self._create():
+            pass
+        assert os.listdir(self.folder) == []
+
+    def test_remove_stale_file(self):
+        path = os.path.join(self.folder, TMP_PREFIX + 'left')
+        with open(path, 'wb') as f:
+            f.write(b'content')
+        assert not remove_stale_file(path, os.stat(path))
+
+        old = time.time() - STALE_DELAY - 10
+        os.utime(path, (old, old))
+        assert remove_stale_file(path, os.stat(path))
+        assert os.listdir(self.folder) == []
+
+    def test_file_in_use_is_not_stale(self):
+        with self._create() as downloaded_file:
+            old = time.time() - STALE_DELAY - 10
+            os.utime(downloaded_file.path, (old, old))
+            assert not remove_stale_file(downloaded_file.path,
+                                         os.stat(downloaded_file.path))
+            assert os.path.exists(downloaded_file.path)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import shutil
 from bajoo.promise.promise import Promise
 from bajoo.network.errors import HTTPNotFoundError, HTTPEntityTooLargeError
 from bajoo.encryption.errors import PassphraseAbortError
@@ -136,6 +137,19 @@ class Fake_container(object):
 
         return Promise(executor)
 
+    def download_to(self, path, dst_path):
+        def write(result):
+            metadata, remote_file = result
+            # The remote file is often a local file of the test. It's not
+            # closed (that would delete it), and is read by its name, as
+            # the task may have replaced it in the meantime.
+            with open(remote_file.name, 'rb') as src_file, \
+                    open(dst_path, 'wb') as dst_file:
+                shutil.copyfileobj(src_file, dst_file)
+            return {'hash': metadata['hash'], 'content_hash': None}
+
+        return self.download(path).then(write)
+
     def upload(self, path, file):
         if self.exception_to_raise_on_upload is not None:
             raise self.exception_to_raise_on_upload
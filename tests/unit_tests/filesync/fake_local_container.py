@@ -70,9 +70,10 @@ class FakeLocalContainer(LocalContainer):
     def remove_on_disk(self):
         raise Exception("Not supposed to be used in task testing")
 
-    def inject_hash(self, path, local_hash, remote_hash):
+    def inject_hash(self, path, local_hash, remote_hash, fingerprint=None,
+                    fast_hash=None):
         node = self.index_tree.get_or_create_node_by_path(path, FileNode)
-        node.set_hashes(local_hash, remote_hash)
+        node.set_hashes(local_hash, remote_hash, fingerprint, fast_hash)
 
     def inject_empty_node(self, path):
         self.index_tree.get_or_create_node_by_path(path, FileNode)
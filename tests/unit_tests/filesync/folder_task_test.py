@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import os
+
 from bajoo.common.fs import hide_file_if_windows
+from bajoo.filesync.abstract_task import _Task
 from bajoo.filesync.folder_task import FolderTask
+from bajoo.index import IndexTree
+from bajoo.index.hint_builder import HintBuilder
 from bajoo.index.hints import DeletedHint, ModifiedHint
 from bajoo.index.file_node import FileNode
 from bajoo.index.folder_node import FolderNode
 
+from .utils import TestTaskAbstract
+
 
 class FakeFolderNode(object):
     def __init__(self, name=u'node', full_path=u'node', exists=True):
@@ -89,6 +96,11 @@ class TestFolderTask(object):
         result = FolderTask.list_dir(tmpdir.strpath, 'target_dir', None)
         assert result == ([], [])
 
+    def test_list_dir_on_file(self, tmpdir):
+        tmpdir.join('target_dir').write('File content')
+        result = FolderTask.list_dir(tmpdir.strpath, 'target_dir', None)
+        assert result == ([], [])
+
     def test_list_dir_on_folder_with_file(self, tmpdir):
         tmpdir.mkdir('target_dir').join('file').write('File content')
         result = FolderTask.list_dir(tmpdir.strpath, 'target_dir', None)
@@ -112,6 +124,45 @@ class TestFolderTask(object):
         result = FolderTask.list_dir(tmpdir.strpath, 'target_dir', None)
         assert result == ([], [])
 
+    def test_list_dir_fills_file_stats(self, tmpdir):
+        target_dir = tmpdir.mkdir('target_dir')
+        target_dir.join('file').write('File content')
+        target_dir.mkdir('subfolder')
+        file_stats = {}
+        FolderTask.list_dir(tmpdir.strpath, 'target_dir', None, file_stats)
+        assert list(file_stats) == ['file']
+        assert file_stats['file'].st_size == len('File content')
+
+    def test_stat_files(self, tmpdir):
+        tmpdir.mkdir('target_dir').join('file').write('File content')
+        result = FolderTask.stat_files(tmpdir.strpath, 'target_dir',
+                                       ['file'])
+        assert list(result) == ['file']
+
+    def test_stat_files_with_missing_file(self, tmpdir):
+        tmpdir.mkdir('target_dir').join('file').write('File content')
+        result = FolderTask.stat_files(tmpdir.strpath, 'target_dir',
+                                       ['file', 'removed file'])
+        assert result is None
+
+    def test_find_modified_files(self, tmpdir):
+        target_dir = tmpdir.mkdir('target_dir')
+        for name in ('same', 'modified', 'unknown'):
+            target_dir.join(name).write(name)
+        file_stats = FolderTask.stat_files(tmpdir.strpath, 'target_dir',
+                                           ['same', 'modified', 'unknown'])
+        same = _Task._fingerprint_from_stat(file_stats['same'])
+        modified = _Task._fingerprint_from_stat(file_stats['modified'])
+        known_files = {
+            'same': same,
+            'modified': (modified[0] + 1,) + modified[1:],
+            'unknown': None,
+            'removed': same
+        }
+        result = FolderTask.find_modified_files(known_files, file_stats)
+        assert sorted(result) == ['modified', 'unknown']
+        assert result['modified'] == modified
+
     def test_apply_result_set_new_state(self):
         node = FakeFolderNode()
         FolderTask.diff_node_and_apply_result(node, {'new': 'state'}, [], [])
@@ -160,3 +211,112 @@ class TestFolderTask(object):
             node.children[name] = FakeFolderNode(name)
         FolderTask.diff_node_and_apply_result(node, None, ['A', 'B'], ['C'])
         assert len(node.undeleted_children()) is 3
+
+    def test_diff_children_detects_type_changes(self):
+        node = FolderNode(u'node')
+        node.add_child(FileNode(u'file'))
+        node.add_child(FileNode(u'was file'))
+        node.add_child(FolderNode(u'was folder'))
+        node.add_child(FileNode(u'removed'))
+
+        changes = FolderTask.diff_children(
+            node, [u'file', u'was folder', u'new file'],
+            [u'was file', u'new folder'])
+        assert [c.name for c in changes.deleted_children] == [u'removed']
+        assert sorted(c.name for c in changes.replaced_children) == \
+            [u'was file', u'was folder']
+        assert changes.new_files == [u'new file']
+        assert changes.new_folders == [u'new folder']
+
+    def test_replaced_child_is_added_once_removed(self):
+        node = FolderNode(u'node')
+        node.add_child(FileNode(u'A'))
+        node.children[u'A'].set_hashes('local', 'remote')
+        FolderTask.diff_node_and_apply_result(node, {'mtime_ns': 1}, [],
+                                              [u'A'])
+        assert isinstance(node.children[u'A'].local_hint, DeletedHint)
+        assert node.state is None
+        assert node.local_hint is None
+
+        node.rm_child(node.children[u'A'])
+        assert isinstance(node.local_hint, ModifiedHint)
+
+    def test_apply_diff_by_batches(self, monkeypatch):
+        monkeypatch.setattr(HintBuilder, 'BATCH_SIZE', 2)
+        tree = IndexTree()
+        with tree.lock:
+            node = tree.get_or_create_node_by_path(u'node', FolderNode)
+            node.add_child(FileNode(u'removed'))
+            node.children[u'removed'].set_hashes('local', 'remote')
+            changes = FolderTask.diff_children(
+                node, [u'file %s' % i for i in range(5)], [u'folder'])
+
+            # Created by another event, meanwhile.
+            tree.get_or_create_node_by_path(u'node/file 3', FileNode)
+
+        FolderTask.apply_diff(tree, node, changes)
+        assert sorted(node.children) == [u'file 0', u'file 1', u'file 2',
+                                         u'file 3', u'file 4', u'folder',
+                                         u'removed']
+        assert node.children[u'file 3'].local_hint is None
+        assert isinstance(node.children[u'file 4'].local_hint, ModifiedHint)
+        assert isinstance(node.children[u'removed'].local_hint, DeletedHint)
+
+    def test_apply_modified_files(self):
+        node = FolderNode(u'node')
+        for name in (u'modified', u'in progress'):
+            child = FileNode(name)
+            child.set_hashes('local', 'remote', fingerprint=(1, 2, 3))
+            child.sync = True
+            node.add_child(child)
+        node.children[u'in progress'].task = object()
+
+        FolderTask.apply_modified_files(node, {u'modified': (4, 5, 6),
+                                               u'in progress': (4, 5, 6)})
+        assert isinstance(node.children[u'modified'].local_hint, ModifiedHint)
+        assert not node.children[u'modified'].sync
+        assert node.children[u'in progress'].local_hint is None
+
+
+class TestFolderTaskExecution(TestTaskAbstract):
+
+    def _make_task(self, tmpdir):
+        self.local_container.model.path = tmpdir.strpath
+        index_tree = self.local_container.index_tree
+        with index_tree.lock:
+            node = index_tree.get_or_create_node_by_path(u'dir', FolderNode)
+            task = FolderTask(self.local_container, node)
+            node.task = task
+        return task
+
+    def test_list_folder(self, tmpdir):
+        folder = tmpdir.mkdir('dir')
+        folder.join('file').write('content')
+        folder.mkdir('sub')
+        os.utime(folder.strpath, (1000000000, 1000000000))
+
+        task = self._make_task(tmpdir)
+        self.execute_task(task)
+        assert self.error is None
+        assert sorted(task.node.children) == [u'file', u'sub']
+        assert task.node.get_mtime() == 1000000000 * 1000000000
+
+    def test_unchanged_folder_with_modified_file(self, tmpdir):
+        folder = tmpdir.mkdir('dir')
+        folder.join('file').write('content')
+        os.utime(folder.strpath, (1000000000, 1000000000))
+        self.execute_task(self._make_task(tmpdir))
+
+        with self.local_container.index_tree.lock:
+            node = self.local_container.index_tree.get_node_by_path(u'dir')
+            file_node = node.children[u'file']
+            file_node.local_hint = None
+            file_node.set_hashes('local', 'remote', fingerprint=(1, 2, 3))
+            file_node.sync = True
+        folder.mkdir('new folder')  # Not detected: the mtime is restored.
+        os.utime(folder.strpath, (1000000000, 1000000000))
+
+        self.execute_task(self._make_task(tmpdir))
+        assert self.error is None
+        assert sorted(node.children) == [u'file']
+        assert isinstance(file_node.local_hint, ModifiedHint)
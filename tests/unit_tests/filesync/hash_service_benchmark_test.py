@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark of the hash algorithms, on a mix of large media files.
+
+It's slow, and runs only with the `--slowtest` option. Use `-s` to see the
+throughput of each algorithm:
+
+    python -m pytest --slowtest -s tests/unit_tests/filesync/\
+hash_service_benchmark_test.py
+"""
+
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import time
+import pytest
+from bajoo.filesync import hash_service
+
+MB = 1024 * 1024
+
+# (number of files, size of each file): photos, then videos.
+FILE_MIX = ((40, 4 * MB), (2, 256 * MB))
+
+
+@pytest.fixture
+def slowtest(request):
+    if not request.config.getoption('slowtest'):
+        pytest.skip('slow test')
+
+
+@pytest.fixture
+def media_files(slowtest):
+    folder = tempfile.mkdtemp()
+    paths = []
+    for nb_files, size in FILE_MIX:
+        for _ in range(nb_files):
+            path = os.path.join(folder, 'media %s' % len(paths))
+            with open(path, 'wb') as f:
+                for _ in range(size // MB):
+                    f.write(os.urandom(MB))
+            paths.append(path)
+    yield paths
+    shutil.rmtree(folder)
+
+
+def _measure(name, paths, algorithms):
+    total_size = sum(os.path.getsize(path) for path in paths)
+    start = time.time()
+    for path in paths:
+        with open(path, 'rb') as f:
+            hash_service.compute_hashes(f, algorithms)
+    duration = max(time.time() - start, 1e-6)
+    print('%-20s %6d MB in %6.2fs: %8.1f MB/s' % (
+        name, total_size // MB, duration, total_size / MB / duration))
+
+
+class TestHashBenchmark(object):
+
+    def test_hash_algorithms(self, media_files):
+        algorithms = [hash_service.MD5]
+        if hash_service.FAST_HASH_ALGORITHM is not None:
+            algorithms.append(hash_service.FAST_HASH_ALGORITHM)
+
+        _measure('warm-up', media_files, (hash_service.MD5,))
+        for algorithm in algorithms:
+            _measure(algorithm, media_files, (algorithm,))
+        if len(algorithms) > 1:
+            _measure(' + '.join(algorithms), media_files, algorithms)
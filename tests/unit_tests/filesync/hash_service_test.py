@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import os
+import pytest
+import tempfile
+
+from bajoo.common import config
+from bajoo.filesync import hash_service
+
+
+class TestHashService(object):
+
+    def setup_method(self, method):
+        hash_service.clear_cache()
+        fd, self.path = tempfile.mkstemp()
+        # Many lines, of irregular sizes.
+        self.content = b'\n'.join(b'x' * i for i in range(3000))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.content)
+
+    def teardown_method(self, method):
+        hash_service.clear_cache()
+        os.remove(self.path)
+
+    def _md5(self, content):
+        return hashlib.md5(content).hexdigest()
+
+    def test_compute_md5_by_chunks(self, monkeypatch):
+        monkeypatch.setattr(hash_service, 'CHUNK_SIZE', 1000)
+        with open(self.path, 'rb') as f:
+            assert hash_service.compute_md5(f) == self._md5(self.content)
+            assert f.read() == b''
+
+    def test_compute_md5_from_cursor(self):
+        f = io.BytesIO(b'abcdef')
+        f.seek(2)
+        assert hash_service.compute_md5(f) == self._md5(b'cdef')
+
+    def test_compute_md5_in_hash_thread(self):
+        with open(self.path, 'rb') as f:
+            md5 = hash_service.submit(hash_service.compute_md5, f).result(1)
+        assert md5 == self._md5(self.content)
+
+    def test_copy_and_compute_md5(self, monkeypatch, tmpdir):
+        monkeypatch.setattr(hash_service, 'CHUNK_SIZE', 1000)
+        source = io.BytesIO(self.content)
+        dst_path = str(tmpdir.join('copy'))
+        md5 = hash_service.copy_and_compute_md5(source, dst_path)
+        assert md5 == self._md5(self.content)
+        assert source.closed
+        with open(dst_path, 'rb') as f:
+            assert f.read() == self.content
+
+    def test_stop(self):
+        with open(self.path, 'rb') as f:
+            md5 = hash_service.submit(hash_service.compute_md5, f)
+            hash_service.stop()
+            assert md5.result(1) == self._md5(self.content)
+        assert hash_service._executor is None
+        # A new pool is started on demand.
+        assert hash_service.submit(len, b'abc').result(1) == 3
+        hash_service.stop()
+
+    def test_memoized_hash_is_not_computed_again(self, monkeypatch):
+        with open(self.path, 'rb') as f:
+            md5 = hash_service.compute_md5(f, memoize=True)
+
+        def fail(*args):
+            raise AssertionError('File read')
+
+        monkeypatch.setattr(hash_service, '_new_hash', fail)
+        with open(self.path, 'rb') as f:
+            assert hash_service.compute_md5(f, memoize=True) == md5
+            assert f.tell() == len(self.content)
+
+    def test_modified_file_is_hashed_again(self):
+        with open(self.path, 'rb') as f:
+            hash_service.compute_md5(f, memoize=True)
+        with open(self.path, 'ab') as f:
+            f.write(b'more')
+        with open(self.path, 'rb') as f:
+            assert hash_service.compute_md5(f, memoize=True) == \
+                self._md5(self.content + b'more')
+
+    def test_no_memoization_if_verify_all_hashes(self, monkeypatch):
+        monkeypatch.setattr(config, 'get',
+                            lambda key: key == 'verify_all_hashes')
+        with open(self.path, 'rb') as f:
+            hash_service.compute_md5(f, memoize=True)
+        assert not hash_service._cache
+
+    @pytest.mark.skipif(hash_service.FAST_HASH_ALGORITHM is None,
+                        reason='No fast hash algorithm available')
+    def test_compute_many_hashes_in_one_pass(self):
+        algorithm = hash_service.FAST_HASH_ALGORITHM
+        with open(self.path, 'rb') as f:
+            md5, fast_hash = hash_service.compute_hashes(
+                f, (hash_service.MD5, algorithm))
+        assert md5 == self._md5(self.content)
+        assert fast_hash.startswith(algorithm + ':')
+        with open(self.path, 'rb') as f:
+            assert hash_service.submit(hash_service.compute_hashes, f,
+                                       (algorithm,)).result(1) == (fast_hash,)
+
+    def test_no_memoization_by_default(self):
+        with open(self.path, 'rb') as f:
+            hash_service.compute_md5(f)
+        assert not hash_service._cache
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+from bajoo.common.signal import Signal
 from bajoo.filesync.sync_scheduler import SyncScheduler
 from bajoo.index import IndexTree
+from bajoo.index.file_node import FileNode
 
 
 class FakeNode(object):
@@ -13,13 +15,20 @@ class FakeNode(object):
 class FakeTree(object):
     def __init__(self, nodes):
         self.nodes = nodes[:]
+        self.nodes_ready = Signal()
+        self.nb_browse = 0
 
     def browse_all_non_sync_nodes(self):
+        self.nb_browse += 1
         try:
             yield self.nodes.pop(0)
         except IndexError:
             return
 
+    def add_nodes(self, nodes):
+        self.nodes.extend(nodes)
+        self.nodes_ready.fire(self)
+
 
 class TestSyncScheduler(object):
 
@@ -93,3 +102,62 @@ class TestSyncScheduler(object):
         assert isinstance(scheduler.get_node()[1], FakeNode)
         assert isinstance(scheduler.get_node()[1], FakeNode)
         assert scheduler.get_node() == (None, None)
+
+    def test_clean_trees_are_not_browsed_again(self):
+        scheduler = SyncScheduler()
+        clean_trees = [FakeTree([]) for _i in range(10)]
+        for tree in clean_trees:
+            scheduler.add_index_tree(tree)
+        dirty_tree = FakeTree([])
+        scheduler.add_index_tree(dirty_tree)
+        assert scheduler.get_node() == (None, None)
+
+        nodes = FakeNode.make_list(3)
+        dirty_tree.add_nodes(nodes)
+        assert [scheduler.get_node() for _i in range(4)] == \
+            [(dirty_tree, node) for node in nodes] + [(None, None)]
+        assert all(tree.nb_browse == 1 for tree in clean_trees)
+
+    def test_blocked_tree_is_browsed_again_once_notified(self):
+        scheduler = SyncScheduler()
+        tree = FakeTree([IndexTree.WAIT_FOR_TASK])
+        scheduler.add_index_tree(tree)
+        assert scheduler.get_node() == (None, None)
+        assert scheduler.get_node() == (None, None)
+        assert tree.nb_browse == 1
+
+        node = FakeNode()
+        tree.add_nodes([node])
+        assert scheduler.get_node() == (tree, node)
+
+    def test_weighted_round_robin(self):
+        scheduler = SyncScheduler()
+        tree_a = FakeTree(FakeNode.make_list(6))
+        tree_b = FakeTree(FakeNode.make_list(6))
+        scheduler.add_index_tree(tree_a, weight=2)
+        scheduler.add_index_tree(tree_b)
+
+        trees = [scheduler.get_node()[0] for _i in range(6)]
+        assert trees == [tree_a, tree_a, tree_b, tree_a, tree_a, tree_b]
+
+    def test_get_owner(self):
+        scheduler = SyncScheduler()
+        tree = FakeTree([])
+        scheduler.add_index_tree(tree, owner='container')
+        assert scheduler.get_owner(tree) == 'container'
+        scheduler.remove_index_tree(tree)
+        assert scheduler.get_owner(tree) is None
+
+    def test_with_index_tree(self):
+        scheduler = SyncScheduler()
+        tree = IndexTree()
+        with tree.lock:
+            node = tree.get_or_create_node_by_path(u'file', FileNode)
+            node.sync = True
+            tree.get_node_by_path(u'.').sync = True
+        scheduler.add_index_tree(tree)
+        assert scheduler.get_node() == (None, None)
+
+        with tree.lock:
+            node.sync = False
+        assert scheduler.get_node() == (tree, node)
@@ -216,3 +216,48 @@ class TestTaskConsumer(object):
             p = task_consumer.add_task(task)
             assert p.result(0.01) == 'RESULT'
             assert is_generator_closed
+
+    def test_bulk_tasks_dont_block_metadata_tasks(self):
+        """The number of ongoing bulk tasks is limited."""
+        blocker, unblock, _ = self._make_external_promise()
+        ongoing = []
+        max_ongoing = []
+
+        def bulk_task():
+            ongoing.append(True)
+            max_ongoing.append(len(ongoing))
+            yield blocker
+            ongoing.pop()
+            yield 'bulk'
+
+        def task():
+            yield 'metadata'
+
+        with task_consumer.Context():
+            bulk_promises = [task_consumer.add_task(bulk_task, bulk=True)
+                             for _ in range(task_consumer._MAX_BULK_TASK + 5)]
+            p = task_consumer.add_task(task)
+            assert p.result(0.1) == 'metadata'
+
+            unblock(None)
+            results = Promise.all(bulk_promises).result(0.1)
+            assert results == ['bulk'] * len(bulk_promises)
+            assert max(max_ongoing) <= task_consumer._MAX_BULK_TASK
+
+    def test_metadata_tasks_are_started_first_by_bursts(self):
+        burst = task_consumer._MAX_METADATA_BURST
+        metadata_tasks = ['meta-%s' % i for i in range(burst + 2)]
+        ctx = task_consumer.FilesyncContext()
+        ctx.bulk_task_queue.extend([('bulk-1', object()),
+                                    ('bulk-2', object())])
+        ctx.task_queue.extend((name, object()) for name in metadata_tasks)
+
+        order = []
+        new_task = task_consumer._pop_new_task(ctx)
+        while new_task is not None:
+            order.append(new_task[0])
+            new_task = task_consumer._pop_new_task(ctx)
+
+        assert order == (metadata_tasks[:burst] + ['bulk-1'] +
+                         metadata_tasks[burst:] + ['bulk-2'])
+        assert len(ctx.bulk_generators) == 2
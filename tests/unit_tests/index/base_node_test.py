@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from bajoo.index.base_node import BaseNode
+from bajoo.index.file_node import FileNode
 
 
 class TestBaseNode(object):
@@ -100,8 +101,7 @@ class TestBaseNode(object):
         node.add_child(BaseNode('child 1'))
         node.add_child(BaseNode('child 2'))
         for child in node.children.values():
-            child._dirty = False
-            child._sync = True
+            child.sync = True
 
         node.sync = True
         assert not node.dirty
@@ -219,6 +219,37 @@ class TestBaseNode(object):
         assert child1.sync is False
         assert child2.sync is False
 
+    def test_set_hierarchy_not_sync_then_sync_cleans_the_tree(self):
+        node = BaseNode('node')
+        child = BaseNode('child')
+        node.add_child(child)
+        node.sync = True
+        child.sync = True
+
+        node.set_all_hierarchy_not_sync()
+        assert node.dirty and child.dirty
+        node.sync = True
+        assert node.dirty
+        child.sync = True
+        assert not node.dirty
+
+    def test_parent_stays_dirty_until_all_children_are_clean(self):
+        root = BaseNode('root')
+        children = [BaseNode('child %s' % i) for i in range(3)]
+        for child in children:
+            root.add_child(child)
+        root.sync = True
+
+        for child in children:
+            assert root.dirty
+            child.sync = True
+        assert not root.dirty
+
+        children[1].sync = False
+        assert root.dirty
+        children[1].remove_itself()
+        assert not root.dirty
+
     def test_get_full_path_on_root_node(self):
         node = BaseNode(u'root')
         assert node.get_full_path() == u'.'
@@ -244,6 +275,57 @@ class TestBaseNode(object):
 
         assert node_c.get_full_path() == u'A/B/C'
 
+    def test_get_full_path_after_moving_a_folder(self):
+        node = BaseNode(u'root')
+        node_a = BaseNode(u'A')
+        node_b = BaseNode(u'B')
+        node_c = BaseNode(u'C')
+        node.add_child(node_a)
+        node.add_child(node_b)
+        node_b.add_child(node_c)
+        assert node_c.get_full_path() == u'B/C'
+
+        node.rm_child(node_b)
+        node_a.add_child(node_b)
+        assert node_b.get_full_path() == u'A/B'
+        assert node_c.get_full_path() == u'A/B/C'
+
+    def test_add_child_replaces_node_with_same_name(self):
+        root = BaseNode('root')
+        old_child = BaseNode('child')
+        new_child = BaseNode('child')
+        root.add_child(old_child)
+        root.sync = True
+        root.add_child(new_child)
+
+        assert root.children['child'] is new_child
+        assert old_child.removed
+        assert old_child.parent is None
+        new_child.sync = True
+        assert not root.dirty
+
+    def test_stats_are_maintained_after_first_computation(self):
+        root = BaseNode('root')
+        folder = BaseNode('A')
+        root.add_child(folder)
+        file_1 = FileNode('file1')
+        file_1.set_hashes('abc', 'def', (10, 0, 1))
+        folder.add_child(file_1)
+        assert root.get_stats() == (1, 1, 10)
+
+        file_2 = FileNode('file2')
+        folder.add_child(file_2)
+        assert root.get_stats() == (1, 1, 10)  # No state: not counted.
+        file_2.set_hashes('abc', 'def', (5, 0, 2))
+        assert root.get_stats() == (1, 2, 15)
+
+        file_1.set_hashes('ghi', 'jkl', (20, 1, 1))
+        assert root.get_stats() == (1, 2, 25)
+        assert folder.get_stats() == (0, 2, 25)
+
+        folder.remove_itself()
+        assert root.get_stats() == (0, 0, 0)
+
     def test_release_method_set_task_to_none(self):
         node = BaseNode(u'root')
         node.task = 'X'
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import pytest
+from bajoo.index import binary_index
+from bajoo.index import IndexTree
+from bajoo.index.file_node import FileNode
+
+HASH_1 = '0123456789abcdef0123456789abcdef'
+HASH_2 = 'fedcba9876543210fedcba9876543210'
+
+
+def _make_binary_index():
+    tree = IndexTree()
+    with tree.lock:
+        for path, hashes in (('file', (HASH_1, HASH_2)),
+                             ('A/file A1', ('short', 1234)),
+                             ('A/B/file', (HASH_2, HASH_1)),
+                             ('C/é', (HASH_1, HASH_1))):
+            node = tree.get_or_create_node_by_path(path, FileNode)
+            node.set_hashes(*hashes)
+    return tree.export_binary({'journal_id': 'abc'})
+
+
+def _load(content):
+    tree = IndexTree()
+    tree.load({'version': binary_index.VERSION, 'binary': content})
+    return tree
+
+
+class TestBinaryIndex(object):
+
+    def test_read_metadata(self):
+        content = _make_binary_index()
+        assert binary_index.is_binary_index(content)
+        assert binary_index.read_metadata(content)['journal_id'] == 'abc'
+
+    def test_read_metadata_of_invalid_file(self):
+        assert not binary_index.is_binary_index(b'{}')
+        with pytest.raises(ValueError):
+            binary_index.read_metadata(b'{}')
+
+    def test_load_binary_index(self):
+        tree = _load(_make_binary_index())
+
+        assert tree.get_node_by_path('file').get_hashes() == (HASH_1, HASH_2)
+        assert tree.get_node_by_path('A/file A1').get_hashes() == \
+            ('short', 1234)
+        assert tree.get_node_by_path('A/B/file').get_hashes() == \
+            (HASH_2, HASH_1)
+        assert tree.get_node_by_path('C/é').get_hashes() == (HASH_1, HASH_1)
+
+    def test_fingerprint_is_saved(self):
+        tree = IndexTree()
+        with tree.lock:
+            node = tree.get_or_create_node_by_path('file', FileNode)
+            node.set_hashes(HASH_1, HASH_2, (12, -5, 2 ** 40))
+
+        new_tree = _load(tree.export_binary({}))
+        node = new_tree.get_node_by_path('file')
+        assert node.get_hashes() == (HASH_1, HASH_2)
+        assert node.get_fingerprint() == (12, -5, 2 ** 40)
+
+    def test_fast_hash_is_saved(self):
+        tree = IndexTree()
+        with tree.lock:
+            node = tree.get_or_create_node_by_path('file', FileNode)
+            node.set_hashes(HASH_1, HASH_2, (12, 5, 42), 'xxh64:0123abcd')
+            node = tree.get_or_create_node_by_path('other', FileNode)
+            node.set_hashes(HASH_1, HASH_2, None, 'xxh64:0123abcd')
+
+        new_tree = _load(tree.export_binary({}))
+        node = new_tree.get_node_by_path('file')
+        assert node.get_fingerprint() == (12, 5, 42)
+        assert node.get_fast_hash() == 'xxh64:0123abcd'
+        assert new_tree.get_node_by_path('other').get_fast_hash() == \
+            'xxh64:0123abcd'
+
+    def test_load_empty_tree(self):
+        tree = _load(IndexTree().export_binary({}))
+        assert tree.get_node_by_path('.') is None
+
+    def test_children_are_loaded_on_first_access(self):
+        tree = _load(_make_binary_index())
+
+        folder_a = tree._root.children['A']
+        assert folder_a._lazy_children is not None
+        assert folder_a.dirty
+        assert folder_a.exists()
+
+        assert set(folder_a.children) == {'file A1', 'B'}
+        assert folder_a._lazy_children is None
+        assert folder_a.children['B']._lazy_children is not None
+
+    def test_dirty_flags_of_lazy_folders(self):
+        tree = _load(_make_binary_index())
+        folder_c = tree._root.children['C']
+
+        folder_c.sync = True
+        assert folder_c.dirty  # Its child is not sync yet.
+        folder_c.children['é'].sync = True
+        assert not folder_c.dirty
+
+    def test_set_tree_not_sync_does_not_load_the_nodes(self):
+        tree = _load(_make_binary_index())
+        tree.set_tree_not_sync()
+
+        assert tree._root.children['A']._lazy_children is not None
+        assert tree.is_dirty()
+
+    def test_reconciled_files_are_loaded_sync(self):
+        tree = IndexTree()
+        with tree.lock:
+            for path in ('A/known', 'A/B/known'):
+                node = tree.get_or_create_node_by_path(path, FileNode)
+                node.set_hashes(HASH_1, HASH_2, (12, 5, 42))
+            tree.get_or_create_node_by_path('A/unknown', FileNode) \
+                .set_hashes(HASH_1, HASH_2)
+            tree.get_node_by_path('A').set_state(
+                {'mtime_ns': 1234})
+        tree = _load(tree.export_binary({}))
+        tree.set_tree_to_reconcile()
+
+        folder_a = tree._root.children['A']
+        assert folder_a._lazy_children is not None
+        assert folder_a.get_mtime() == 1234
+        assert not folder_a.children['known'].dirty
+        assert not folder_a.children['unknown'].sync
+        assert not folder_a.children['B'].sync
+        assert not folder_a.children['B'].children['known'].dirty
+
+        for node in (folder_a.children['B'], folder_a.children['unknown'],
+                     folder_a, tree._root):
+            node.sync = True
+        assert not tree.is_dirty()
+
+    def test_get_remote_hashes_does_not_load_the_nodes(self):
+        tree = _load(_make_binary_index())
+
+        assert tree.get_remote_hashes() == {
+            'file': HASH_2,
+            'A/file A1': 1234,
+            'A/B/file': HASH_1,
+            'C/é': HASH_1
+        }
+        assert tree._root.children['A']._lazy_children is not None
+
+    def test_get_stats_does_not_load_the_nodes(self):
+        tree = _load(_make_binary_index())
+        with tree.lock:
+            tree.get_node_by_path('file').set_hashes(HASH_1, HASH_2,
+                                                     (100, 0, 1))
+
+        assert tree.get_stats() == (3, 4, 100)
+        assert tree._root.children['A']._lazy_children is not None
+
+        with tree.lock:
+            tree.get_node_by_path('A/B/file').remove_itself()
+            node = tree.get_node_by_path('C/é')
+            node.set_hashes(HASH_1, HASH_2, (20, 0, 2))
+        assert tree.get_stats() == (3, 3, 120)
+
+    def test_export_partially_loaded_tree(self):
+        tree = _load(_make_binary_index())
+        with tree.lock:
+            tree.get_node_by_path('A/B/file').remove_itself()
+            tree.get_or_create_node_by_path('A/new', FileNode)
+
+        new_tree = _load(tree.export_binary({}))
+        assert new_tree.get_node_by_path('A/B/file') is None
+        assert new_tree.get_node_by_path('A/new') is not None
+        assert new_tree.get_node_by_path('C/é').get_hashes() == \
+            (HASH_1, HASH_1)
+
+    def test_encode_snapshot_of_partially_loaded_tree(self):
+        content = _make_binary_index()
+        tree = _load(content)
+        with tree._open_snapshot() as snapshot:
+            with tree.lock:
+                tree.get_node_by_path('A/B/file').remove_itself()
+                tree.get_or_create_node_by_path('C/new', FileNode)
+            snapshot_content = binary_index.encode(
+                snapshot.root, {'journal_id': 'abc'}, snapshot.read_node)
+
+        assert snapshot_content == content
+
+    def test_loading_children_fires_no_journal_entry(self):
+        tree = _load(_make_binary_index())
+        entries = []
+        tree.mutated.connect(entries.append)
+
+        tree.get_node_by_path('A/B/file')
+        assert entries == []
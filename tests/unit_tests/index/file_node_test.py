@@ -47,3 +47,49 @@ class TestFileNode(object):
             node.set_hashes('abc', None)
         with pytest.raises(ValueError):
             node.set_hashes(None, 'def')
+
+    def test_md5_hashes_are_stored_in_binary_form(self):
+        node = FileNode('node')
+        node.set_hashes('0123456789abcdef0123456789abcdef',
+                        'fedcba9876543210fedcba9876543210')
+        assert len(node._local_hash) == 16
+        assert node.get_hashes() == ('0123456789abcdef0123456789abcdef',
+                                     'fedcba9876543210fedcba9876543210')
+        assert node.state == {
+            'local_hash': '0123456789abcdef0123456789abcdef',
+            'remote_hash': 'fedcba9876543210fedcba9876543210'}
+
+    def test_fingerprint_is_part_of_the_state(self):
+        node = FileNode('node')
+        node.set_hashes('abc', 'def', (12, 1500000000000000000, 42))
+        assert node.get_fingerprint() == (12, 1500000000000000000, 42)
+        assert node.state == {'local_hash': 'abc', 'remote_hash': 'def',
+                              'size': 12, 'mtime_ns': 1500000000000000000,
+                              'inode': 42}
+
+        other_node = FileNode('other')
+        other_node.set_state(node.state)
+        assert other_node.get_fingerprint() == node.get_fingerprint()
+
+    def test_set_hashes_without_fingerprint_clears_it(self):
+        node = FileNode('node')
+        node.set_hashes('abc', 'def', (12, 1500000000000000000, 42))
+        node.set_hashes('abc', 'ghi')
+        assert node.get_fingerprint() is None
+        assert set(node.state) == {'local_hash', 'remote_hash'}
+
+    def test_modifying_state_copy_has_no_effect(self):
+        node = FileNode('node')
+        node.set_hashes('abc', 'def')
+        node.state['local_hash'] = 'xyz'
+        assert node.get_hashes() == ('abc', 'def')
+
+    def test_file_node_is_compact(self):
+        node = FileNode('node')
+        assert not hasattr(node, '__dict__')
+        assert node.children is FileNode('other').children
+
+    def test_file_node_cannot_have_children(self):
+        node = FileNode('node')
+        with pytest.raises(TypeError):
+            node.children['child'] = FileNode('child')
@@ -32,9 +32,22 @@ class FakeNode(object):
         return u'Fake Node'
 
 
+class CountingLock(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nb_acquisitions = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        self.nb_acquisitions += 1
+
+    def __exit__(self, *args):
+        self._lock.release()
+
+
 class FakeIndexTree(object):
     def __init__(self, nodes={}):
-        self.lock = threading.Lock()
+        self.lock = CountingLock()
         self.nodes = {}
 
         for path, node in nodes.items():
@@ -646,3 +659,56 @@ class TestHintBuilder(object):
         assert isinstance(source_node.local_hint, SourceMoveHint)
         assert isinstance(dest_node.local_hint, DestMoveHint)
         assert isinstance(source_node.remote_hint, ModifiedHint)
+
+
+class TestHintBuilderBatches(object):
+
+    def test_modification_events_are_applied_in_one_batch(self):
+        node = FakeNode('C')
+        tree = FakeIndexTree({'A/B/C': node})
+
+        HintBuilder.apply_modified_events_from_paths(
+            tree, HintBuilder.SCOPE_REMOTE,
+            [('A/B/D', 'hash D'), ('A/B/C', 'hash C')], FakeNode)
+
+        assert node.remote_hint.new_data == 'hash C'
+        assert tree.get_node_by_path('A/B/D').remote_hint.new_data == 'hash D'
+        assert tree.lock.nb_acquisitions == 1
+
+    def test_lock_is_released_between_batches(self, monkeypatch):
+        monkeypatch.setattr(HintBuilder, 'BATCH_SIZE', 2)
+        tree = FakeIndexTree()
+
+        HintBuilder.apply_modified_events_from_paths(
+            tree, HintBuilder.SCOPE_LOCAL,
+            [('file %s' % i, None) for i in range(5)], FakeNode)
+
+        assert len(tree.nodes) == 5
+        assert tree.lock.nb_acquisitions == 3
+
+    def test_deletion_events(self):
+        node_a = FakeNode('A')
+        node_b = FakeNode('B')
+        tree = FakeIndexTree({'A': node_a, 'B': node_b})
+
+        HintBuilder.apply_deleted_events_from_paths(
+            tree, HintBuilder.SCOPE_REMOTE, ['B', 'missing', 'A'])
+
+        assert isinstance(node_a.remote_hint, DeletedHint)
+        assert isinstance(node_b.remote_hint, DeletedHint)
+        assert tree.get_node_by_path('missing') is None
+
+    def test_successive_move_events_are_reduced(self):
+        src_node = FakeNode('C')
+        tree = FakeIndexTree({'C': src_node})
+
+        # C --> B --> A is reduced in C --> A.
+        HintBuilder.apply_move_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'C', 'B', FakeNode)
+        HintBuilder.apply_move_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'B', 'A', FakeNode)
+
+        dest_node = tree.get_node_by_path('A')
+        assert src_node.local_hint.dest_node is dest_node
+        assert dest_node.local_hint.source_node is src_node
+        assert tree.get_node_by_path('B') is None
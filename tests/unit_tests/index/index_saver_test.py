@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import json
+import pytest
+from bajoo.index import binary_index, index_saver
+from bajoo.index import IndexSaver, IndexTree
+from bajoo.index.file_node import FileNode
+
+
+@pytest.fixture
+def saver_factory(monkeypatch, tmpdir):
+    cache_dir = str(tmpdir.mkdir('cache'))
+    monkeypatch.setattr(index_saver, 'get_cache_dir', lambda: cache_dir)
+
+    def factory(tree=None):
+        return IndexSaver(tree or IndexTree(), str(tmpdir), 'abc')
+    return factory
+
+
+def _create_file(tree, path, local_hash='local', remote_hash='remote'):
+    with tree.lock:
+        node = tree.get_or_create_node_by_path(path, FileNode)
+        node.set_hashes(local_hash, remote_hash)
+
+
+def _read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def _read_snapshot(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    tree = IndexTree()
+    tree.load({'version': 3, 'binary': content})
+    return binary_index.read_metadata(content), tree
+
+
+class TestIndexSaver(object):
+
+    def test_first_save_writes_a_snapshot(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        _create_file(saver.index_tree, 'A/file')
+        saver._save()
+
+        metadata, tree = _read_snapshot(saver.index_path)
+        assert tree.get_node_by_path('A/file') is not None
+        header = _read_lines(saver.journal_path)
+        assert header == [{'journal_id': metadata['journal_id']}]
+
+    def test_save_appends_changes_to_the_journal(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        saver._save()
+        with open(saver.index_path, 'rb') as f:
+            snapshot = f.read()
+
+        _create_file(saver.index_tree, 'file', 'abc', 'def')
+        saver._save()
+
+        with open(saver.index_path, 'rb') as f:
+            assert f.read() == snapshot
+        lines = _read_lines(saver.journal_path)
+        assert len(lines) == 3
+        assert lines[1]['op'] == 'add'
+        assert lines[1]['path'] == 'file'
+        assert lines[2] == {'op': 'state', 'path': 'file',
+                            'state': {'local_hash': 'abc',
+                                      'remote_hash': 'def'}}
+
+    def test_load_replays_the_journal(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        _create_file(saver.index_tree, 'A/file1')
+        _create_file(saver.index_tree, 'A/file2')
+        saver._save()
+
+        tree = saver.index_tree
+        with tree.lock:
+            tree.get_node_by_path('A/file1').remove_itself()
+            tree.get_node_by_path('A/file2').set_hashes('new', 'hash')
+        _create_file(tree, 'B/file3')
+        saver.stop()
+
+        new_tree = IndexTree()
+        new_saver = saver_factory(new_tree)
+        new_tree.load(new_saver.load())
+
+        assert new_tree.get_node_by_path('A/file1') is None
+        assert new_tree.get_node_by_path('A/file2').get_hashes() == \
+            ('new', 'hash')
+        assert new_tree.get_node_by_path('B/file3').get_hashes() == \
+            ('local', 'remote')
+
+    def test_load_ignores_obsolete_journal(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        _create_file(saver.index_tree, 'file')
+        saver._save()
+        with open(saver.journal_path, 'w') as f:
+            f.write('{"journal_id": "obsolete"}\n')
+            f.write(json.dumps({'op': 'rm', 'path': 'file'}) + '\n')
+
+        new_tree = IndexTree()
+        new_saver = saver_factory(new_tree)
+        new_tree.load(new_saver.load())
+        assert new_tree.get_node_by_path('file') is not None
+
+    def test_truncated_journal_forces_a_compaction(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        saver._save()
+        _create_file(saver.index_tree, 'file')
+        saver._save()
+        with open(saver.journal_path, 'a') as f:
+            f.write('{"op": "rm", "pa')
+
+        new_tree = IndexTree()
+        new_saver = saver_factory(new_tree)
+        new_tree.load(new_saver.load())
+        assert new_tree.get_node_by_path('file') is not None
+
+        new_saver._save()
+        assert len(_read_lines(new_saver.journal_path)) == 1
+
+    def test_big_journal_is_compacted(self, saver_factory, monkeypatch):
+        monkeypatch.setattr(index_saver, '_MIN_COMPACTION_SIZE', 0)
+        saver = saver_factory()
+        saver.create_empty_file()
+        saver._save()
+        for i in range(10):
+            _create_file(saver.index_tree, 'file%s' % i)
+        saver._save()  # Journal now bigger than the snapshot.
+        saver._save()
+
+        lines = _read_lines(saver.journal_path)
+        assert len(lines) == 1
+        _, tree = _read_snapshot(saver.index_path)
+        assert len(tree._root.children) == 10
+
+    def test_json_index_is_converted_in_binary_format(self, saver_factory):
+        saver = saver_factory()
+        with open(saver.index_path, 'w') as f:
+            json.dump({'version': 2, 'root': {
+                'type': 'FOLDER',
+                'children': {'file': {'type': 'FILE', 'state': {
+                    'local_hash': 'abc', 'remote_hash': 'def'}}}}}, f)
+
+        tree = saver.index_tree
+        tree.load(saver.load())
+        assert tree.get_node_by_path('file').get_hashes() == ('abc', 'def')
+        saver._save()
+
+        _, new_tree = _read_snapshot(saver.index_path)
+        assert new_tree.get_node_by_path('file').get_hashes() == \
+            ('abc', 'def')
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the IndexTree traversals, on very deep and very wide trees.
+
+They are slow, and run only with the `--slowtest` option. Use `-s` to see
+the throughput of each operation:
+
+    python -m pytest --slowtest -s tests/unit_tests/index/\
+index_tree_benchmark_test.py
+"""
+
+from __future__ import print_function, unicode_literals
+import time
+import pytest
+from bajoo.index import IndexTree
+
+HASH_1 = '0123456789abcdef0123456789abcdef'
+HASH_2 = 'fedcba9876543210fedcba9876543210'
+
+DEPTH = 10000
+WIDTH = 1000000
+
+
+@pytest.fixture
+def slowtest(request):
+    if not request.config.getoption('slowtest'):
+        pytest.skip('slow test')
+
+
+def _file_def():
+    return {'type': 'FILE', 'state': {'local_hash': HASH_1,
+                                      'remote_hash': HASH_2}}
+
+
+def _deep_tree_data(depth):
+    """Build the data of a chain of `depth` folders, ending by a file."""
+    root_def = {'type': 'FOLDER'}
+    node_def = root_def
+    for _ in range(depth):
+        child_def = {'type': 'FOLDER'}
+        node_def['children'] = {'folder': child_def}
+        node_def = child_def
+    node_def['children'] = {'file': _file_def()}
+    return {'version': 2, 'root': root_def}
+
+
+def _wide_tree_data(width):
+    """Build the data of a single folder containing `width` files."""
+    children = {'file %s' % i: _file_def() for i in range(width)}
+    return {'version': 2, 'root': {'type': 'FOLDER', 'children': children}}
+
+
+def _measure(name, nb_nodes, func):
+    start = time.time()
+    result = func()
+    duration = max(time.time() - start, 1e-6)
+    print('%-20s %8d nodes in %6.2fs: %10d nodes/s' % (
+        name, nb_nodes, duration, nb_nodes / duration))
+    return result
+
+
+def _browse_all(tree):
+    count = 0
+    for node in tree.browse_all_non_sync_nodes():
+        with tree.lock:
+            node.children  # Like a folder task, load the lazy children.
+            node.task = None
+            node.sync = True
+        count += 1
+    return count
+
+
+def _run_benchmark(data, nb_nodes):
+    tree = IndexTree()
+    _measure('load', nb_nodes, lambda: tree.load(data))
+    _measure('export_data', nb_nodes, tree.export_data)
+    content = _measure('export_binary', nb_nodes,
+                       lambda: tree.export_binary({}))
+    _measure('get_remote_hashes', nb_nodes, tree.get_remote_hashes)
+    _measure('get_stats', nb_nodes, tree.get_stats)
+    _measure('set_tree_not_sync', nb_nodes, tree.set_tree_not_sync)
+    assert _measure('browse', nb_nodes, lambda: _browse_all(tree)) == \
+        nb_nodes
+
+    binary_tree = IndexTree()
+    _measure('load binary', nb_nodes, lambda: binary_tree.load(
+        {'version': 3, 'binary': content}))
+    _measure('browse binary', nb_nodes, lambda: _browse_all(binary_tree))
+
+
+class TestIndexTreeBenchmark(object):
+
+    def test_deep_tree(self, slowtest):
+        _run_benchmark(_deep_tree_data(DEPTH), DEPTH + 2)
+
+    def test_wide_tree(self, slowtest):
+        _run_benchmark(_wide_tree_data(WIDTH), WIDTH + 1)
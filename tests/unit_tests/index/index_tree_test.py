@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals
+import sys
 from bajoo.index import IndexTree
 from bajoo.index.base_node import BaseNode
 from bajoo.index.file_node import FileNode
+from bajoo.index import sync_priority
 from bajoo.index.folder_node import FolderNode
+from bajoo.index.hint_builder import HintBuilder
+from bajoo.index.hints import ModifiedHint
 
 
 class MyNode(BaseNode):
@@ -193,6 +197,128 @@ class TestBrowseIndexTree(object):
         # Although B is still reserved by a task, it's no longer dirty.
         assert next(gen, None) is None  # Iterator is empty
 
+    def test_browse_yields_nodes_in_order_they_become_non_sync(self):
+        tree = IndexTree()
+        tree._root = _make_tree(('root', [('A',), ('B',), ('C',)]),
+                                default_sync=True)
+        tree._root.children['C'].sync = False
+        tree._root.children['A'].sync = False
+
+        gen = tree.browse_all_non_sync_nodes()
+        assert next(gen) is tree._root.children['C']
+        assert next(gen) is tree._root.children['A']
+
+    def _browse_names(self, tree):
+        names = []
+        for node in tree.browse_all_non_sync_nodes():
+            names.append(node.name)
+            node.task = None
+            node.sync = True
+        return names
+
+    def test_browse_yields_small_local_files_before_large_files(self):
+        tree = IndexTree()
+        HintBuilder.apply_modified_event_from_path(
+            tree, HintBuilder.SCOPE_REMOTE, 'remote', 'hash', FileNode,
+            size=10)
+        HintBuilder.apply_modified_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'big', None, FileNode,
+            size=100 * 1024 * 1024)
+        HintBuilder.apply_modified_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'small', None, FileNode, size=10)
+
+        assert self._browse_names(tree) == ['.', 'small', 'remote', 'big']
+
+    def test_browse_delay_of_large_files_is_bounded(self):
+        tree = IndexTree()
+        HintBuilder.apply_modified_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'big', None, FileNode,
+            size=2 * 1024 * 1024)
+        HintBuilder.apply_modified_events_from_paths(
+            tree, HintBuilder.SCOPE_LOCAL,
+            [('small-%02d' % i, None, 10) for i in range(40)], FileNode)
+
+        names = self._browse_names(tree)
+        assert len(names) == 42
+        delay = sync_priority.get_delay(tree.get_node_by_path('big'))
+        assert 0 < names.index('big') <= delay
+
+    def test_browse_moves_nodes_whose_hint_changes(self):
+        tree = IndexTree()
+        HintBuilder.apply_modified_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'file', None, FileNode, size=10)
+        self._browse_names(tree)
+        node = tree.get_node_by_path('file')
+        node.local_hint = None
+        node.set_hashes('0' * 32, '1' * 32, (100 * 1024 * 1024, 0, 0))
+
+        # The large file is saved again, with a small content. Its hint is
+        # set after it has been queued.
+        HintBuilder.apply_modified_event_from_path(
+            tree, HintBuilder.SCOPE_LOCAL, 'file', None, FileNode, size=10)
+        HintBuilder.apply_modified_events_from_paths(
+            tree, HintBuilder.SCOPE_LOCAL,
+            [('small-%02d' % i, None, 10) for i in range(5)], FileNode)
+
+        names = self._browse_names(tree)
+        assert names.index('file') < names.index('small-00')
+
+    def test_browse_skip_removed_nodes(self):
+        tree = IndexTree()
+        tree._root = _make_tree(('root', [('A', [('A1',)]), ('B',)], True),
+                                default_sync=False)
+        tree._root.children['A'].sync = True
+        tree._root.children['A'].remove_itself()
+
+        gen = tree.browse_all_non_sync_nodes()
+        assert next(gen) is tree._root.children['B']
+        tree._root.children['B'].task = None
+        tree._root.children['B'].sync = True
+        assert next(gen, None) is None
+
+    def test_browse_skip_children_of_nodes_in_error(self):
+        tree = IndexTree()
+        tree._root = _make_tree(('root', [('A', [('A1',)], True)], True))
+        tree._root.children['A'].error = Exception()
+
+        gen = tree.browse_all_non_sync_nodes()
+        assert next(gen) is IndexTree.WAIT_FOR_TASK
+
+    def test_browse_after_set_tree_not_sync(self):
+        tree = IndexTree()
+        tree._root = _make_tree(('root', [('A', [('A1',)])]),
+                                default_sync=True)
+        tree.set_tree_not_sync()
+
+        names = []
+        for node in tree.browse_all_non_sync_nodes():
+            names.append(node.name)
+            node.task = None
+            node.sync = True
+        assert sorted(names) == ['A', 'A1', 'root']
+
+    def test_browse_after_set_tree_to_reconcile(self):
+        tree = IndexTree()
+        with tree.lock:
+            for name, fingerprint in (('A/known', (1, 2, 3)),
+                                      ('A/unknown', None),
+                                      ('A/hinted', (1, 2, 3))):
+                node = tree.get_or_create_node_by_path(name, FileNode)
+                node.set_hashes('local', 'remote', fingerprint)
+                node.sync = True
+            tree.get_node_by_path('A/hinted').local_hint = ModifiedHint()
+            tree.get_node_by_path('A/hinted').sync = False
+            tree.get_node_by_path('A').sync = True
+            tree.get_node_by_path('.').sync = True
+        tree.set_tree_to_reconcile()
+
+        names = []
+        for node in tree.browse_all_non_sync_nodes():
+            names.append(node.name)
+            node.task = None
+            node.sync = True
+        assert sorted(names) == ['.', 'A', 'hinted']
+
 
 class TestGetNodeFromIndexTree(object):
     """Tests about node access methods of IndexTree."""
@@ -256,6 +382,39 @@ class TestGetNodeFromIndexTree(object):
         node = tree.get_or_create_node_by_path('A/B/C/ghost', MyNode)
         assert isinstance(node, MyNode)
 
+    def test_get_node_by_path_ignores_removed_nodes(self):
+        tree = IndexTree()
+        node = tree.get_or_create_node_by_path('A/B', FileNode)
+        assert tree.get_node_by_path('A/B') is node
+
+        node.remove_itself()
+        assert tree.get_node_by_path('A/B') is None
+        new_node = tree.get_or_create_node_by_path('A/B', FileNode)
+        assert new_node is not node
+        assert tree.get_node_by_path('A/B') is new_node
+
+    def test_get_node_by_path_after_root_change(self):
+        tree = IndexTree()
+        tree.get_or_create_node_by_path('A/B', FileNode)
+        tree._root = FolderNode('.')
+        assert tree.get_node_by_path('A/B') is None
+
+    def test_parent_folders_are_cached(self):
+        tree = IndexTree()
+        with tree.lock:
+            node = tree.get_or_create_node_by_path('A/B/file1', FileNode)
+            assert tree._path_cache['A/B'] is node.parent
+
+            sibling = tree.get_or_create_node_by_path('A/B/file2', FileNode)
+            assert sibling.parent is node.parent
+
+    def test_path_cache_is_bounded(self):
+        tree = IndexTree()
+        tree.PATH_CACHE_SIZE = 2
+        for name in ('A', 'B', 'C'):
+            tree.get_or_create_node_by_path(name, FileNode)
+        assert list(tree._path_cache) == ['B', 'C']
+
     def test_set_tree_node_sync(self):
         tree = IndexTree()
         tree._root = _make_tree(('root', [('A', [('A1',)]),
@@ -447,6 +606,82 @@ class TestSaveAndLoadIndexTree(object):
         child_node_def = folder_node_def['children']['child']
         assert child_node_def['state'] == {'local_hash': 5, 'remote_hash': 6}
 
+    def test_snapshot_is_read_without_the_lock(self):
+        tree = IndexTree()
+        tree._root = FolderNode('.')
+        with tree._open_snapshot():
+            assert tree.lock.acquire(False)
+            tree.lock.release()
+        assert tree._snapshots == []
+
+    def test_snapshot_ignores_later_modifications(self):
+        tree = IndexTree()
+        with tree.lock:
+            for path in ('A/file1', 'A/file2', 'B/file3'):
+                node = tree.get_or_create_node_by_path(path, FileNode)
+                node.set_hashes('local', 'remote')
+        expected_data = tree.export_data()
+
+        with tree._open_snapshot() as snapshot:
+            with tree.lock:
+                tree.get_node_by_path('A/file1').set_hashes('new', 'new')
+                tree.get_node_by_path('A/file2').remove_itself()
+                file3 = tree.get_node_by_path('B/file3')
+                file3.remove_itself()
+                file3.set_hashes('detached', 'detached')
+                tree.get_or_create_node_by_path('C/file4', FileNode)
+            root_def = tree._export_node(snapshot.root, snapshot.read_node)
+
+        assert root_def == expected_data['root']
+        data = tree.export_data()
+        assert set(data['root']['children']['A']['children']) == {'file1'}
+        assert data['root']['children']['A']['children']['file1']['state'] \
+            == {'local_hash': 'new', 'remote_hash': 'new'}
+
+
+class TestDeepIndexTree(object):
+    """Trees deeper than the recursion limit must be fully supported."""
+
+    def setup_method(self, method):
+        self.depth = sys.getrecursionlimit() + 100
+        self.file_path = '/'.join(['folder'] * self.depth + ['file'])
+        self.tree = IndexTree()
+        with self.tree.lock:
+            node = self.tree.get_or_create_node_by_path(self.file_path,
+                                                        FileNode)
+            node.set_hashes('local', 'remote', (42, 0, 1))
+
+    def test_export_and_load(self):
+        for data in (self.tree.export_data(),
+                     {'version': 3,
+                      'binary': self.tree.export_binary({})}):
+            tree = IndexTree()
+            tree.load(data)
+            with tree.lock:
+                node = tree.get_node_by_path(self.file_path)
+            assert node.get_hashes() == ('local', 'remote')
+
+    def test_get_remote_hashes_and_stats(self):
+        assert self.tree.get_remote_hashes() == {self.file_path: 'remote'}
+        assert self.tree.get_stats() == (self.depth, 1, 42)
+
+    def test_set_tree_not_sync_and_browse(self):
+        self.tree.set_tree_not_sync()
+        nodes = []
+        for node in self.tree.browse_all_non_sync_nodes():
+            nodes.append(node)
+            with self.tree.lock:
+                node.task = None
+                node.sync = True
+        assert len(nodes) == self.depth + 2
+        assert not self.tree.is_dirty()
+
+    def test_remove_deep_folder(self):
+        with self.tree.lock:
+            node = self.tree.get_node_by_path(self.file_path)
+            self.tree.get_node_by_path('folder').remove_itself()
+        assert node.removed
+
 
 class TestIndexTree(object):
     """Other IndexTree tests who doesn't fit in other classes."""
@@ -484,6 +719,41 @@ class TestIndexTree(object):
             u'B/B1': 5678,
         }
 
+    def test_remote_hashes_are_maintained_by_the_tree(self):
+        tree = IndexTree()
+        with tree.lock:
+            node_a = tree.get_or_create_node_by_path('A/A1', FileNode)
+            node_a.set_hashes('abcd', '1234')
+        remote_hashes = tree.get_remote_hashes()
+        assert remote_hashes == {u'A/A1': '1234'}
+
+        with tree.lock:
+            node_b = tree.get_or_create_node_by_path('B/B1', FileNode)
+            node_b.set_hashes('ef01', '5678')
+            node_a.set_hashes('abcd', '9999')
+        assert remote_hashes == {u'A/A1': '9999', u'B/B1': '5678'}
+
+        with tree.lock:
+            node_b.set_hashes(None, None)
+            tree.get_node_by_path('A').remove_itself()
+        assert remote_hashes == {}
+        assert tree.get_remote_hashes() == {}
+
+    def test_remote_hashes_follow_a_reload(self):
+        tree = IndexTree()
+        remote_hashes = tree.get_remote_hashes()
+        with tree.lock:
+            node = tree.get_or_create_node_by_path('A/A1', FileNode)
+            node.set_hashes('abcd', '1234')
+        content = tree.export_binary({})
+
+        tree.load({'version': 3, 'binary': content})
+        with tree.lock:
+            tree.get_node_by_path('A').remove_itself()
+        assert remote_hashes == {}
+        tree.load({'version': 3, 'binary': content})
+        assert remote_hashes == {u'A/A1': '1234'}
+
     def test_empty_tree_is_not_dirty(self):
         tree = IndexTree()
         assert tree.is_dirty() is False
@@ -498,3 +768,71 @@ class TestIndexTree(object):
         tree._root = MyNode('.')
         tree._root.sync = True
         assert tree.is_dirty() is False
+
+
+class TestIndexTreeJournal(object):
+    """Tests about the journal entries of IndexTree."""
+
+    def _record(self, tree):
+        entries = []
+        tree.mutated.connect(entries.append)
+        return entries
+
+    def test_add_node_fires_journal_entry(self):
+        tree = IndexTree()
+        entries = self._record(tree)
+        tree.get_or_create_node_by_path('A/file', FileNode)
+        assert entries == [
+            {'op': 'add', 'path': 'A', 'node': {'type': 'FOLDER'}},
+            {'op': 'add', 'path': 'A/file', 'node': {'type': 'FILE'}}
+        ]
+
+    def test_set_hashes_and_remove_fire_journal_entries(self):
+        tree = IndexTree()
+        node = tree.get_or_create_node_by_path('file', FileNode)
+        entries = self._record(tree)
+        node.set_hashes('abc', 'def')
+        node.remove_itself()
+        assert entries == [
+            {'op': 'state', 'path': 'file',
+             'state': {'local_hash': 'abc', 'remote_hash': 'def'}},
+            {'op': 'rm', 'path': 'file'}
+        ]
+
+    def test_detached_nodes_fire_nothing(self):
+        tree = IndexTree()
+        node = tree.get_or_create_node_by_path('file', FileNode)
+        entries = self._record(tree)
+        node.remove_itself()
+        node.set_hashes('abc', 'def')
+        assert len(entries) == 1
+
+    def test_apply_journal_rebuilds_the_tree(self):
+        tree = IndexTree()
+        entries = self._record(tree)
+        node = tree.get_or_create_node_by_path('A/file', FileNode)
+        node.set_hashes('abc', 'def')
+        tree.get_or_create_node_by_path('A/other', FileNode).remove_itself()
+
+        new_tree = IndexTree()
+        new_tree.apply_journal(entries)
+        assert new_tree.export_data() == tree.export_data()
+
+        # A journal can be replayed many times.
+        new_tree.apply_journal(entries)
+        assert new_tree.export_data() == tree.export_data()
+
+    def test_apply_journal_clearing_file_state(self):
+        tree = IndexTree()
+        node = tree.get_or_create_node_by_path('A/file', FileNode)
+        node.set_hashes('abc', 'def')
+        new_tree = IndexTree()
+        new_tree.load(tree.export_data())
+
+        entries = self._record(tree)
+        node.set_hashes(None, None)
+        assert entries[-1]['state'] is None
+
+        new_tree.apply_journal(entries)
+        assert new_tree.get_node_by_path('A/file').state is None
+        assert new_tree.export_data() == tree.export_data()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+import json
+import sqlite3
+import pytest
+from bajoo.index import index_saver
+from bajoo.index import IndexTree, SQLiteIndexSaver
+from bajoo.index.file_node import FileNode
+
+
+@pytest.fixture
+def saver_factory(monkeypatch, tmpdir):
+    cache_dir = str(tmpdir.mkdir('cache'))
+    monkeypatch.setattr(index_saver, 'get_cache_dir', lambda: cache_dir)
+    db_path = str(tmpdir.join('index.sqlite'))
+    savers = []
+
+    def factory(tree=None, model_id='abc'):
+        saver = SQLiteIndexSaver(tree or IndexTree(), str(tmpdir), model_id,
+                                 db_path)
+        savers.append(saver)
+        return saver
+    yield factory
+
+    for saver in savers:
+        saver.stop()
+
+
+def _create_file(tree, path, local_hash='local', remote_hash='remote'):
+    with tree.lock:
+        node = tree.get_or_create_node_by_path(path, FileNode)
+        node.set_hashes(local_hash, remote_hash)
+
+
+def _saved_files(saver):
+    """Query the database directly: {path: remote_hash} of the saved files."""
+    rows = saver._get_connection().execute(
+        'SELECT path, remote_hash FROM nodes WHERE container_id = ? AND '
+        'type = ?', (saver.model_id, 'FILE')).fetchall()
+    return dict(rows)
+
+
+def _reload(saver_factory, model_id='abc'):
+    tree = IndexTree()
+    saver = saver_factory(tree, model_id)
+    tree.load(saver.load())
+    return tree, saver
+
+
+class TestSQLiteIndexSaver(object):
+
+    def test_save_and_load(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        _create_file(saver.index_tree, 'A/file1')
+        _create_file(saver.index_tree, 'A/B/file2', 'abc', 'def')
+        _create_file(saver.index_tree, 'file3')
+        saver._save()
+
+        tree, _ = _reload(saver_factory)
+        assert tree.get_node_by_path('A/file1').get_hashes() == \
+            ('local', 'remote')
+        assert tree.get_node_by_path('A/B/file2').get_hashes() == \
+            ('abc', 'def')
+        assert tree.get_node_by_path('file3') is not None
+
+    def test_removals_are_saved(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        _create_file(saver.index_tree, 'A/file1')
+        _create_file(saver.index_tree, 'A/file2')
+        _create_file(saver.index_tree, 'A0')
+        saver._save()
+
+        with saver.index_tree.lock:
+            saver.index_tree.get_node_by_path('A').remove_itself()
+        saver._save()
+
+        tree, new_saver = _reload(saver_factory)
+        assert tree.get_node_by_path('A') is None
+        assert tree.get_node_by_path('A0') is not None
+        assert _saved_files(new_saver) == {'A0': 'remote'}
+
+    def test_containers_are_independent(self, saver_factory):
+        saver_1 = saver_factory(model_id='container 1')
+        saver_2 = saver_factory(model_id='container 2')
+        for saver in (saver_1, saver_2):
+            saver.create_empty_file()
+        _create_file(saver_1.index_tree, 'file', 'abc', 'def')
+        saver_1._save()
+
+        assert _saved_files(saver_1) == {'file': 'def'}
+        assert _saved_files(saver_2) == {}
+
+    def test_unknown_container_is_loaded_from_index_file(self,
+                                                         saver_factory):
+        saver = saver_factory()
+        with open(saver.index_path, 'w') as f:
+            json.dump({'version': 2, 'root': {
+                'type': 'FOLDER',
+                'children': {'file': {'type': 'FILE', 'state': {
+                    'local_hash': 'abc', 'remote_hash': 'def'}}}}}, f)
+
+        saver.index_tree.load(saver.load())
+        saver._save()
+
+        assert _saved_files(saver) == {'file': 'def'}
+        tree, _ = _reload(saver_factory)
+        assert tree.get_node_by_path('file').get_hashes() == ('abc', 'def')
+
+    def test_unknown_container_without_index_file(self, saver_factory):
+        saver = saver_factory()
+        with pytest.raises(IOError):
+            saver.load()
+
+    def test_failed_save_is_retried_with_a_full_write(self, saver_factory):
+        saver = saver_factory()
+        saver.create_empty_file()
+        _create_file(saver.index_tree, 'file', 'abc', 'def')
+        retries = []
+
+        def fail(entries):
+            raise sqlite3.OperationalError('database is locked')
+        saver._apply_entries = fail
+        saver.trigger_save = retries.append
+        saver._save()
+        assert retries == [1]
+
+        del saver._apply_entries, saver.trigger_save
+        saver._save()
+        assert _saved_files(saver) == {'file': 'def'}
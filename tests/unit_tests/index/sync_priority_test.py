@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from bajoo.index import sync_priority
+from bajoo.index.file_node import FileNode
+from bajoo.index.folder_node import FolderNode
+from bajoo.index.hints import DeletedHint, ModifiedHint
+
+MiB = 1024 * 1024
+
+
+def _file(size=None, local=True, fingerprint=None):
+    node = FileNode('file')
+    if fingerprint is not None:
+        node.set_hashes('0' * 32, '1' * 32, fingerprint)
+    if local:
+        node.local_hint = ModifiedHint(size=size)
+    else:
+        node.remote_hint = ModifiedHint('hash', size)
+    return node
+
+
+class TestSyncPriority(object):
+
+    def test_metadata_only_nodes_are_not_delayed(self):
+        folder = FolderNode('folder')
+        folder.local_hint = ModifiedHint()
+        deleted = _file(size=100 * MiB, local=False)
+        deleted.remote_hint = DeletedHint()
+
+        for node in (folder, deleted):
+            assert sync_priority.is_metadata_only(node)
+            assert sync_priority.get_delay(node) == 0
+        assert not sync_priority.is_metadata_only(_file(10))
+
+    def test_larger_files_are_delayed_more(self):
+        delays = [sync_priority.get_delay(_file(size))
+                  for size in (10, 2 * MiB, 100 * MiB, 1024 * MiB)]
+        assert delays[0] == 0
+        assert delays == sorted(delays)
+        assert len(set(delays)) == 4
+
+    def test_remote_files_are_delayed_more_than_local_files(self):
+        assert (sync_priority.get_delay(_file(10, local=False)) >
+                sync_priority.get_delay(_file(10, local=True)))
+        assert (sync_priority.get_delay(_file(1024 * MiB, local=False)) ==
+                sync_priority.MAX_DELAY)
+
+    def test_size_fallbacks_on_fingerprint(self):
+        node = _file(fingerprint=(50 * MiB, 0, 0))
+        assert sync_priority.get_size(node) == 50 * MiB
+        node.local_hint.size = 10
+        assert sync_priority.get_size(node) == 10
+        assert sync_priority.get_size(_file()) is None
+
+    def test_only_small_local_files_are_urgent(self):
+        assert sync_priority.is_urgent(_file(10))
+        assert not sync_priority.is_urgent(_file(10, local=False))
+        assert not sync_priority.is_urgent(_file(10 * MiB))
+        assert not sync_priority.is_urgent(_file())
@@ -1,5 +1,6 @@
 
 from bajoo.container_model import ContainerModel
+from bajoo.index.file_node import FileNode
 from bajoo.local_container import ContainerStatus, LocalContainer
 
 
@@ -32,3 +33,21 @@ class TestLocalContainer(object):
         lc.status = ContainerStatus.SYNC_STOP
 
         assert lc.status == ContainerStatus.SYNC_STOP
+
+    def test_lc_get_stats_from_index(self):
+        lc = LocalContainer(ContainerModel('ID', 'Name'), None)
+        assert lc.get_stats() == (0, 0, 0)
+
+        tree = lc.index_tree
+        with tree.lock:
+            tree.get_or_create_node_by_path(
+                'A/file', FileNode).set_hashes('0' * 32, '1' * 32,
+                                               (10, 123, 4))
+            # Synced before its size was recorded in the index.
+            tree.get_or_create_node_by_path(
+                'A/old', FileNode).set_hashes('2' * 32, '3' * 32)
+            # Not synced yet: not counted.
+            tree.get_or_create_node_by_path('new', FileNode)
+
+        # The container folder is counted.
+        assert lc.get_stats() == (2, 2, 10)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import os
+
+import pytest
+
+from bajoo.data import BadMd5SumException, BadSizeException
+from bajoo.network import partial_download
+from bajoo.network.partial_download import PartialDownload
+
+URL = 'https://storage.example.com/storages/abc/file.bin'
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmpdir):
+    monkeypatch.setattr(partial_download, 'get_cache_dir',
+                        lambda: str(tmpdir))
+    monkeypatch.setattr(partial_download, 'MIN_SIZE', 0)
+    return os.path.join(str(tmpdir), partial_download.FOLDER_NAME)
+
+
+class TestPartialDownload(object):
+
+    content = b'0123456789' * 1000
+    etag = hashlib.md5(content).hexdigest()
+
+    def _interrupted_download(self, size):
+        partial = PartialDownload.create(URL, self.etag, self.etag,
+                                         len(self.content))
+        with pytest.raises(BadSizeException):
+            partial.receive(io.BytesIO(self.content[:size]))
+        partial.release()
+
+    def test_no_partial_download(self, cache_dir):
+        assert PartialDownload.load(URL) is None
+
+    def test_small_file_is_not_stored(self, cache_dir, monkeypatch):
+        monkeypatch.setattr(partial_download, 'MIN_SIZE', 1000)
+        assert PartialDownload.create(URL, 'etag', None, 999) is None
+
+    def test_resume_interrupted_download(self, cache_dir):
+        self._interrupted_download(3000)
+
+        partial = PartialDownload.load(URL)
+        assert partial.size == 3000
+        assert partial.get_range_headers() == {'Range': 'bytes=3000-',
+                                               'If-Range': self.etag}
+        partial.receive(io.BytesIO(self.content[3000:]))
+        with partial.complete() as result:
+            assert result.read() == self.content
+
+        assert os.listdir(cache_dir) == []
+        assert PartialDownload.load(URL) is None
+
+    def test_url_in_use_is_not_resumable(self, cache_dir):
+        self._interrupted_download(3000)
+
+        partial = PartialDownload.load(URL)
+        assert PartialDownload.load(URL) is None
+        assert PartialDownload.create(URL, self.etag, None, 5000) is None
+        partial.release()
+        PartialDownload.load(URL).release()
+
+    def test_corrupted_download_is_discarded(self, cache_dir):
+        self._interrupted_download(3000)
+
+        partial = PartialDownload.load(URL)
+        partial.receive(io.BytesIO(b'x' * (len(self.content) - 3000)))
+        with pytest.raises(BadMd5SumException):
+            partial.complete()
+        assert os.listdir(cache_dir) == []
+
+    def test_new_download_replaces_the_previous_one(self, cache_dir):
+        self._interrupted_download(3000)
+        self._interrupted_download(1000)
+
+        partial = PartialDownload.load(URL)
+        assert partial.size == 1000
+        partial.discard()
+        assert os.listdir(cache_dir) == []
+
+    def test_download_in_file_is_not_kept(self, cache_dir, tmpdir):
+        data_path = str(tmpdir.join('file.bin'))
+        partial = PartialDownload.create_in_file(URL, self.etag, self.etag,
+                                                 len(self.content), data_path)
+        assert PartialDownload.load(URL) is None
+        with pytest.raises(BadSizeException):
+            partial.receive(io.BytesIO(self.content[:3000]))
+        partial.receive(io.BytesIO(self.content[3000:]))
+
+        assert partial.get_content_md5() == self.etag
+        assert partial.complete() is None
+        with io.open(data_path, 'rb') as data_file:
+            assert data_file.read() == self.content
+        assert not os.path.exists(cache_dir) or os.listdir(cache_dir) == []
+        assert PartialDownload.load(URL) is None
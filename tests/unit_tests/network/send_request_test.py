@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
 import io
 import random
 
 import pytest
 import requests
 
-from bajoo.network import send_request
+from bajoo.network import partial_download, send_request
 from bajoo.network.errors import ConnectionError, HTTPError, \
     InterruptedDownloadError, NetworkError
 from bajoo.network.request import Request
@@ -48,7 +49,7 @@ class TestSendRequest(object):
         with http_server:
             result = send_request.download(req, self.session)
 
-        assert result.get('code') is 200
+        assert result.get('code') == 200
 
         buffer = b''
         with result.get('content') as dl_file:
@@ -72,6 +73,144 @@ class TestSendRequest(object):
             with http_server:
                 send_request.download(req, self.session)
 
+    def test_download_resumed_after_interruption(self, http_server,
+                                                 monkeypatch, tmpdir):
+        monkeypatch.setattr(partial_download, 'get_cache_dir',
+                            lambda: str(tmpdir))
+        monkeypatch.setattr(partial_download, 'MIN_SIZE', 0)
+        binary_file = bytes(bytearray(random.getrandbits(8)
+                                      for _ in range(4096)))
+        etag = hashlib.md5(binary_file).hexdigest()
+        ranges = []
+
+        def handler(self):
+            ranges.append(self.headers.get('range'))
+            if not self.headers.get('range'):
+                self.send_response(200)
+                self.send_header('Content-Length', len(binary_file))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(binary_file[:1000])  # Then, disconnected.
+                return
+
+            assert self.headers.get('if-range') == etag
+            self.send_response(206)
+            self.send_header('Content-Length', len(binary_file) - 1000)
+            self.send_header('Content-Range', 'bytes 1000-4095/4096')
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(binary_file[1000:])
+
+        http_server.handler.do_GET = handler
+
+        req = Request(Request.DOWNLOAD, 'GET', http_server.base_uri, {})
+        with http_server:
+            result = send_request.download(req, self.session)
+
+        assert ranges == [None, 'bytes=1000-']
+        with result.get('content') as dl_file:
+            assert dl_file.read() == binary_file
+
+    def test_download_resumed_by_next_request(self, http_server,
+                                              monkeypatch, tmpdir):
+        monkeypatch.setattr(partial_download, 'get_cache_dir',
+                            lambda: str(tmpdir))
+        monkeypatch.setattr(partial_download, 'MIN_SIZE', 0)
+        monkeypatch.setattr(send_request, 'MAX_RESUME_ATTEMPTS', 0)
+        binary_file = bytes(bytearray(random.getrandbits(8)
+                                      for _ in range(4096)))
+        etag = hashlib.md5(binary_file).hexdigest()
+
+        def interrupted_handler(self):
+            self.send_response(200)
+            self.send_header('Content-Length', len(binary_file))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(binary_file[:3000])
+
+        def resume_handler(self):
+            assert self.headers.get('range') == 'bytes=3000-'
+            self.send_response(206)
+            self.send_header('Content-Length', len(binary_file) - 3000)
+            self.send_header('Content-Range', 'bytes 3000-4095/4096')
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(binary_file[3000:])
+
+        req = Request(Request.DOWNLOAD, 'GET', http_server.base_uri, {})
+        http_server.handler.do_GET = interrupted_handler
+        with pytest.raises(InterruptedDownloadError):
+            with http_server:
+                send_request.download(req, self.session)
+
+        http_server.handler.do_GET = resume_handler
+        with http_server:
+            result = send_request.download(req, self.session)
+        with result.get('content') as dl_file:
+            assert dl_file.read() == binary_file
+
+    def test_download_to_file(self, http_server, tmpdir):
+        binary_file = bytes(bytearray(random.getrandbits(8)
+                                      for _ in range(4096)))
+
+        def handler(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(binary_file)
+
+        http_server.handler.do_GET = handler
+        dst_path = str(tmpdir.join('file.bin'))
+
+        req = Request(Request.DOWNLOAD, 'GET', http_server.base_uri,
+                      {'dst_path': dst_path})
+        with http_server:
+            result = send_request.download(req, self.session)
+
+        assert result.get('content') is None
+        assert result.get('md5') == hashlib.md5(binary_file).hexdigest()
+        with io.open(dst_path, 'rb') as dst_file:
+            assert dst_file.read() == binary_file
+
+    def test_download_by_ranges(self, http_server):
+        binary_file = bytes(bytearray(random.getrandbits(8)
+                                      for _ in range(4096)))
+        etag = hashlib.md5(binary_file).hexdigest()
+
+        def handler(self):
+            if not self.headers.get('range'):
+                self.send_response(200)
+                self.send_header('Content-Length', len(binary_file))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(binary_file)
+                return
+
+            assert self.headers.get('range') == 'bytes=1000-2999'
+            self.send_response(206)
+            self.send_header('Content-Length', 2000)
+            self.send_header('Content-Range', 'bytes 1000-2999/4096')
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(binary_file[1000:3000])
+
+        http_server.handler.do_GET = handler
+
+        req = Request(Request.DOWNLOAD, 'GET', http_server.base_uri,
+                      {'size_limit': 4096})
+        with http_server:
+            result = send_request.download(req, self.session)
+        assert result.get('content') is None
+        assert result.get('headers').get('etag') == etag
+
+        dst = io.BytesIO()
+        req = Request(Request.DOWNLOAD, 'GET', http_server.base_uri,
+                      {'headers': {'Range': 'bytes=1000-2999'}, 'dst': dst})
+        with http_server:
+            result = send_request.download(req, self.session)
+        assert result.get('code') == 206
+        assert dst.getvalue() == binary_file[1000:3000]
+
     def test_upload(self, http_server):
         binary_file = bytearray(random.getrandbits(8) for _ in range(4096))
         req = Request(Request.UPLOAD, 'PUT', http_server.base_uri, {})
@@ -87,7 +226,36 @@ class TestSendRequest(object):
         http_server.handler.do_PUT = handler
         with http_server:
             result = send_request.upload(req, self.session)
-        assert result.get('code') is 204
+        assert result.get('code') == 204
+
+    def test_upload_stream_of_unknown_size(self, http_server):
+        binary_file = bytearray(random.getrandbits(8) for _ in range(200000))
+
+        class Stream(io.BytesIO):
+            def seekable(self):
+                return False
+
+        req = Request(Request.UPLOAD, 'PUT', http_server.base_uri, {})
+        req.source = Stream(binary_file)
+
+        def handler(self):
+            assert self.headers.get('transfer-encoding') == 'chunked'
+            content = b''
+            chunk_size = int(self.rfile.readline().strip(), 16)
+            while chunk_size:
+                content += self.rfile.read(chunk_size)
+                self.rfile.readline()
+                chunk_size = int(self.rfile.readline().strip(), 16)
+            self.rfile.readline()
+            assert content == binary_file
+            self.send_response(204)
+            self.end_headers()
+
+        http_server.handler.do_PUT = handler
+        with http_server:
+            result = send_request.upload(req, self.session)
+        assert result.get('code') == 204
+        assert req.source.closed
 
     def test_request_with_http_error(self, http_server):
         url = '%s?code=%s&response=%s' % (http_server.base_uri, 404,
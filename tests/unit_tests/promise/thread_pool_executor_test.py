@@ -25,3 +25,9 @@ class TestThreadPoolExecutor(object):
 
         f = executor.submit(task, 'ARG')
         assert isinstance(f.exception(0.01), MyException)
+
+    def test_shutdown(self):
+        executor = ThreadPoolExecutor(1)
+        f = executor.submit(lambda: 'OK')
+        executor.shutdown()
+        assert f.result(0.01) == 'OK'